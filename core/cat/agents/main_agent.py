@@ -11,6 +11,8 @@ from cat.env import get_env
 from cat.agents import BaseAgent, AgentOutput
 from cat.agents.memory_agent import MemoryAgent
 from cat.agents.procedures_agent import ProceduresAgent
+from cat.cache.response_cache import ResponseCache
+from cat.memory.working_memory import MAX_WORKING_HISTORY_LENGTH
 
 
 class MainAgent(BaseAgent):
@@ -26,6 +28,9 @@ class MainAgent(BaseAgent):
         else:
             self.verbose = False
 
+        # replies to similar questions, see `ResponseCache`
+        self.response_cache = ResponseCache()
+
     def execute(self, cat) -> AgentOutput:
         """Execute the agents.
 
@@ -63,6 +68,31 @@ class MainAgent(BaseAgent):
             "agent_prompt_suffix", prompts.MAIN_PROMPT_SUFFIX, cat=cat
         )
 
+        # reuse the reply to a similar question, if the cache is on and no plugin opts out
+        use_cache = (
+            self.response_cache.enabled
+            and cat.working_memory.active_form is None
+            and self.mad_hatter.execute_hook(
+                "agent_allows_response_cache", True, cat=cat
+            )
+        )
+        if use_cache:
+            working_memory = cat.working_memory
+            cache_key = ResponseCache.fingerprint(
+                working_memory.declarative_memories,
+                prompt_prefix,
+                self.response_cache.scope_of(
+                    cat.user_id,
+                    # the last message is the question itself
+                    working_memory.history[:-1][-MAX_WORKING_HISTORY_LENGTH:],
+                ),
+            )
+            cached_output = self.response_cache.get(
+                cat.working_memory.recall_query_embedding, cache_key
+            )
+            if cached_output is not None:
+                return cached_output
+
         # run tools and forms
         procedures_agent = ProceduresAgent()
         procedures_agent_out : AgentOutput = procedures_agent.execute(cat)
@@ -80,6 +110,12 @@ class MainAgent(BaseAgent):
 
         memory_agent_out.intermediate_steps += procedures_agent_out.intermediate_steps
 
+        # replies using tools may depend on more than memories (e.g. the current time), they are not cached
+        if use_cache and not memory_agent_out.intermediate_steps:
+            self.response_cache.put(
+                cat.working_memory.recall_query_embedding, cache_key, memory_agent_out
+            )
+
         return memory_agent_out
 
     def format_agent_input(self, cat):
@@ -0,0 +1,132 @@
+"""Memoization of LLM calls.
+
+Utility prompts (classification, form confirmation and extraction, ...) are often repeated verbatim, and their reply
+does not need to be generated again. Calls made with `cat.llm(prompt, cache=True)` are looked up by a hash of the
+prompt and of the LLM configuration: in memory first (bounded LRU), then, if `CCAT_LLM_CACHE_DISK=true`, in a
+SQLite database that survives restarts.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict
+
+from cat.env import get_env
+
+
+LLM_CACHE_PATH = "cat/data/llm_cache.db"
+
+
+def llm_fingerprint(llm) -> str:
+    """Hash of the class and parameters of a langchain LLM (model name, temperature, ...)."""
+    params = getattr(llm, "_identifying_params", {})
+    return hashlib.sha256(
+        json.dumps(
+            [type(llm).__module__, type(llm).__qualname__, params],
+            sort_keys=True,
+            default=str,
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+class LLMCache:
+    """Two tiers cache of LLM replies, see module docstring."""
+
+    # disk entries beyond this number are dropped, least recently used first
+    max_disk_entries = 100_000
+
+    def __init__(self, path: str = LLM_CACHE_PATH):
+        self.max_entries = int(get_env("CCAT_LLM_CACHE_MAX_ENTRIES"))
+
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self.metrics = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+        # the fingerprint is computed once per LLM instance
+        self._fingerprinted_llm = None
+        self._fingerprint = None
+
+        self._db = None
+        if get_env("CCAT_LLM_CACHE_DISK") == "true":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            with self._db:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS replies (key TEXT PRIMARY KEY, reply TEXT, used_at REAL)"
+                )
+                self._db.execute(
+                    "CREATE INDEX IF NOT EXISTS replies_used_at ON replies (used_at)"
+                )
+            self._disk_writes = 0
+
+    def key(self, llm, prompt: str) -> str:
+        with self._lock:
+            if llm is not self._fingerprinted_llm:
+                self._fingerprint = llm_fingerprint(llm)
+                self._fingerprinted_llm = llm
+            fingerprint = self._fingerprint
+        return hashlib.sha256(f"{fingerprint}:{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.metrics["hits"] += 1
+                return self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT reply FROM replies WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    with self._db:
+                        self._db.execute(
+                            "UPDATE replies SET used_at = ? WHERE key = ?",
+                            (time.time(), key),
+                        )
+                    self._remember(key, row[0])
+                    self.metrics["disk_hits"] += 1
+                    return row[0]
+
+            self.metrics["misses"] += 1
+            return None
+
+    def put(self, key: str, reply: str):
+        with self._lock:
+            self._remember(key, reply)
+            if self._db is not None:
+                with self._db:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO replies VALUES (?, ?, ?)",
+                        (key, reply, time.time()),
+                    )
+                    # trimmed once in a while, not on every write
+                    self._disk_writes += 1
+                    if self._disk_writes % 1000 == 0:
+                        self._db.execute(
+                            "DELETE FROM replies WHERE key IN ("
+                            "SELECT key FROM replies ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                            (self.max_disk_entries,),
+                        )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("DELETE FROM replies")
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            return {**self.metrics, "entries": len(self._memory)}
+
+    # to be called holding the lock
+    def _remember(self, key: str, reply: str):
+        self._memory[key] = reply
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
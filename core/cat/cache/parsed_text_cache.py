@@ -0,0 +1,165 @@
+"""Cache of parsed documents.
+
+Parsing (pdfminer, unstructured, pandas) is the slowest step of ingestion, and its output does not change when the
+same file is ingested again with another chunk size or splitter. When `CCAT_PARSED_TEXT_CACHE=true`, the documents
+produced by a parser are stored on disk, compressed, keyed by the SHA-256 of the file content and by the parser
+(class, version and parameters). Ingesting the file again only splits and embeds.
+
+Entries not read for the longest time are dropped when the cache is bigger than `CCAT_PARSED_TEXT_CACHE_MAX_MB`.
+"""
+
+import os
+import copy
+import json
+import gzip
+import inspect
+import hashlib
+import threading
+from typing import Iterator, List
+
+from langchain.docstore.document import Document
+from langchain.document_loaders.blob_loaders.schema import Blob
+from langchain_core.document_loaders import BaseBlobParser
+
+from cat.env import get_env
+from cat.log import log
+
+
+PARSED_TEXT_CACHE_PATH = "cat/data/parsed_text_cache"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def parser_fingerprint(parser: BaseBlobParser) -> str:
+    """Class, version and parameters of a parser.
+
+    The version is the `version` attribute of the parser if any, the hash of the module defining it otherwise.
+    """
+    version = getattr(parser, "version", None)
+    if version is None:
+        try:
+            with open(inspect.getsourcefile(type(parser)), "rb") as f:
+                version = hashlib.sha256(f.read()).hexdigest()
+        except (TypeError, OSError):
+            version = ""
+    return json.dumps(
+        [
+            type(parser).__module__,
+            type(parser).__qualname__,
+            version,
+            getattr(parser, "__dict__", {}),
+        ],
+        sort_keys=True,
+        default=str,
+    )
+
+
+class ParsedTextCache:
+    """Compressed on-disk cache of parser output, see module docstring."""
+
+    def __init__(self, path: str = PARSED_TEXT_CACHE_PATH):
+        self.enabled = get_env("CCAT_PARSED_TEXT_CACHE") == "true"
+        self.max_size = int(get_env("CCAT_PARSED_TEXT_CACHE_MAX_MB")) * 1024 * 1024
+        self.path = path
+
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        if self.enabled:
+            os.makedirs(self.path, exist_ok=True)
+
+    def key(self, blob: Blob, parser: BaseBlobParser) -> str:
+        # files on disk are hashed in chunks, never loaded whole
+        digest = hashlib.sha256()
+        with blob.as_bytes_io() as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+        return hashlib.sha256(
+            f"{content_hash}:{parser_fingerprint(parser)}".encode("utf-8")
+        ).hexdigest()
+
+    def get(self, key: str) -> List[Document] | None:
+        entry = self._entry_path(key)
+        try:
+            with gzip.open(entry, "rt", encoding="utf-8") as f:
+                docs = [Document(**d) for d in json.load(f)]
+            # last read time, for the eviction
+            os.utime(entry)
+        except FileNotFoundError:
+            with self._lock:
+                self.metrics["misses"] += 1
+            return None
+        except Exception as e:
+            log.warning(f"Parsed text cache entry {key} unreadable, dropped: {e}")
+            self._remove(entry)
+            with self._lock:
+                self.metrics["misses"] += 1
+            return None
+
+        with self._lock:
+            self.metrics["hits"] += 1
+        return docs
+
+    def put(self, key: str, docs: List[Document]):
+        entry = self._entry_path(key)
+        tmp = f"{entry}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(
+                [{"page_content": d.page_content, "metadata": d.metadata} for d in docs],
+                f,
+                default=str,
+            )
+        os.replace(tmp, entry)
+
+        with self._lock:
+            self.metrics["stores"] += 1
+            self._evict()
+
+    def cached_parse(self, docs: Iterator[Document], key: str) -> Iterator[Document]:
+        """Yield the parsed documents, storing them once all are parsed.
+
+        Documents are not stored if their text is bigger than a quarter of the cache (not worth evicting the rest).
+        """
+        parsed = []
+        size = 0
+        for doc in docs:
+            if parsed is not None:
+                # split hooks may change the documents
+                parsed.append(
+                    Document(page_content=doc.page_content, metadata=copy.deepcopy(doc.metadata))
+                )
+                size += len(doc.page_content)
+                if size > self.max_size / 4:
+                    parsed = None
+            yield doc
+
+        if parsed is not None:
+            try:
+                self.put(key, parsed)
+            except Exception as e:
+                log.warning(f"Could not store parsed text in cache: {e}")
+
+    # to be called holding the lock
+    def _evict(self):
+        entries = [
+            (e.stat().st_mtime, e.stat().st_size, e.path)
+            for e in os.scandir(self.path)
+            if e.name.endswith(".json.gz")
+        ]
+        size = sum(e[1] for e in entries)
+        # least recently read first
+        for _, entry_size, entry in sorted(entries):
+            if size <= self.max_size:
+                break
+            self._remove(entry)
+            size -= entry_size
+            self.metrics["evictions"] += 1
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json.gz")
+
+    def _remove(self, entry: str):
+        try:
+            os.remove(entry)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,146 @@
+"""Semantic cache of the agent replies.
+
+Many questions are asked again and again with slightly different wording (e.g. in a help desk). When the cache is
+on (`CCAT_RESPONSE_CACHE=true`), the reply of the agent is stored together with the embedding of the recall query,
+and a later question whose recall query is similar enough (cosine similarity above `threshold`) gets the same reply
+without calling the LLM.
+
+A reply is reused only for the same context: entries are bucketed by a fingerprint of the recalled declarative
+memories (ids and contents) and of the prompt prefix. When a document is changed, added or removed, the recalled
+memories change as well and the old replies are not found anymore, they just expire (`ttl`) or are evicted (least
+recently used first, beyond `max_entries`).
+
+By default replies are shared between users, as documents are. `CCAT_RESPONSE_CACHE_SCOPE` narrows the sharing:
+`user` adds the user to the fingerprint, `conversation` adds the user and the previous conversation turns (so a
+follow-up question is not answered with the reply to another conversation).
+"""
+
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+
+from cat.agents import AgentOutput
+from cat.env import get_env
+
+
+class ResponseCache:
+    """In-process semantic cache of `AgentOutput`, see module docstring."""
+
+    def __init__(self):
+        self.enabled = get_env("CCAT_RESPONSE_CACHE") == "true"
+        self.threshold = float(get_env("CCAT_RESPONSE_CACHE_THRESHOLD"))
+        self.ttl = int(get_env("CCAT_RESPONSE_CACHE_TTL_SECONDS"))
+        self.max_entries = int(get_env("CCAT_RESPONSE_CACHE_MAX_ENTRIES"))
+        # global, user or conversation
+        self.scope = get_env("CCAT_RESPONSE_CACHE_SCOPE")
+
+        self._lock = threading.Lock()
+        # fingerprint -> OrderedDict of entry id -> entry, least recently used first
+        self._buckets: Dict[str, OrderedDict] = {}
+        self._size = 0
+        self._next_id = 0
+        self.metrics = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def fingerprint(declarative_memories: List, prompt_prefix: str, scope: List = ()) -> str:
+        """Hash of the context a reply depends on, besides the question.
+
+        `scope` is what else the reply is restricted to, see `scope_of`.
+        """
+
+        memories = sorted(
+            (
+                str(m[3]),
+                hashlib.sha256(m[0].page_content.encode("utf-8")).hexdigest(),
+            )
+            for m in declarative_memories
+        )
+        return hashlib.sha256(
+            json.dumps([memories, prompt_prefix, list(scope)]).encode("utf-8")
+        ).hexdigest()
+
+    def scope_of(self, user_id: str, history: List) -> List:
+        """User and conversation turns before the question, as far as `CCAT_RESPONSE_CACHE_SCOPE` requires."""
+        if self.scope == "user":
+            return [user_id]
+        if self.scope == "conversation":
+            return [user_id, [(turn.who, turn.text) for turn in history]]
+        return []
+
+    def get(self, embedding: List[float], fingerprint: str) -> AgentOutput | None:
+        query = self._normalize(embedding)
+        now = time.time()
+
+        with self._lock:
+            bucket = self._buckets.get(fingerprint, {})
+            best, best_score = None, self.threshold
+            for entry_id, entry in list(bucket.items()):
+                if now - entry["created_at"] > self.ttl:
+                    self._remove(fingerprint, entry_id)
+                    continue
+                score = float(entry["embedding"] @ query)
+                if score >= best_score:
+                    best, best_score = entry_id, score
+
+            if best is None:
+                self.metrics["misses"] += 1
+                return None
+
+            self.metrics["hits"] += 1
+            bucket[best]["used_at"] = now
+            bucket.move_to_end(best)
+            return AgentOutput(output=bucket[best]["output"])
+
+    def put(self, embedding: List[float], fingerprint: str, agent_output: AgentOutput):
+        with self._lock:
+            bucket = self._buckets.setdefault(fingerprint, OrderedDict())
+            bucket[self._next_id] = {
+                "embedding": self._normalize(embedding),
+                "output": agent_output.output,
+                "created_at": time.time(),
+                "used_at": time.time(),
+            }
+            self._next_id += 1
+            self._size += 1
+            self.metrics["stores"] += 1
+
+            while self._size > self.max_entries:
+                # the first entry of a bucket is its least recently used one
+                oldest = min(
+                    self._buckets.items(),
+                    key=lambda b: next(iter(b[1].values()))["used_at"],
+                )
+                self._remove(oldest[0], next(iter(oldest[1])))
+                self.metrics["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._buckets = {}
+            self._size = 0
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            lookups = self.metrics["hits"] + self.metrics["misses"]
+            return {
+                **self.metrics,
+                "entries": self._size,
+                "hit_rate": self.metrics["hits"] / lookups if lookups else 0.0,
+            }
+
+    # to be called holding the lock
+    def _remove(self, fingerprint: str, entry_id: int):
+        bucket = self._buckets[fingerprint]
+        del bucket[entry_id]
+        self._size -= 1
+        if not bucket:
+            del self._buckets[fingerprint]
+
+    def _normalize(self, embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
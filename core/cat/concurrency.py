@@ -0,0 +1,102 @@
+"""Keep the event loop free.
+
+Embedding a query or calling the (synchronous) vector DB client from an `async def` route stalls every other
+request and websocket until it returns. Routes offload this kind of work with `run_blocking`, to a dedicated and
+bounded thread pool, so a burst of memory requests cannot starve the threads used by the rest of the app.
+
+`LoopLagMonitor` watches the loop from another thread and, when a callback keeps it busy for longer than a
+threshold, logs how long the loop was blocked and the stack of the blocking code.
+"""
+
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from cat.env import get_env
+from cat.log import log
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_blocking_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(get_env("CCAT_BLOCKING_WORKERS")),
+                thread_name_prefix="cat-blocking",
+            )
+        return _executor
+
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking function in the blocking executor and wait for it without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_blocking_executor(), partial(func, *args, **kwargs)
+    )
+
+
+class LoopLagMonitor:
+    """Logs callbacks blocking the event loop for more than `threshold` seconds."""
+
+    def __init__(self, threshold: float, interval: float = 0.05):
+        self.threshold = threshold
+        self.interval = interval
+        # longest stall observed, in seconds
+        self.max_lag = 0.0
+
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id = None
+        self._task = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Start monitoring the running loop (call it from the loop)."""
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._beat())
+        threading.Thread(
+            target=self._watch, name="loop-lag-monitor", daemon=True
+        ).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _beat(self):
+        while True:
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self):
+        reported = None
+        stalled_since = None
+        while not self._stop.wait(self.interval):
+            heartbeat = self._heartbeat
+            lag = time.monotonic() - heartbeat - self.interval
+
+            if lag > self.threshold and reported != heartbeat:
+                # still blocked: the loop thread is running the culprit right now
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame else ""
+                log.warning(
+                    f"Event loop blocked for more than {lag * 1000:.0f}ms by:\n{stack}"
+                )
+                reported = heartbeat
+                stalled_since = heartbeat
+
+            if stalled_since is not None and heartbeat != stalled_since:
+                # the loop is free again
+                stall = heartbeat - stalled_since - self.interval
+                self.max_lag = max(self.max_lag, stall)
+                log.warning(f"Event loop was blocked for {stall * 1000:.0f}ms")
+                stalled_since = None
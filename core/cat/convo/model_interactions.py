@@ -47,12 +47,15 @@ class LLMModelInteraction(ModelInteraction):
         The number of output tokens generated by the LLM.
     ended_at : float
         The timestamp when the interaction ended.
+    cached : bool
+        Whether the reply was read from the LLM cache instead of generated (no tokens are counted).
     """
 
     model_type: Literal["llm"] = Field(default="llm")
     reply: str
     output_tokens: int
     ended_at: float
+    cached: bool = False
 
 
 class EmbedderModelInteraction(ModelInteraction):
@@ -14,7 +14,44 @@ def get_supported_env_variables():
         "CCAT_QDRANT_HOST": None,
         "CCAT_QDRANT_PORT": "6333",
         "CCAT_QDRANT_API_KEY": None,
+        "CCAT_VECTOR_MEMORY_BACKEND": "qdrant",
         "CCAT_SAVE_MEMORY_SNAPSHOTS": "false",
+        "CCAT_REEMBED_ON_EMBEDDER_CHANGE": "false",
+        "CCAT_EPISODIC_MAX_AGE_DAYS": "0",
+        "CCAT_EPISODIC_MAX_POINTS_PER_USER": "0",
+        "CCAT_EPISODIC_DEDUP_THRESHOLD": "0",
+        "CCAT_EPISODIC_DEDUP_AFTER_DAYS": "7",
+        "CCAT_EPISODIC_RETENTION_INTERVAL_MINUTES": "60",
+        "CCAT_INGESTION_WORKERS": "2",
+        "CCAT_INGESTION_USER_CONCURRENCY": "1",
+        "CCAT_INGESTION_USER_MAX_JOBS": "100",
+        "CCAT_URL_MAX_SIZE_MB": "50",
+        "CCAT_BLOCKING_WORKERS": "8",
+        "CCAT_PARSE_PROCESSES": "0",
+        "CCAT_PARSE_PROCESS_MIME_TYPES": ",".join(
+            [
+                "application/pdf",
+                "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                "application/msword",
+                "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+                "application/vnd.ms-powerpoint",
+                "message/rfc822",
+                "application/vnd.ms-outlook",
+            ]
+        ),
+        "CCAT_PARSE_PDF_PAGES_PER_TASK": "16",
+        "CCAT_PARSED_TEXT_CACHE": "false",
+        "CCAT_PARSED_TEXT_CACHE_MAX_MB": "512",
+        "CCAT_NEAR_DUPLICATES": "off",
+        "CCAT_NEAR_DUPLICATES_THRESHOLD": "0.9",
+        "CCAT_LOOP_LAG_THRESHOLD_MS": "250",
+        "CCAT_RESPONSE_CACHE": "false",
+        "CCAT_RESPONSE_CACHE_THRESHOLD": "0.95",
+        "CCAT_RESPONSE_CACHE_TTL_SECONDS": "86400",
+        "CCAT_RESPONSE_CACHE_MAX_ENTRIES": "1000",
+        "CCAT_RESPONSE_CACHE_SCOPE": "global",
+        "CCAT_LLM_CACHE_MAX_ENTRIES": "1000",
+        "CCAT_LLM_CACHE_DISK": "false",
         "CCAT_METADATA_FILE": "cat/data/metadata.json",
         "CCAT_JWT_SECRET": "secret",
         "CCAT_JWT_ALGORITHM": "HS256",
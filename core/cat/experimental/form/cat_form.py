@@ -66,7 +66,7 @@ JSON:
     "confirm": """
 
         # Queries the LLM and check if user is agree or not
-        response = self.cat.llm(confirm_prompt)
+        response = self.cat.llm(confirm_prompt, cache=True)
         return "true" in response.lower()
 
     # Check if the user wants to exit the form
@@ -101,7 +101,7 @@ JSON:
 """
 
         # Queries the LLM and check if user is agree or not
-        response = self.cat.llm(check_exit_prompt)
+        response = self.cat.llm(check_exit_prompt, cache=True)
         return "true" in response.lower()
 
     # Execute the dialogue step
@@ -200,7 +200,7 @@ JSON:
     def extract(self):
         prompt = self.extraction_prompt()
 
-        json_str = self.cat.llm(prompt)
+        json_str = self.cat.llm(prompt, cache=True)
 
         # json parser
         try:
@@ -0,0 +1,344 @@
+"""Durable queue of document ingestions.
+
+Uploads are not ingested in the web process right after the response anymore: they are spooled to disk and
+recorded as jobs in a local SQLite database, then picked up by a fixed number of worker threads.
+
+- Jobs are claimed by priority class (`high`, `normal`, `low`), oldest first.
+- Each user can have a limited number of jobs running at the same time and a limited number of jobs waiting,
+  so a single user uploading a whole folder cannot starve the others (nor the chat, as the workers are few).
+- Status and progress are kept in the database and survive restarts: jobs interrupted by a restart are run again.
+- A failed job is retried up to `max_attempts` times. Chunks are stored with ids derived from their content
+  (see `IngestionManifest.add`), so a retry overwrites what was already stored instead of duplicating it.
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import threading
+from typing import Dict, List
+
+from starlette.datastructures import UploadFile
+
+from cat.auth.permissions import AuthUserInfo
+from cat.env import get_env
+from cat.log import log
+
+
+INGESTION_QUEUE_PATH = "cat/data/ingestion_queue/"
+
+# lower runs first
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+# jobs in these states will not change anymore
+FINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+class IngestionCancelled(Exception):
+    pass
+
+
+class IngestionQuotaExceeded(Exception):
+    pass
+
+
+class IngestionQueue:
+    """Runs `RabbitHole.ingest_file` jobs with bounded concurrency, per-user quotas and retries."""
+
+    max_attempts = 3
+
+    def __init__(self, ccat, folder: str = INGESTION_QUEUE_PATH):
+        self.ccat = ccat
+        self.folder = folder
+        self.files_folder = os.path.join(folder, "files")
+        os.makedirs(self.files_folder, exist_ok=True)
+
+        self.workers = int(get_env("CCAT_INGESTION_WORKERS"))
+        self.user_concurrency = int(get_env("CCAT_INGESTION_USER_CONCURRENCY"))
+        self.user_max_jobs = int(get_env("CCAT_INGESTION_USER_MAX_JOBS"))
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        # running jobs asked to stop
+        self._cancelled = set()
+
+        self._db = sqlite3.connect(
+            os.path.join(folder, "jobs.db"), check_same_thread=False
+        )
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    user_data TEXT,
+                    source TEXT,
+                    path TEXT,
+                    options TEXT,
+                    priority INTEGER,
+                    status TEXT,
+                    progress INTEGER,
+                    attempts INTEGER,
+                    error TEXT,
+                    created_at REAL,
+                    updated_at REAL,
+                    duplicates INTEGER DEFAULT 0
+                )"""
+            )
+            # databases created before near-duplicates were counted
+            columns = [row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")]
+            if "duplicates" not in columns:
+                self._db.execute("ALTER TABLE jobs ADD COLUMN duplicates INTEGER DEFAULT 0")
+            # jobs interrupted by a restart are run again
+            self._db.execute(
+                "UPDATE jobs SET status = 'queued' WHERE status = 'running'"
+            )
+
+        self._threads = [
+            threading.Thread(
+                target=self._work, name=f"ingestion-worker-{i}", daemon=True
+            )
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        """Stop the workers after their current job."""
+        self._stop.set()
+        self._wakeup.set()
+
+    def enqueue(
+        self,
+        user_data: AuthUserInfo,
+        file: str | UploadFile,
+        priority: str = "normal",
+        **options,
+    ) -> Dict:
+        """Add an ingestion job to the queue.
+
+        Parameters
+        ----------
+        user_data : AuthUserInfo
+            User the file is ingested for.
+        file : str | UploadFile
+            URL, path or uploaded file. Uploaded files are copied in the queue folder until the job is over.
+        priority : str
+            One of `high`, `normal` or `low`.
+        **options
+            `chunk_size`, `chunk_overlap` and `metadata` passed to `RabbitHole.ingest_file`.
+
+        Returns
+        -------
+        job : Dict
+            The queued job.
+        """
+
+        if priority not in PRIORITIES:
+            raise ValueError(
+                f"Priority must be one of {', '.join(PRIORITIES.keys())}, got {priority}"
+            )
+
+        with self._lock:
+            waiting = self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE user_id = ? AND status IN ('queued', 'running')",
+                (user_data.name,),
+            ).fetchone()[0]
+        if waiting >= self.user_max_jobs:
+            raise IngestionQuotaExceeded(
+                f"Too many ingestion jobs for user {user_data.name} ({waiting}), wait for some to finish"
+            )
+
+        job_id = uuid.uuid4().hex
+        path = None
+        if isinstance(file, str):
+            source = file
+        else:
+            # spool the upload to disk, it is read lazily by the parsers
+            source = file.filename
+            path = os.path.join(
+                self.files_folder, job_id + os.path.splitext(file.filename)[1]
+            )
+            with open(path, "wb") as f:
+                shutil.copyfileobj(file.file, f)
+
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, 'queued', 0, 0, NULL, ?, ?, 0)",
+                (
+                    job_id,
+                    user_data.name,
+                    user_data.model_dump_json(warnings=False),
+                    source,
+                    path,
+                    json.dumps(options),
+                    PRIORITIES[priority],
+                    now,
+                    now,
+                ),
+            )
+        self._wakeup.set()
+
+        log.info(f"Ingestion job {job_id} queued for {source}")
+        return self.get_job(job_id)
+
+    def get_job(self, job_id: str, user_id: str | None = None) -> Dict | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None or (user_id is not None and row["user_id"] != user_id):
+            return None
+        return self._to_dict(row)
+
+    def get_jobs(self, user_id: str | None = None) -> List[Dict]:
+        """Jobs of a user (or of every user), newest first."""
+        query = "SELECT * FROM jobs"
+        params = ()
+        if user_id is not None:
+            query += " WHERE user_id = ?"
+            params = (user_id,)
+        with self._lock:
+            rows = self._db.execute(
+                query + " ORDER BY created_at DESC", params
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def cancel(self, job_id: str, user_id: str | None = None) -> Dict | None:
+        """Cancel a job. A running job stops after the batch of chunks it is storing."""
+
+        job = self.get_job(job_id, user_id)
+        if job is None or job["status"] in FINAL_STATUSES:
+            return job
+
+        with self._lock:
+            # the job may have been claimed in the meantime
+            status = self._db.execute(
+                "SELECT status FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()["status"]
+            if status in FINAL_STATUSES:
+                pass
+            elif status == "running":
+                self._cancelled.add(job_id)
+            else:
+                self._update(job_id, status="cancelled")
+                self._remove_file(job_id)
+
+        return self.get_job(job_id)
+
+    def _to_dict(self, row) -> Dict:
+        priorities = {v: k for k, v in PRIORITIES.items()}
+        return {
+            "id": row["id"],
+            "user_id": row["user_id"],
+            "source": row["source"],
+            "priority": priorities[row["priority"]],
+            "status": row["status"],
+            "progress": row["progress"],
+            "duplicates": row["duplicates"],
+            "attempts": row["attempts"],
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    # to be called holding the lock
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        with self._db:
+            self._db.execute(
+                f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?",
+                (*fields.values(), job_id),
+            )
+
+    # to be called holding the lock
+    def _remove_file(self, job_id: str):
+        path = self._db.execute(
+            "SELECT path FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()["path"]
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def _claim(self):
+        """Mark as running the next job to run, skipping users already at their concurrency limit."""
+
+        with self._lock:
+            busy_users = [
+                row["user_id"]
+                for row in self._db.execute(
+                    "SELECT user_id FROM jobs WHERE status = 'running' "
+                    "GROUP BY user_id HAVING COUNT(*) >= ?",
+                    (self.user_concurrency,),
+                )
+            ]
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' "
+                f"AND user_id NOT IN ({', '.join('?' * len(busy_users))}) "
+                "ORDER BY priority, created_at LIMIT 1",
+                busy_users,
+            ).fetchone()
+            if row is None:
+                return None
+            self._update(row["id"], status="running", attempts=row["attempts"] + 1)
+            return row
+
+    def _work(self):
+        while not self._stop.is_set():
+            job = self._claim()
+            if job is None:
+                self._wakeup.wait(timeout=1)
+                self._wakeup.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        # avoid circular import
+        from cat.looking_glass.stray_cat import StrayCat
+
+        job_id = job["id"]
+        cat = StrayCat(AuthUserInfo(**json.loads(job["user_data"])))
+        options = json.loads(job["options"])
+
+        def on_progress(stored: int):
+            with self._lock:
+                self._update(job_id, progress=stored)
+                if job_id in self._cancelled:
+                    raise IngestionCancelled()
+
+        file = job["source"]
+        if job["path"]:
+            file = UploadFile(filename=job["source"], file=open(job["path"], "rb"))
+
+        log.info(f"Ingestion job {job_id} started ({job['source']})")
+        result = None
+        try:
+            result = self.ccat.rabbit_hole.ingest_file(
+                cat, file, on_progress=on_progress, **options
+            )
+            status, error = "completed", None
+        except IngestionCancelled:
+            status, error = "cancelled", None
+        except Exception as e:
+            log.error(f"Ingestion job {job_id} failed: {e}")
+            error = str(e)
+            status = "queued" if job["attempts"] + 1 < self.max_attempts else "failed"
+        finally:
+            if job["path"]:
+                file.file.close()
+
+        with self._lock:
+            if job_id in self._cancelled and status == "queued":
+                # no retry for a job cancelled while failing
+                status = "cancelled"
+            self._cancelled.discard(job_id)
+            self._update(job_id, status=status, error=error)
+            if result:
+                self._update(job_id, duplicates=result["duplicates"])
+            if status in FINAL_STATUSES:
+                self._remove_file(job_id)
+
+        log.info(f"Ingestion job {job_id} {status}")
@@ -24,16 +24,16 @@ class ModelInteractionHandler(BaseCallbackHandler):
 
     def __init__(self, cat, source: str):
         self.cat = cat
-        self.cat.working_memory.model_interactions.append(
-            LLMModelInteraction(
-                source=source,
-                prompt=[],
-                reply="",
-                input_tokens=0,
-                output_tokens=0,
-                ended_at=0,
-            )
+        # keep a reference: other calls may append their interactions concurrently (e.g. `cat.classify_many`)
+        self.interaction = LLMModelInteraction(
+            source=source,
+            prompt=[],
+            reply="",
+            input_tokens=0,
+            output_tokens=0,
+            ended_at=0,
         )
+        self.cat.working_memory.model_interactions.append(self.interaction)
 
     def _count_tokens(self, text: str) -> int:
         # cl100k_base is the most common encoding for OpenAI models such as GPT-3.5, GPT-4 - what about other providers?
@@ -75,4 +75,4 @@ class ModelInteractionHandler(BaseCallbackHandler):
 
     @property
     def last_interaction(self) -> LLMModelInteraction:
-        return self.cat.working_memory.model_interactions[-1]
+        return self.interaction
@@ -24,10 +24,18 @@ from cat.looking_glass.white_rabbit import WhiteRabbit
 from cat.log import log
 from cat.mad_hatter.mad_hatter import MadHatter
 from cat.memory.long_term_memory import LongTermMemory
+from cat.memory.embedder_migration import (
+    EmbedderMigration,
+    get_embedder_name,
+    get_storage_names,
+)
+from cat.memory.episodic_retention import EpisodicRetention
 from cat.rabbit_hole import RabbitHole
+from cat.ingestion_queue import IngestionQueue
 from cat.utils import singleton
 from cat import utils
 from cat.cache.cache_manager import CacheManager
+from cat.cache.llm_cache import LLMCache
 
 
 class Procedure(Protocol):
@@ -81,6 +89,9 @@ class CheshireCat:
         # allows plugins to do something before cat components are loaded
         self.mad_hatter.execute_hook("before_cat_bootstrap", cat=self)
 
+        # replies of LLM calls made with `cache=True`
+        self.llm_cache = LLMCache()
+
         # load LLM and embedder
         self.load_natural_language()
 
@@ -93,12 +104,21 @@ class CheshireCat:
         # First time launched manually       
         self.on_finish_plugins_sync_callback()
 
+        # Background re-embedding on embedder change (resumes an interrupted one)
+        self.embedder_migration = EmbedderMigration(self)
+
+        # Periodic deletion of old episodic memories (if retention policies are set)
+        self.episodic_retention = EpisodicRetention(self)
+
         # Main agent instance (for reasoning)
         self.main_agent = MainAgent()
 
         # Rabbit Hole Instance
         self.rabbit_hole = RabbitHole(self)  # :(
 
+        # Ingestion jobs, run by a pool of workers (resumes jobs interrupted by a restart)
+        self.ingestion_queue = IngestionQueue(self)
+
         # Cache for sessions / working memories et al.
         self.cache = CacheManager().cache
 
@@ -124,6 +144,13 @@ class CheshireCat:
         self._llm = self.load_language_model()
         self.embedder = self.load_language_embedder()
 
+        # label centroids of `cat.classify`, computed with the embedder
+        self.label_centroids = {}
+
+        # cached replies come from the previous models
+        if hasattr(self, "main_agent"):
+            self.main_agent.response_cache.clear()
+
     def load_language_model(self) -> BaseLanguageModel:
         """Large Language Model (LLM) selection at bootstrap time.
 
@@ -290,17 +317,14 @@ class CheshireCat:
         embedder_size = len(self.embedder.embed_query("hello world"))
 
         # Get embedder name (useful for for vectorstore aliases)
-        if hasattr(self.embedder, "model"):
-            embedder_name = self.embedder.model
-        elif hasattr(self.embedder, "repo_id"):
-            embedder_name = self.embedder.repo_id
-        else:
-            embedder_name = "default_embedder"
+        embedder_name = get_embedder_name(self.embedder)
 
         # instantiate long term memory
         vector_memory_config = {
             "embedder_name": embedder_name,
             "embedder_size": embedder_size,
+            # collections re-embedded after an embedder change
+            "storage_names": get_storage_names(),
         }
         self.memory = LongTermMemory(vector_memory_config=vector_memory_config)
 
@@ -336,6 +360,12 @@ class CheshireCat:
     def on_finish_plugins_sync_callback(self):
         self.activate_endpoints()
         self.embed_procedures()
+        # plugins may provide a different text splitter
+        if hasattr(self, "rabbit_hole"):
+            self.rabbit_hole.clear_text_splitters()
+        # and change replies
+        if hasattr(self, "main_agent"):
+            self.main_agent.response_cache.clear()
 
     def activate_endpoints(self):
         for endpoint in self.mad_hatter.endpoints:
@@ -397,12 +427,16 @@ class CheshireCat:
                 f" {t['source']}.{t['trigger_type']}.{t['content']}"
             )
 
+        # procedural recall is served from RAM, align it with the vector DB
+        if points_to_be_deleted_ids or active_triggers_to_be_embedded:
+            self.memory.vectors.procedural.refresh()
+
     def send_ws_message(self, content: str, msg_type="notification"):
         log.error("CheshireCat has no websocket connection. Call `send_ws_message` from a StrayCat instance.")
 
     # REFACTOR: cat.llm should be available here, without streaming clearly
     # (one could be interested in calling the LLM anytime, not only when there is a session)
-    def llm(self, prompt, *args, **kwargs) -> str:
+    def llm(self, prompt, *args, cache: bool = False, **kwargs) -> str:
         """Generate a response using the LLM model.
 
         This method is useful for generating a response with both a chat and a completion model using the same syntax
@@ -411,6 +445,8 @@ class CheshireCat:
         ----------
         prompt : str
             The prompt for generating the response.
+        cache : bool
+            Whether to reuse the reply of a previous call with the same prompt and LLM configuration.
 
         Returns
         -------
@@ -419,6 +455,12 @@ class CheshireCat:
 
         """
 
+        if cache:
+            cache_key = self.llm_cache.key(self._llm, prompt)
+            output = self.llm_cache.get(cache_key)
+            if output is not None:
+                return output
+
         # Add a token counter to the callbacks
         caller = utils.get_caller_info()
 
@@ -441,4 +483,7 @@ class CheshireCat:
             {}, # in case we need to pass info to the template
         )
 
+        if cache:
+            self.llm_cache.put(cache_key, output)
+
         return output
@@ -1,8 +1,13 @@
+import re
+import json
 import time
+import hashlib
 import asyncio
 import tiktoken
+import numpy as np
 
 from typing import Literal, get_args, List, Dict, Union, Any
+from concurrent.futures import ThreadPoolExecutor
 
 from websockets.exceptions import ConnectionClosedOK
 
@@ -16,7 +21,7 @@ from cat.auth.permissions import AuthUserInfo
 from cat.looking_glass.cheshire_cat import CheshireCat
 from cat.looking_glass.callbacks import NewTokenHandler, ModelInteractionHandler
 from cat.memory.working_memory import WorkingMemory
-from cat.convo.messages import CatMessage, UserMessage, MessageWhy, EmbedderModelInteraction
+from cat.convo.messages import CatMessage, UserMessage, MessageWhy, EmbedderModelInteraction, LLMModelInteraction
 from cat.agents import AgentOutput
 from cat.cache.cache_item import CacheItem
 from cat import utils
@@ -301,6 +306,7 @@ class StrayCat:
         # Embed recall query
         recall_query_embedding = self.embedder.embed_query(recall_query)
         self.working_memory.recall_query = recall_query
+        self.working_memory.recall_query_embedding = recall_query_embedding
 
         # keep track of embedder model usage
         self.working_memory.model_interactions.append(
@@ -374,7 +380,7 @@ class StrayCat:
         self.mad_hatter.execute_hook("after_cat_recalls_memories", cat=self)
 
 
-    def llm(self, prompt: str, stream: bool = False) -> str:
+    def llm(self, prompt: str, stream: bool = False, cache: bool = False) -> str:
         """Generate a response using the Large Language Model.
 
         Parameters
@@ -383,6 +389,9 @@ class StrayCat:
             The prompt for generating the response.
         stream : bool
             Whether to stream the tokens via websocket or not.
+        cache : bool
+            Whether to reuse the reply of a previous call with the same prompt and LLM configuration.
+            Meant for deterministic utility prompts (e.g. classification), not for conversation.
 
         Returns
         -------
@@ -399,15 +408,43 @@ class StrayCat:
         Run the LLM and stream the tokens via websocket
         >>> cat.llm("Tell me which way to go?", stream=True)
         "It doesn't matter which way you go"
+
+        Ask only once, the same prompt will get the same reply
+        >>> cat.llm("Is 'Off with their heads!' a polite sentence? Reply with 'yes' or 'no'.", cache=True)
+        "no"
         """
 
+        caller = utils.get_caller_info(return_short=False)
+
+        if cache:
+            llm_cache = CheshireCat().llm_cache
+            cache_key = llm_cache.key(self._llm, prompt)
+            output = llm_cache.get(cache_key)
+            if output is not None:
+                # keep track of the call, without tokens
+                now = time.time()
+                self.working_memory.model_interactions.append(
+                    LLMModelInteraction(
+                        source=caller or "StrayCat",
+                        prompt=[prompt],
+                        reply=output,
+                        input_tokens=0,
+                        output_tokens=0,
+                        started_at=now,
+                        ended_at=now,
+                        cached=True,
+                    )
+                )
+                if stream:
+                    self.send_ws_message(output, msg_type="chat_token")
+                return output
+
         # should we stream the tokens?
         callbacks = []
         if stream:
             callbacks.append(NewTokenHandler(self))
 
         # Add a token counter to the callbacks
-        caller = utils.get_caller_info(return_short=False)
         callbacks.append(ModelInteractionHandler(self, caller or "StrayCat"))
 
         # here we deal with motherfucking langchain
@@ -432,6 +469,9 @@ class StrayCat:
             config=RunnableConfig(callbacks=callbacks)
         )
 
+        if cache:
+            llm_cache.put(cache_key, output)
+
         return output
 
     def __call__(self, message_dict):
@@ -575,7 +615,12 @@ class StrayCat:
                     log.warning(ex)
 
     def classify(
-        self, sentence: str, labels: List[str] | Dict[str, List[str]]
+        self,
+        sentence: str,
+        labels: List[str] | Dict[str, List[str]],
+        mode: Literal["llm", "embedding"] = "llm",
+        threshold: float = 0.5,
+        margin: float = 0.05,
     ) -> str | None:
         """Classify a sentence.
 
@@ -585,6 +630,14 @@ class StrayCat:
             Sentence to be classified.
         labels : List[str] or Dict[str, List[str]]
             Possible output categories and optional examples.
+        mode : Literal["llm", "embedding"]
+            With "embedding" the sentence gets the label whose examples (and name) are the most similar to it,
+            computed with the embedder. The LLM is asked only if the best label is less similar than `threshold`,
+            or not more similar than the second one by at least `margin`.
+        threshold : float
+            Minimum cosine similarity for the "embedding" mode.
+        margin : float
+            Minimum cosine similarity gap between the two best labels for the "embedding" mode.
 
         Returns
         -------
@@ -605,30 +658,215 @@ class StrayCat:
         ... cat.classify("it is a bad day", labels=example_labels)
         "negative"
 
+        Without the LLM, if the sentence is clearly close to the examples of a label:
+
+        >>> cat.classify("what a bad day", labels=example_labels, mode="embedding")
+        "negative"
+
         """
 
+        if mode == "embedding":
+            label = self._classify_by_embedding([sentence], labels, threshold, margin)[0]
+            if label is not None:
+                return label
+
+        labels_names, labels_prompt = self._labels_prompt(labels)
+
+        prompt = f"""Classify this sentence:
+"{sentence}"
+
+{labels_prompt}
+
+"{sentence}" -> """
+
+        response = self.llm(prompt, cache=True)
+
+        return self._closest_label(response, labels_names)
+
+    def classify_many(
+        self,
+        sentences: List[str],
+        labels: List[str] | Dict[str, List[str]],
+        batch_size: int = 10,
+        max_concurrency: int = 4,
+        mode: Literal["llm", "embedding"] = "llm",
+        threshold: float = 0.5,
+        margin: float = 0.05,
+    ) -> List[str | None]:
+        """Classify many sentences, with few LLM calls.
+
+        Sentences are classified `batch_size` at a time with a single prompt, and up to `max_concurrency`
+        prompts run at the same time. A sentence the LLM did not give a class for is classified alone with `classify`.
+        With the "embedding" mode, only the sentences that are not clearly close to a label go to the LLM
+        (see `classify`), all the others are classified with one embedder call.
+
+        Parameters
+        ----------
+        sentences : List[str]
+            Sentences to be classified.
+        labels : List[str] or Dict[str, List[str]]
+            Possible output categories and optional examples, as in `classify`.
+        batch_size : int
+            How many sentences are classified by one LLM call.
+        max_concurrency : int
+            How many LLM calls can run at the same time.
+        mode : Literal["llm", "embedding"]
+            Classify with the LLM or, when the result is clear, with the embedder (see `classify`).
+        threshold : float
+            Minimum cosine similarity for the "embedding" mode.
+        margin : float
+            Minimum cosine similarity gap between the two best labels for the "embedding" mode.
+
+        Returns
+        -------
+        labels : List[str | None]
+            The label of each sentence, in the same order (None if no label matches).
+
+        Examples
+        --------
+        >>> cat.classify_many(["I feel good", "I feel bad"], labels=["positive", "negative"])
+        ["positive", "negative"]
+        """
+
+        if mode == "embedding":
+            results = self._classify_by_embedding(sentences, labels, threshold, margin)
+            ambiguous = [i for i, label in enumerate(results) if label is None]
+            if ambiguous:
+                llm_results = self.classify_many(
+                    [sentences[i] for i in ambiguous],
+                    labels,
+                    batch_size=batch_size,
+                    max_concurrency=max_concurrency,
+                )
+                for i, label in zip(ambiguous, llm_results):
+                    results[i] = label
+            return results
+
+        labels_names, labels_prompt = self._labels_prompt(labels)
+        batches = [
+            list(range(i, min(i + batch_size, len(sentences))))
+            for i in range(0, len(sentences), batch_size)
+        ]
+
+        def classify_batch(batch: List[int]) -> List[str | None]:
+            if len(batch) == 1:
+                return [self.classify(sentences[batch[0]], labels)]
+
+            # one sentence per line
+            numbered = "\n".join(
+                f'{n}. "{" ".join(sentences[i].split())}"' for n, i in enumerate(batch, 1)
+            )
+            prompt = f"""Classify each of these sentences:
+{numbered}
+
+{labels_prompt}
+
+Reply with one line for each sentence, in the form: <sentence number> -> <class>
+"""
+            response = self.llm(prompt, cache=True)
+
+            replies = {}
+            for line in response.splitlines():
+                match = re.match(r"^\W*(\d+)\W*(?:->|:|\.|\))\s*(.+)$", line)
+                if match:
+                    replies[int(match.group(1))] = match.group(2).strip().strip('"')
+
+            return [
+                self._closest_label(replies[n], labels_names)
+                if n in replies
+                else self.classify(sentences[i], labels)
+                for n, i in enumerate(batch, 1)
+            ]
+
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            results = executor.map(classify_batch, batches)
+            return [label for batch_labels in results for label in batch_labels]
+
+    def _classify_by_embedding(
+        self,
+        sentences: List[str],
+        labels: List[str] | Dict[str, List[str]],
+        threshold: float,
+        margin: float,
+    ) -> List[str | None]:
+        """Label of each sentence by similarity with the label centroids, None if it is not clear."""
+
+        if not sentences:
+            return []
+
+        labels_names, centroids = self._label_centroids(labels)
+
+        vectors = np.asarray(self.embedder.embed_documents(sentences), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        scores = (vectors / norms) @ centroids.T
+
+        results = []
+        for row in scores:
+            ranking = np.argsort(-row)
+            best = row[ranking[0]]
+            second = row[ranking[1]] if len(ranking) > 1 else -1.0
+            if best >= threshold and best - second >= margin:
+                results.append(labels_names[ranking[0]])
+            else:
+                results.append(None)
+        return results
+
+    def _label_centroids(self, labels: List[str] | Dict[str, List[str]]):
+        """Names of the labels and the normalized mean embedding of each label's name and examples.
+
+        Centroids are computed once for each set of labels, and kept until the embedder changes.
+        """
+
+        if not isinstance(labels, dict):
+            labels = {label: [] for label in labels}
+
+        key = hashlib.sha256(
+            json.dumps(labels, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        label_centroids = CheshireCat().label_centroids
+        if key not in label_centroids:
+            labels_names = list(labels.keys())
+            texts = []
+            owners = []
+            for i, (label, examples) in enumerate(labels.items()):
+                for text in [label, *examples]:
+                    texts.append(text)
+                    owners.append(i)
+
+            vectors = np.asarray(self.embedder.embed_documents(texts), dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors /= norms
+
+            owners = np.asarray(owners)
+            centroids = np.stack(
+                [vectors[owners == i].mean(axis=0) for i in range(len(labels_names))]
+            )
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            label_centroids[key] = (labels_names, centroids / norms)
+
+        return label_centroids[key]
+
+    def _labels_prompt(self, labels: List[str] | Dict[str, List[str]]):
+        """Names of the labels and their description for classification prompts."""
+
         if isinstance(labels, dict):
-            labels_names = labels.keys()
+            labels_names = list(labels.keys())
             examples_list = "\n\nExamples:"
             for label, examples in labels.items():
                 for ex in examples:
                     examples_list += f'\n"{ex}" -> "{label}"'
         else:
-            labels_names = labels
+            labels_names = list(labels)
             examples_list = ""
 
         labels_list = '"' + '", "'.join(labels_names) + '"'
 
-        prompt = f"""Classify this sentence:
-"{sentence}"
-
-Allowed classes are:
-{labels_list}{examples_list}
-
-"{sentence}" -> """
-
-        response = self.llm(prompt)
+        return labels_names, f"Allowed classes are:\n{labels_list}{examples_list}"
 
+    def _closest_label(self, response: str, labels_names: List[str]) -> str | None:
         # find the closest match and its score with levenshtein distance
         best_label, score = min(
             ((label, utils.levenshtein_distance(response, label)) for label in labels_names),
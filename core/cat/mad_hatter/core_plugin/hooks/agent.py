@@ -65,6 +65,40 @@ def agent_fast_reply(agent_fast_reply: dict, cat) -> None | dict | AgentOutput:
     return agent_fast_reply
 
 
+@hook(priority=0)
+def agent_allows_response_cache(allow: bool, cat) -> bool:
+    """Hook to opt out of the response cache.
+
+    When the response cache is on (`CCAT_RESPONSE_CACHE=true`), the reply to a question similar to one already
+    answered, with the same declarative memories recalled and the same prompt prefix, is served from the cache
+    without running the agent. By default the reply is reused for any user and conversation
+    (see `CCAT_RESPONSE_CACHE_SCOPE`). Return False if the reply of your plugin depends on something else.
+
+    Parameters
+    --------
+    allow: bool
+        True, unless a plugin already opted out.
+    cat : CheshireCat
+        Cheshire Cat instance.
+
+    Returns
+    --------
+    allow : bool
+        Whether the reply can be read from and stored in the cache.
+
+    Examples
+    --------
+    ```python
+    @hook
+    def agent_allows_response_cache(allow, cat):
+        # replies depend on the current time
+        return False
+    ```
+    """
+
+    return allow
+
+
 @hook(priority=0)
 def agent_allowed_tools(allowed_tools: List[str], cat) -> List[str]:
     """Hook the allowed tools.
@@ -40,6 +40,7 @@ def rabbithole_instantiates_splitter(text_splitter: TextSplitter, cat) -> TextSp
     """Hook the splitter used to split text in chunks.
 
     Allows replacing the default text splitter to customize the splitting process.
+    The splitter is cached: this hook runs again only when plugins or their settings change.
 
     Parameters
     ----------
@@ -58,6 +59,10 @@ def rabbithole_instantiates_splitter(text_splitter: TextSplitter, cat) -> TextSp
     # text_splitter._chunk_size = 64
     # text_splitter._chunk_overlap = 8
 
+    # example on how to use the faster splitter, tokenizing each text once
+    # from cat.splitters import TokenOffsetTextSplitter
+    # text_splitter = TokenOffsetTextSplitter(chunk_size=256, chunk_overlap=64)
+
     return text_splitter
 
 
@@ -0,0 +1,588 @@
+import os
+import json
+import uuid
+import shutil
+import sqlite3
+import threading
+from typing import Any, Dict, List, Iterable, Optional
+
+import numpy as np
+from pydantic import BaseModel
+from qdrant_client.http.models import PointStruct, Record, UpdateResult, UpdateStatus
+
+from langchain.docstore.document import Document
+
+from cat.log import log
+from cat.memory.write_journal import journaled
+from cat.env import get_env
+
+
+EMBEDDED_DB_PATH = "cat/data/embedded_vector_memory/"
+
+
+# adapted from VectorMemoryCollection._build_condition, paths are resolved in python
+def conditions_from_dict(filter: dict, prefix: str = "metadata") -> List[tuple]:
+    """Flatten a metadata filter dict into (payload path, value) conditions, all of them must match."""
+    out = []
+    for key, value in (filter or {}).items():
+        if isinstance(value, dict):
+            out.extend(conditions_from_dict(value, f"{prefix}.{key}"))
+        elif isinstance(value, list):
+            for _value in value:
+                if isinstance(_value, dict):
+                    out.extend(conditions_from_dict(_value, f"{prefix}.{key}"))
+                else:
+                    out.append((f"{prefix}.{key}", _value))
+        else:
+            out.append((f"{prefix}.{key}", value))
+    return out
+
+
+def payload_matches(payload: dict, conditions: List[tuple]) -> bool:
+    """Check a point payload against conditions built by `conditions_from_dict`."""
+    for path, value in conditions:
+        values = [payload]
+        for key in path.split("."):
+            next_values = []
+            for v in values:
+                if isinstance(v, list):
+                    next_values.extend(
+                        item.get(key) for item in v if isinstance(item, dict)
+                    )
+                elif isinstance(v, dict):
+                    next_values.append(v.get(key))
+            values = next_values
+
+        flat = []
+        for v in values:
+            flat.extend(v if isinstance(v, list) else [v])
+        # Qdrant does not consider `True == 1`, neither do we
+        if not any(
+            v == value and isinstance(v, bool) == isinstance(value, bool)
+            for v in flat
+        ):
+            return False
+    return True
+
+
+class EmbeddedCollectionInfo(BaseModel):
+    """Subset of Qdrant `CollectionInfo` used by the memory routes."""
+
+    points_count: int
+    vectors_count: int
+    vector_size: int
+    alias: str
+
+
+class EmbeddedVectorMemoryCollection:
+    """Single-node vector collection stored on local disk.
+
+    Vectors are L2-normalized and kept in a memory-mapped float32 matrix (one row per point),
+    payloads are stored in an indexed SQLite table. Similarity search is a single vectorized
+    dot product over the matrix, so startup does not load points in Python objects and recall
+    does not loop over points in pure Python.
+
+    It exposes the same public methods of `VectorMemoryCollection`, so it can be used
+    in its place when `CCAT_VECTOR_MEMORY_BACKEND=embedded` and Qdrant is not remote.
+    """
+
+    initial_capacity = 1024
+
+    def __init__(
+        self,
+        collection_name: str,
+        embedder_name: str,
+        embedder_size: int,
+        path: str = EMBEDDED_DB_PATH,
+        client: Any = None,
+        storage_name: str | None = None,
+    ):
+        # Set attributes (metadata on the embedder are useful because it may change at runtime)
+        self.client = client
+        self.collection_name = collection_name
+        self.storage_name = storage_name or collection_name
+        self.embedder_name = embedder_name
+        self.embedder_size = embedder_size
+
+        self.folder = os.path.join(path, self.storage_name)
+        self._lock = threading.RLock()
+
+        self.create_db_collection_if_not_exists()
+
+        # Check db collection vector size is same as embedder size
+        self.check_embedding_size()
+
+        log.debug(f"Collection {self.collection_name}:")
+        log.debug(self.get_collection_info())
+
+    @property
+    def alias(self) -> str:
+        return self.embedder_name + "_" + self.storage_name
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.folder, "vectors.f32")
+
+    def create_db_collection_if_not_exists(self):
+        if not os.path.isdir(self.folder):
+            log.warning(f'Creating collection "{self.collection_name}" ...')
+            os.makedirs(self.folder)
+
+        self._db = sqlite3.connect(
+            os.path.join(self.folder, "payloads.sqlite"), check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS points (row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, payload TEXT NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._db.commit()
+
+    def check_embedding_size(self):
+        stored = dict(self._db.execute("SELECT key, value FROM info").fetchall())
+
+        if not stored:
+            self._store_info()
+        elif (
+            stored.get("alias") == self.alias
+            and int(stored.get("size", -1)) == self.embedder_size
+        ):
+            log.debug(f'Collection "{self.collection_name}" has the same embedder')
+        else:
+            log.warning(f'Collection "{self.collection_name}" has a different embedder')
+            if get_env("CCAT_SAVE_MEMORY_SNAPSHOTS") == "true":
+                # dump collection on disk before deleting
+                self.save_dump(alias=stored.get("alias"))
+
+            self.create_collection()
+            log.warning(f'Collection "{self.collection_name}" deleted')
+
+        self._load_vectors()
+
+    def create_collection(self):
+        """Empty the collection and bind it to the current embedder."""
+        with self._lock:
+            self._db.execute("DELETE FROM points")
+            self._db.commit()
+            if os.path.exists(self._vectors_path):
+                os.remove(self._vectors_path)
+            self._store_info()
+            self._load_vectors()
+
+    def _store_info(self):
+        self._db.executemany(
+            "INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)",
+            [("alias", self.alias), ("size", str(self.embedder_size))],
+        )
+        self._db.commit()
+
+    def _load_vectors(self):
+        # matrix file is preallocated and grows by doubling, rows are never moved
+        if not os.path.exists(self._vectors_path):
+            self._allocate(self.initial_capacity)
+
+        capacity = os.path.getsize(self._vectors_path) // (4 * self.embedder_size)
+        self._vectors = np.memmap(
+            self._vectors_path,
+            dtype=np.float32,
+            mode="r+",
+            shape=(capacity, self.embedder_size),
+        )
+
+        # rows in use: deleted rows stay as holes and are masked out at search time
+        self._live = np.zeros(capacity, dtype=bool)
+        rows = [r for (r,) in self._db.execute("SELECT row FROM points")]
+        self._live[rows] = True
+        self._n_rows = max(rows) + 1 if rows else 0
+
+    def _allocate(self, capacity: int):
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(capacity * 4 * self.embedder_size)
+
+    def _ensure_capacity(self, n_rows: int):
+        capacity = self._vectors.shape[0]
+        if n_rows <= capacity:
+            return
+
+        while capacity < n_rows:
+            capacity *= 2
+        self._vectors.flush()
+        del self._vectors
+        self._allocate(capacity)
+
+        live = self._live
+        self._vectors = np.memmap(
+            self._vectors_path,
+            dtype=np.float32,
+            mode="r+",
+            shape=(capacity, self.embedder_size),
+        )
+        self._live = np.zeros(capacity, dtype=bool)
+        self._live[: live.shape[0]] = live
+
+    def _normalize(self, vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _fetch_rows(self, rows: Iterable[int]) -> dict:
+        rows = [int(r) for r in rows]
+        fetched = {}
+        # stay below SQLite max number of host parameters
+        for i in range(0, len(rows), 500):
+            batch = rows[i : i + 500]
+            placeholders = ",".join("?" * len(batch))
+            for row, id, payload in self._db.execute(
+                f"SELECT row, id, payload FROM points WHERE row IN ({placeholders})",
+                batch,
+            ):
+                fetched[row] = (id, json.loads(payload))
+        return fetched
+
+    def _rows_from_ids(self, ids: List[str]) -> dict:
+        ids = [str(i) for i in ids]
+        found = {}
+        for i in range(0, len(ids), 500):
+            batch = ids[i : i + 500]
+            placeholders = ",".join("?" * len(batch))
+            for id, row in self._db.execute(
+                f"SELECT id, row FROM points WHERE id IN ({placeholders})", batch
+            ):
+                found[id] = row
+        return found
+
+    def add_point(
+        self,
+        content: str,
+        vector: Iterable,
+        metadata: dict = None,
+        id: Optional[str] = None,
+        **kwargs: Any,
+    ) -> PointStruct:
+        """Add a point (and its metadata) to the collection.
+
+        Args:
+            content: original text.
+            vector: Embedding vector.
+            metadata: Optional metadata dict associated with the text.
+            id:
+                Optional id to associate with the point. Id has to be a uuid-like string.
+
+        Returns:
+            Point as saved into the collection.
+        """
+        return self.add_points([content], [vector], [metadata], [id])[0]
+
+    def add_points(
+        self,
+        contents: List[str],
+        vectors: List[Iterable],
+        metadatas: List[dict] = None,
+        ids: List[Optional[str]] = None,
+        **kwargs: Any,
+    ) -> List[PointStruct]:
+        """Add a batch of points to the collection, with a single commit."""
+
+        metadatas = metadatas or [None] * len(contents)
+        ids = [id or uuid.uuid4().hex for id in (ids or [None] * len(contents))]
+        normalized = self._normalize(vectors).reshape(len(contents), self.embedder_size)
+
+        points = []
+        with journaled(self.storage_name, ids=ids), self._lock:
+            existing = self._rows_from_ids(ids)
+            rows = []
+            for id in ids:
+                if id not in existing:
+                    existing[id] = self._n_rows
+                    self._n_rows += 1
+                rows.append(existing[id])
+
+            self._ensure_capacity(self._n_rows)
+            self._vectors[rows] = normalized
+            self._vectors.flush()
+            self._live[rows] = True
+
+            records = []
+            for row, id, content, metadata, vector in zip(
+                rows, ids, contents, metadatas, normalized
+            ):
+                payload = {"page_content": content, "metadata": metadata}
+                records.append((row, id, json.dumps(payload)))
+                points.append(
+                    PointStruct(id=id, payload=payload, vector=vector.tolist())
+                )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO points (row, id, payload) VALUES (?, ?, ?)",
+                records,
+            )
+            self._db.commit()
+
+        return points
+
+    def update_metadata(self, metadata: Dict[str, dict]):
+        """Merge keys in the metadata of points (point id -> keys), with a single commit."""
+        metadata = {str(id): keys for id, keys in metadata.items()}
+        with journaled(self.storage_name, ids=metadata.keys()), self._lock:
+            rows = self._rows_from_ids(list(metadata.keys()))
+            fetched = self._fetch_rows(rows.values())
+            records = []
+            for id, row in rows.items():
+                payload = fetched[row][1]
+                payload["metadata"] = (payload.get("metadata") or {}) | metadata[id]
+                records.append((json.dumps(payload), row))
+            self._db.executemany("UPDATE points SET payload = ? WHERE row = ?", records)
+            self._db.commit()
+
+        return UpdateResult(operation_id=0, status=UpdateStatus.COMPLETED)
+
+    def create_payload_index(self, field: str, schema: str = "keyword"):
+        # payloads are filtered in memory, there is nothing to index
+        return None
+
+    def delete_points_by_metadata_filter(self, metadata=None):
+        conditions = conditions_from_dict(metadata)
+        if not conditions:
+            return None
+
+        with self._lock:
+            to_delete = [
+                id
+                for id, payload in self._db.execute("SELECT id, payload FROM points")
+                if payload_matches(json.loads(payload), conditions)
+            ]
+        return self.delete_points(to_delete)
+
+    def delete_points_older_than(self, when: float) -> int:
+        """Delete points whose `when` metadata is older than a timestamp, returns how many."""
+        with self._lock:
+            to_delete = [
+                id
+                for (id,) in self._db.execute(
+                    "SELECT id FROM points WHERE json_extract(payload, '$.metadata.when') < ?",
+                    (when,),
+                )
+            ]
+        if to_delete:
+            self.delete_points(to_delete)
+        return len(to_delete)
+
+    def delete_points(self, points_ids):
+        """Delete point in collection"""
+        with journaled(self.storage_name, ids=points_ids), self._lock:
+            rows = list(self._rows_from_ids(points_ids).values())
+            self._live[rows] = False
+            self._vectors[rows] = 0.0
+            self._vectors.flush()
+            self._db.executemany(
+                "DELETE FROM points WHERE row = ?", [(r,) for r in rows]
+            )
+            self._db.commit()
+
+        return UpdateResult(operation_id=0, status=UpdateStatus.COMPLETED)
+
+    def recall_memories_from_embedding(
+        self, embedding, metadata=None, k=5, threshold=None, with_vectors=True
+    ):
+        """Retrieve similar memories from embedding"""
+
+        conditions = conditions_from_dict(metadata)
+
+        with self._lock:
+            n = self._n_rows
+            if n == 0 or not k:
+                return []
+
+            query = self._normalize(embedding)
+            scores = self._vectors[:n] @ query
+            valid = self._live[:n].copy()
+            if threshold is not None:
+                valid &= scores >= threshold
+            candidates = np.flatnonzero(valid)
+
+            # without filters only the top k are needed, no full sort
+            if not conditions and len(candidates) > k:
+                top = np.argpartition(-scores[candidates], k - 1)[:k]
+                candidates = candidates[top]
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+            langchain_documents_from_points = []
+            batch_size = max(4 * k, 256)
+            for i in range(0, len(candidates), batch_size):
+                batch = candidates[i : i + batch_size]
+                fetched = self._fetch_rows(batch)
+                for row in batch:
+                    id, payload = fetched[int(row)]
+                    if conditions and not payload_matches(payload, conditions):
+                        continue
+                    langchain_documents_from_points.append(
+                        (
+                            Document(
+                                page_content=payload.get("page_content"),
+                                metadata=payload.get("metadata") or {},
+                            ),
+                            float(scores[row]),
+                            self._vectors[row].tolist() if with_vectors else None,
+                            id,
+                        )
+                    )
+                    if len(langchain_documents_from_points) == k:
+                        return langchain_documents_from_points
+
+        return langchain_documents_from_points
+
+    def get_points(self, ids: List[str], with_vectors: bool = True, with_payload: bool = True):
+        """Get points by their ids."""
+        with self._lock:
+            rows = self._rows_from_ids(ids)
+            # payloads are only read from SQLite when asked for
+            fetched = self._fetch_rows(rows.values()) if with_payload else {}
+            return [
+                Record(
+                    id=id,
+                    payload=fetched[row][1] if with_payload else None,
+                    vector=self._vectors[row].tolist() if with_vectors else None,
+                )
+                for id, row in rows.items()
+            ]
+
+    def get_all_points(
+        self,
+        limit: int = 10000,
+        offset: str | int | None = None,
+        with_vectors: bool = True,
+        with_payload: bool | List[str] = True,
+    ):
+        """Retrieve all the points in the collection with an optional offset and limit.
+
+        The offset is the internal row number returned as `next_offset` by the previous call.
+        Payloads are returned whole when `with_payload` is a list of keys.
+        """
+        offset = int(offset) if offset not in (None, "") else 0
+
+        with self._lock:
+            selected = self._db.execute(
+                "SELECT row, id, payload FROM points WHERE row >= ? ORDER BY row LIMIT ?",
+                (offset, limit + 1),
+            ).fetchall()
+
+            next_page_offset = None
+            if len(selected) > limit:
+                next_page_offset = selected[-1][0]
+                selected = selected[:limit]
+
+            all_points = [
+                Record(
+                    id=id,
+                    payload=json.loads(payload) if with_payload else None,
+                    vector=self._vectors[row].tolist() if with_vectors else None,
+                )
+                for row, id, payload in selected
+            ]
+
+        return all_points, next_page_offset
+
+    def get_collection_info(self) -> EmbeddedCollectionInfo:
+        (count,) = self._db.execute("SELECT COUNT(*) FROM points").fetchone()
+        return EmbeddedCollectionInfo(
+            points_count=count,
+            vectors_count=count,
+            vector_size=self.embedder_size,
+            alias=self.alias,
+        )
+
+    def delete_collection(self) -> bool:
+        """Remove the collection files from disk."""
+        with journaled(self.storage_name, wipe=True), self._lock:
+            self._db.close()
+            del self._vectors
+            shutil.rmtree(self.folder, ignore_errors=True)
+        return True
+
+    def db_is_remote(self):
+        return False
+
+    # dump collection on disk before deleting
+    def save_dump(self, folder="dormouse/", alias: str | None = None):
+        alias = alias or self.alias
+
+        if os.path.isdir(folder):
+            log.debug("Directory dormouse exists")
+        else:
+            log.info("Directory dormouse does NOT exists, creating it.")
+            os.mkdir(folder)
+
+        with self._lock:
+            self._vectors.flush()
+            self._db.commit()
+            new_name = os.path.join(folder, alias.replace("/", "-") + ".embedded")
+            shutil.copytree(self.folder, new_name, dirs_exist_ok=True)
+        log.warning(f'Dump "{new_name}" completed')
+
+
+def migrate_from_local_qdrant(
+    qdrant_path: str = "cat/data/local_vector_memory/",
+    target_path: str = EMBEDDED_DB_PATH,
+    batch_size: int = 256,
+) -> dict:
+    """Copy every collection of a local Qdrant folder into the embedded backend.
+
+    Points are read with the Qdrant scroll cursor and written in batches, ids and payloads are kept.
+
+    Returns
+    -------
+    migrated : dict
+        Number of points migrated for each collection.
+    """
+    from qdrant_client import QdrantClient
+
+    client = QdrantClient(path=qdrant_path)
+    migrated = {}
+    for c in client.get_collections().collections:
+        size = client.get_collection(c.name).config.params.vectors.size
+        aliases = client.get_collection_aliases(c.name).aliases
+        embedder_name = "default_embedder"
+        if aliases and aliases[0].alias_name.endswith("_" + c.name):
+            embedder_name = aliases[0].alias_name[: -len("_" + c.name)]
+
+        target = EmbeddedVectorMemoryCollection(
+            collection_name=c.name,
+            embedder_name=embedder_name,
+            embedder_size=size,
+            path=target_path,
+        )
+
+        migrated[c.name] = 0
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=c.name,
+                with_vectors=True,
+                with_payload=True,
+                limit=batch_size,
+                offset=offset,
+            )
+            if points:
+                target.add_points(
+                    contents=[p.payload.get("page_content") for p in points],
+                    vectors=[p.vector for p in points],
+                    metadatas=[p.payload.get("metadata") for p in points],
+                    ids=[str(p.id) for p in points],
+                )
+                migrated[c.name] += len(points)
+            if offset is None:
+                break
+
+        log.info(f'Migrated {migrated[c.name]} points of collection "{c.name}"')
+
+    client.close()
+    return migrated
+
+
+if __name__ == "__main__":
+    # python -m cat.memory.embedded_vector_memory_collection [qdrant_path] [target_path]
+    import sys
+
+    migrate_from_local_qdrant(*sys.argv[1:3])
@@ -0,0 +1,355 @@
+"""Zero-downtime switch of the embedder.
+
+Instead of wiping the collections when the embedder changes, the points of the episodic and declarative
+collections are re-embedded in background into new collections (stored under another name in the vector DB
+and aliased to the new embedder). Recall keeps being served by the old embedder and collections until the
+migration finishes, then the new embedder and collections are swapped in at once and the old collections
+are dropped (after a dump, if `CCAT_SAVE_MEMORY_SNAPSHOTS` is on).
+
+Writes to the old collections while migrating are recorded (see `cat.memory.write_journal`) and replayed on the
+new ones: points written are copied again, points deleted are deleted. Writers are held while the last writes
+are replayed and the collections are switched.
+
+The state is saved on disk after every batch: an interrupted migration is resumed at the next boot.
+"""
+
+import os
+import json
+import contextlib
+import time
+import uuid
+import threading
+from typing import Dict
+
+from cat.db import crud, models
+from cat.factory.embedder import get_embedder_from_name
+from cat.env import get_env
+from cat.log import log
+from cat.memory.write_journal import open_journal, drop_journal, canonical_id
+
+
+MIGRATION_STATE_PATH = "cat/data/embedder_migration.json"
+
+# logical collection name -> collection name in the vector DB, saved in the settings
+STORAGE_SETTING_NAME = "vector_memory_storage"
+STORAGE_SETTING_CATEGORY = "vector_memory"
+
+# procedural memory is rebuilt from plugins, no need to migrate it
+MIGRATED_COLLECTIONS = ["episodic", "declarative"]
+
+
+def get_embedder_name(embedder) -> str:
+    """Embedder model name, used for the vector DB aliases."""
+    if hasattr(embedder, "model"):
+        return embedder.model
+    elif hasattr(embedder, "repo_id"):
+        return embedder.repo_id
+    return "default_embedder"
+
+
+def get_storage_names() -> Dict[str, str]:
+    setting = crud.get_setting_by_name(name=STORAGE_SETTING_NAME)
+    if setting is None:
+        return {}
+    return setting["value"]
+
+
+class EmbedderMigration:
+    """Re-embeds memory collections in background when the embedder changes."""
+
+    batch_size = 64
+
+    def __init__(self, ccat, state_path: str = MIGRATION_STATE_PATH):
+        self.ccat = ccat
+        self.state_path = state_path
+        self.state = None
+        self._lock = threading.Lock()
+        # logical collection name -> journal of the writes to the old collection
+        self._journals = {}
+        self._resumed = False
+
+        # resume an interrupted migration
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r") as f:
+                self.state = json.load(f)
+            if self.state["status"] == "running":
+                log.warning("Resuming interrupted embedder migration")
+                self._resumed = True
+                self._open_journals()
+                self._schedule()
+
+    def is_running(self) -> bool:
+        return self.state is not None and self.state["status"] == "running"
+
+    def start(self, embedder_class: str, embedder_config: Dict) -> Dict:
+        """Start re-embedding memories for the given embedder.
+
+        Parameters
+        ----------
+        embedder_class : str
+            Name of the embedder config class (e.g. `EmbedderOpenAIConfig`).
+        embedder_config : Dict
+            Embedder settings, saved as the selected embedder once the migration is done.
+
+        Returns
+        -------
+        state : Dict
+            Migration status and progress.
+        """
+
+        if self.is_running():
+            raise Exception("An embedder migration is already running")
+
+        # fail early if the embedder cannot be instantiated
+        self._get_embedder(embedder_class, embedder_config)
+
+        suffix = uuid.uuid4().hex[:8]
+        self.state = {
+            "status": "running",
+            "embedder": {"name": embedder_class, "config": embedder_config},
+            "started_at": time.time(),
+            "error": None,
+            "collections": {
+                c: {
+                    "storage_name": f"{c}_{suffix}",
+                    "offset": None,
+                    "migrated": 0,
+                    "total": self.ccat.memory.vectors.get_collection(c).points_count,
+                    "done": False,
+                }
+                for c in MIGRATED_COLLECTIONS
+            },
+        }
+        self._open_journals()
+        self._save_state()
+        self._schedule()
+
+        return self.state
+
+    def _schedule(self):
+        self.ccat.white_rabbit.schedule_job(
+            self.run, job_id=f"embedder_migration-{uuid.uuid4().hex[:8]}"
+        )
+
+    def _open_journals(self):
+        vectors = self.ccat.memory.vectors
+        for collection_name, progress in self.state["collections"].items():
+            saved = progress.get("journal") or {}
+            self._journals[collection_name] = open_journal(
+                vectors.collections[collection_name].storage_name,
+                ids=saved.get("ids", []),
+                filters=saved.get("filters", []),
+                deleted_before=saved.get("deleted_before"),
+            )
+
+    def _close_journals(self):
+        for collection_name, journal in self._journals.items():
+            drop_journal(self.ccat.memory.vectors.collections[collection_name].storage_name)
+        self._journals = {}
+
+    def _save_state(self):
+        # writes recorded so far, to be replayed after a restart
+        for collection_name, journal in self._journals.items():
+            self.state["collections"][collection_name]["journal"] = journal.to_dict()
+
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        with open(self.state_path + ".tmp", "w") as f:
+            json.dump(self.state, f)
+        os.replace(self.state_path + ".tmp", self.state_path)
+
+    def _get_embedder(self, embedder_class: str, embedder_config: Dict):
+        FactoryClass = get_embedder_from_name(embedder_class)
+        if FactoryClass is None:
+            raise Exception(f"Embedder {embedder_class} not supported")
+        return FactoryClass.get_embedder_from_config(embedder_config)
+
+    def run(self):
+        """Re-embed all collections, then switch to the new embedder."""
+
+        targets = {}
+        try:
+            embedder = self._get_embedder(
+                self.state["embedder"]["name"], self.state["embedder"]["config"]
+            )
+            embedder_name = get_embedder_name(embedder)
+            embedder_size = len(embedder.embed_query("hello world"))
+
+            for collection_name, progress in self.state["collections"].items():
+                source = self.ccat.memory.vectors.collections[collection_name]
+                target = self.ccat.memory.vectors.collection_class(
+                    client=self.ccat.memory.vectors.vector_db,
+                    collection_name=collection_name,
+                    storage_name=progress["storage_name"],
+                    embedder_name=embedder_name,
+                    embedder_size=embedder_size,
+                )
+                targets[collection_name] = target
+
+                if not progress["done"]:
+                    self._reembed(source, target, embedder, progress)
+                    progress["done"] = True
+                    self._save_state()
+
+                if self._resumed:
+                    # writes after the last saved state were not recorded before the restart
+                    self._reembed(
+                        source,
+                        target,
+                        embedder,
+                        {"offset": None, "migrated": 0},
+                        since=self.state["started_at"],
+                    )
+
+                # catch up with writes to the old collection while migrating, writers are not held yet
+                self._replay(source, target, embedder, self._journals[collection_name])
+
+            self._switch(targets, embedder)
+        except Exception as e:
+            log.error(f"Embedder migration failed: {e}")
+            self._close_journals()
+            # drop the half-built collections
+            for collection_name, progress in self.state["collections"].items():
+                try:
+                    if collection_name in targets:
+                        targets[collection_name].delete_collection()
+                except Exception as delete_error:
+                    log.error(
+                        f"Could not delete collection {progress['storage_name']}: {delete_error}"
+                    )
+            self.state["status"] = "failed"
+            self.state["error"] = str(e)
+            self._save_state()
+
+    def _reembed(self, source, target, embedder, progress, since=None):
+        offset = progress["offset"]
+        while True:
+            points, offset = source.get_all_points(
+                limit=self.batch_size, offset=offset, with_vectors=False
+            )
+
+            if since is not None:
+                points = [
+                    p
+                    for p in points
+                    if (p.payload.get("metadata") or {}).get("when", 0) >= since
+                ]
+
+            if points:
+                self._copy(points, target, embedder)
+                progress["migrated"] += len(points)
+
+            progress["offset"] = offset
+            if since is None:
+                self._save_state()
+                log.info(
+                    f"Embedder migration: {progress['migrated']}/{progress['total']} points of {source.collection_name}"
+                )
+
+            if offset is None:
+                break
+
+    def _copy(self, points, target, embedder):
+        contents = [p.payload["page_content"] for p in points]
+        target.add_points(
+            contents=contents,
+            vectors=embedder.embed_documents(contents),
+            metadatas=[p.payload.get("metadata") for p in points],
+            ids=[p.id for p in points],
+        )
+
+    def _replay(self, source, target, embedder, journal):
+        """Apply to the new collection the writes recorded on the old one."""
+
+        ids, filters, deleted_before = journal.take()
+        if deleted_before is not None:
+            target.delete_points_older_than(deleted_before)
+        for deleted_filter in filters:
+            if deleted_filter is None:
+                # the old collection was wiped
+                target.delete_collection()
+                target.create_db_collection_if_not_exists()
+            else:
+                target.delete_points_by_metadata_filter(deleted_filter)
+
+        # points written are copied in their current state, points no longer there are deleted
+        for i in range(0, len(ids), self.batch_size):
+            batch = ids[i : i + self.batch_size]
+            points = source.get_points(batch, with_vectors=False)
+            if points:
+                self._copy(points, target, embedder)
+            found = {canonical_id(p.id) for p in points}
+            deleted = [id for id in batch if canonical_id(id) not in found]
+            if deleted:
+                target.delete_points(deleted)
+
+        self._save_state()
+
+    def _switch(self, targets, embedder):
+        # avoid circular import
+        from cat.routes.embedder import (
+            EMBEDDER_CATEGORY,
+            EMBEDDER_SELECTED_CATEGORY,
+            EMBEDDER_SELECTED_NAME,
+        )
+
+        with self._lock, contextlib.ExitStack() as held:
+            old_collections = self.ccat.memory.vectors.collections
+
+            # hold writers, replay the last writes and switch: nothing is written to the old collections meanwhile
+            for journal in self._journals.values():
+                held.enter_context(journal.block())
+            for collection_name, journal in self._journals.items():
+                self._replay(
+                    old_collections[collection_name], targets[collection_name], embedder, journal
+                )
+
+            embedder_class = self.state["embedder"]["name"]
+            crud.upsert_setting_by_name(
+                models.Setting(
+                    name=embedder_class,
+                    category=EMBEDDER_CATEGORY,
+                    value=self.state["embedder"]["config"],
+                )
+            )
+            crud.upsert_setting_by_name(
+                models.Setting(
+                    name=EMBEDDER_SELECTED_NAME,
+                    category=EMBEDDER_SELECTED_CATEGORY,
+                    value={"name": embedder_class},
+                )
+            )
+
+            storage_names = get_storage_names()
+            for collection_name, progress in self.state["collections"].items():
+                storage_names[collection_name] = progress["storage_name"]
+            crud.upsert_setting_by_name(
+                models.Setting(
+                    name=STORAGE_SETTING_NAME,
+                    category=STORAGE_SETTING_CATEGORY,
+                    value=storage_names,
+                )
+            )
+
+            # swap embedder and collections
+            self.ccat.load_natural_language()
+            self.ccat.load_memory()
+
+            # writers still holding the old collections get an error instead of writing where nobody reads
+            for journal in self._journals.values():
+                journal.closed = True
+            self._journals = {}
+
+        self.ccat.mad_hatter.find_plugins()
+
+        # drop the old collections
+        for collection_name in self.state["collections"].keys():
+            old = old_collections[collection_name]
+            if get_env("CCAT_SAVE_MEMORY_SNAPSHOTS") == "true":
+                old.save_dump()
+            old.delete_collection()
+            # collections created later with the same name are written normally
+            drop_journal(old.storage_name)
+
+        self.state["status"] = "completed"
+        self._save_state()
+        log.warning(f"Embedder migration to {embedder_class} completed")
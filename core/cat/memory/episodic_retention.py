@@ -0,0 +1,196 @@
+"""Retention of episodic memories.
+
+Every user message is stored in episodic memory and nothing removes it, so the collection (and recall latency
+with it) grows forever. A periodic job run by the WhiteRabbit enforces, per `source` user:
+
+- a maximum age, based on the `when` metadata;
+- a maximum number of points, the oldest ones are dropped first;
+- optional down-sampling of old near-duplicates: among points older than `dedup_after_days`, a point whose
+  vector is at least `dedup_threshold` similar (cosine) to a newer kept point of the same user is dropped.
+
+Points past the maximum age are deleted by the vector DB with a range filter on `when`. For the other policies
+only ids, users and `when` of the points are scanned; vectors are read one user at a time, and only for the old
+points, to find near-duplicates. Points are deleted in batches. Counters of reclaimed points are kept in `metrics`
+(see `GET /memory/retention`).
+"""
+
+import time
+import threading
+from collections import defaultdict
+from typing import Dict, List
+
+import numpy as np
+
+from cat.env import get_env
+from cat.log import log
+
+
+RETENTION_JOB_ID = "episodic_retention"
+
+# why a point was deleted
+REASONS = ("max_age", "max_points", "near_duplicates")
+
+
+class EpisodicRetention:
+    """Deletes episodic memories beyond the configured retention, see module docstring."""
+
+    page_size = 1000
+    delete_batch_size = 256
+
+    def __init__(self, ccat):
+        self.ccat = ccat
+
+        # 0 turns off a policy
+        self.max_age_days = float(get_env("CCAT_EPISODIC_MAX_AGE_DAYS"))
+        self.max_points_per_user = int(get_env("CCAT_EPISODIC_MAX_POINTS_PER_USER"))
+        self.dedup_threshold = float(get_env("CCAT_EPISODIC_DEDUP_THRESHOLD"))
+        self.dedup_after_days = float(get_env("CCAT_EPISODIC_DEDUP_AFTER_DAYS"))
+        self.interval_minutes = int(get_env("CCAT_EPISODIC_RETENTION_INTERVAL_MINUTES"))
+
+        self._lock = threading.Lock()
+        self.metrics = {
+            "runs": 0,
+            "last_run_at": None,
+            "last_run_seconds": None,
+            "last_run_scanned": 0,
+            "last_run_reclaimed": {r: 0 for r in REASONS},
+            "total_reclaimed": {r: 0 for r in REASONS},
+        }
+
+        if self.is_enabled() and self.interval_minutes > 0:
+            if self.ccat.white_rabbit.get_job(RETENTION_JOB_ID):
+                self.ccat.white_rabbit.remove_job(RETENTION_JOB_ID)
+            self.ccat.white_rabbit.schedule_interval_job(
+                self.run, job_id=RETENTION_JOB_ID, minutes=self.interval_minutes
+            )
+
+    def is_enabled(self) -> bool:
+        return (
+            self.max_age_days > 0
+            or self.max_points_per_user > 0
+            or self.dedup_threshold > 0
+        )
+
+    def run(self) -> Dict[str, int]:
+        """Apply the retention policies once.
+
+        Returns
+        -------
+        reclaimed : Dict[str, int]
+            Number of deleted points by reason.
+        """
+
+        # the episodic collection is being copied, deletions would be lost
+        if self.ccat.embedder_migration.is_running():
+            log.info("Episodic retention skipped, embedder migration running")
+            return {r: 0 for r in REASONS}
+
+        with self._lock:
+            started = time.time()
+            collection = self.ccat.memory.vectors.collections["episodic"]
+
+            reclaimed = {r: 0 for r in REASONS}
+            if self.max_age_days > 0:
+                # does nothing if the index already exists
+                collection.create_payload_index("metadata.when", "float")
+                reclaimed["max_age"] = collection.delete_points_older_than(
+                    started - self.max_age_days * 86400
+                )
+
+            scanned = 0
+            if self.max_points_per_user > 0 or self.dedup_threshold > 0:
+                points, scanned = self._scan(collection)
+                to_delete = self._select(collection, points, now=started)
+
+                deleted_ids = [id for ids in to_delete.values() for id in ids]
+                for i in range(0, len(deleted_ids), self.delete_batch_size):
+                    collection.delete_points(deleted_ids[i : i + self.delete_batch_size])
+                for r, ids in to_delete.items():
+                    reclaimed[r] += len(ids)
+
+            self.metrics["runs"] += 1
+            self.metrics["last_run_at"] = started
+            self.metrics["last_run_seconds"] = time.time() - started
+            self.metrics["last_run_scanned"] = scanned
+            self.metrics["last_run_reclaimed"] = reclaimed
+            for r, n in reclaimed.items():
+                self.metrics["total_reclaimed"][r] += n
+
+        log.info(
+            f"Episodic retention: {sum(reclaimed.values())} points reclaimed {reclaimed}"
+        )
+        return reclaimed
+
+    def _scan(self, collection):
+        """Ids and `when` of the points grouped by user, newest first."""
+
+        points = defaultdict(list)
+        scanned = 0
+        offset = None
+        while True:
+            page, offset = collection.get_all_points(
+                limit=self.page_size,
+                offset=offset,
+                with_vectors=False,
+                with_payload=["metadata.source", "metadata.when"],
+            )
+            for p in page:
+                metadata = p.payload.get("metadata") or {}
+                points[metadata.get("source")].append((p.id, metadata.get("when", 0)))
+            scanned += len(page)
+            if offset is None:
+                break
+
+        for user_points in points.values():
+            user_points.sort(key=lambda p: p[1], reverse=True)
+        return points, scanned
+
+    def _select(self, collection, points: Dict[str, List], now: float) -> Dict[str, List]:
+        """Ids to delete by reason, each point is counted once."""
+
+        to_delete = {r: [] for r in REASONS}
+        for user_points in points.values():
+            if self.max_points_per_user > 0:
+                to_delete["max_points"] += [
+                    id for id, _ in user_points[self.max_points_per_user :]
+                ]
+                user_points = user_points[: self.max_points_per_user]
+
+            if self.dedup_threshold > 0:
+                older_than = now - self.dedup_after_days * 86400
+                to_delete["near_duplicates"] += self._near_duplicates(
+                    collection, [id for id, when in user_points if when < older_than]
+                )
+
+        return to_delete
+
+    def _near_duplicates(self, collection, ids: List[str]) -> List[str]:
+        """Among old points of a user (newest first), those too similar to a newer kept one."""
+        if len(ids) < 2:
+            return []
+
+        # vectors of this user only, normalized as they are read
+        kept = np.empty((len(ids), collection.embedder_size), dtype=np.float32)
+        n_kept = 0
+        duplicates = []
+        for i in range(0, len(ids), self.page_size):
+            batch = ids[i : i + self.page_size]
+            vectors = {
+                str(p.id): p.vector
+                for p in collection.get_points(batch, with_vectors=True, with_payload=False)
+            }
+            for id in batch:
+                vector = vectors.get(str(id))
+                if vector is None:
+                    continue
+                vector = np.asarray(vector, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                if norm > 0:
+                    vector /= norm
+                # newer points are kept, older ones too similar to a kept point are dropped
+                if n_kept and np.max(kept[:n_kept] @ vector) >= self.dedup_threshold:
+                    duplicates.append(id)
+                else:
+                    kept[n_kept] = vector
+                    n_kept += 1
+        return duplicates
@@ -0,0 +1,155 @@
+import os
+import json
+import uuid
+import hashlib
+from typing import Dict, List, Set
+
+from langchain.docstore.document import Document
+
+from cat.log import log
+
+
+MANIFESTS_PATH = "cat/data/ingestion_manifests/"
+
+
+def chunk_hash(doc: Document) -> str:
+    """Hash of the content and metadata of a chunk (insertion time excluded)."""
+    metadata = {k: v for k, v in doc.metadata.items() if k != "when"}
+    content = json.dumps(
+        {"page_content": doc.page_content, "metadata": metadata},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def existing_ids(collection, ids: List[str], batch_size: int = 1000) -> Set[str]:
+    """Ids (in canonical uuid form) of the given points still in the collection, looked up in batches."""
+    found = set()
+    for i in range(0, len(ids), batch_size):
+        points = collection.get_points(
+            ids[i : i + batch_size], with_vectors=False, with_payload=False
+        )
+        # Qdrant server returns ids in canonical uuid form
+        found.update(str(uuid.UUID(str(p.id))) for p in points)
+    return found
+
+
+class IngestionManifest:
+    """Chunks stored in declarative memory for a source, indexed by content hash.
+
+    Used by the RabbitHole to re-ingest a document incrementally: only new chunks are embedded,
+    chunks no longer in the document are deleted, unchanged ones are left alone.
+    Manifests are scoped by user, as different users may upload different files with the same name.
+    """
+
+    def __init__(self, source: str, user_id: str, folder: str = MANIFESTS_PATH):
+        self.source = source
+        self.key = hashlib.sha1(f"{user_id}:{source}".encode("utf-8")).hexdigest()
+        self.path = os.path.join(folder, self.key + ".json")
+
+        # version of the source the chunks come from (e.g. the ETag of a URL), if known
+        self.version: str | None = None
+        # ingestion parameters the chunks were made with (chunk size, overlap, metadata)
+        self.params: Dict | None = None
+        # content hash -> ids of the points with that content
+        self.chunks: Dict[str, List[str]] = {}
+        # stored chunks matched by the new version of the source
+        self._kept: Dict[str, List[str]] = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                manifest = json.load(f)
+            self.chunks = manifest["chunks"]
+            self.version = manifest.get("version")
+            self.params = manifest.get("params")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(
+                {
+                    "source": self.source,
+                    "version": self.version,
+                    "params": self.params,
+                    "chunks": self.chunks,
+                },
+                f,
+            )
+        os.replace(self.path + ".tmp", self.path)
+
+    @staticmethod
+    def ingestion_params(chunk_size: int | None, chunk_overlap: int | None, metadata: dict) -> Dict:
+        """Ingestion parameters in the form they are saved with the manifest."""
+        return json.loads(
+            json.dumps(
+                {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "metadata": metadata},
+                sort_keys=True,
+                default=str,
+            )
+        )
+
+    def is_unchanged(self, version: str | None, params: Dict) -> bool:
+        """Whether the chunks stored come from this version of the source, made with the same parameters."""
+        return bool(version) and self.version == version and self.params == params
+
+    def prune(self, collection) -> int:
+        """Forget points no longer in the collection (e.g. deleted from the memory page).
+
+        Returns the number of points forgotten.
+        """
+        ids = [id for ids in self.chunks.values() for id in ids]
+        if not ids:
+            return 0
+        existing = existing_ids(collection, ids)
+        self.chunks = {
+            h: [id for id in ids if str(uuid.UUID(id)) in existing]
+            for h, ids in self.chunks.items()
+        }
+        self.chunks = {h: ids for h, ids in self.chunks.items() if ids}
+        return len(ids) - len(existing)
+
+    def match(self, doc: Document) -> bool:
+        """Whether a chunk of the new version of the source is already stored.
+
+        Chunks are matched one by one (documents can be streamed); stored chunks never matched
+        are returned by `obsolete_ids` at the end.
+        """
+
+        h = chunk_hash(doc)
+        stored = self.chunks.get(h, [])
+        kept = self._kept.setdefault(h, [])
+        if len(kept) < len(stored):
+            kept.append(stored[len(kept)])
+            return True
+        return False
+
+    def obsolete_ids(self) -> List[str]:
+        """Ids of stored chunks not found in the new version of the source."""
+
+        obsolete = []
+        for h, ids in self.chunks.items():
+            obsolete += [id for id in ids if id not in self._kept.get(h, [])]
+
+        # what is kept (matched or just added) is the new content of the source
+        self.chunks = {h: ids for h, ids in self._kept.items() if ids}
+        self._kept = {}
+
+        log.info(f"{self.source}: {len(obsolete)} chunks removed")
+        return obsolete
+
+    def add(self, h: str) -> str:
+        """Register a new chunk of the source and return the id of its point.
+
+        The id only depends on user, source, content and occurrence of the content in the source:
+        storing the same version of a source again (e.g. retrying a failed ingestion) overwrites the same points.
+        """
+
+        kept = self._kept.setdefault(h, [])
+        taken = set(kept) | set(self.chunks.get(h, []))
+        n = len(kept)
+        while (
+            point_id := str(uuid.uuid5(uuid.NAMESPACE_OID, f"{self.key}:{h}:{n}"))
+        ) in taken:
+            n += 1
+        kept.append(point_id)
+        return point_id
@@ -0,0 +1,343 @@
+"""Streaming export and import of vector memory collections in a columnar archive.
+
+An archive is an uncompressed tar file with three members, in this order:
+
+- `header.json`: format version, collection name, embedder identity, vector size and number of points;
+- `vectors.npy`: float32 matrix (one row per point) in NumPy `.npy` format;
+- `payloads.ndjson`: one JSON line per point (`id`, `page_content`, `metadata`), same order of the vectors.
+
+Both directions stream through the collection scroll cursor / bounded batches, so memory usage
+does not depend on the size of the collection. Progress is saved on disk to resume after interruptions.
+"""
+
+import io
+import os
+import json
+import shutil
+import hashlib
+import tarfile
+from typing import Callable
+
+import numpy as np
+
+from cat.log import log
+
+
+ARCHIVES_PATH = "cat/data/memory_archives/"
+ARCHIVE_FORMAT_VERSION = 1
+ARCHIVE_MEMBERS = ["header.json", "vectors.npy", "payloads.ndjson"]
+
+
+class _ChainedReader:
+    """File-like object reading a bytes prefix followed by the content of a file."""
+
+    def __init__(self, prefix: bytes, path: str):
+        self.prefix = prefix
+        self.file = open(path, "rb")
+
+    def read(self, size: int = -1) -> bytes:
+        if self.prefix:
+            if size < 0 or size >= len(self.prefix):
+                chunk, self.prefix = self.prefix, b""
+                rest = self.file.read(size - len(chunk) if size >= 0 else -1)
+                return chunk + rest
+            chunk, self.prefix = self.prefix[:size], self.prefix[size:]
+            return chunk
+        return self.file.read(size)
+
+    def close(self):
+        self.file.close()
+
+
+def _load_progress(work_dir: str) -> dict | None:
+    progress_path = os.path.join(work_dir, "progress.json")
+    if not os.path.exists(progress_path):
+        return None
+    with open(progress_path, "r") as f:
+        return json.load(f)
+
+
+def _save_progress(work_dir: str, progress: dict):
+    progress_path = os.path.join(work_dir, "progress.json")
+    with open(progress_path + ".tmp", "w") as f:
+        json.dump(progress, f)
+    os.replace(progress_path + ".tmp", progress_path)
+
+
+def export_collection(
+    collection,
+    embedder: str,
+    folder: str = ARCHIVES_PATH,
+    batch_size: int = 1000,
+    since: float | None = None,
+    embedder_name: str | None = None,
+    on_progress: Callable[[int, int | None], None] | None = None,
+) -> str:
+    """Export a collection to a columnar archive.
+
+    Parameters
+    ----------
+    collection : VectorMemoryCollection
+        Collection to export.
+    embedder : str
+        Name of the embedder class, stored in the header and checked at import time.
+    folder : str
+        Where the archive is written.
+    batch_size : int
+        Number of points read at each scroll.
+    since : float
+        If set, only points with a `when` metadata greater than this timestamp are exported.
+    embedder_name : str
+        Embedder model stored in the header, defaults to the one of the collection.
+    on_progress : Callable[[int, int | None], None]
+        Called after each scroll with the number of exported points.
+
+    Returns
+    -------
+    archive_path : str
+        Path of the tar archive.
+
+    Notes
+    -----
+    If a previous export of the same collection and `since` was interrupted, it is resumed from the last saved
+    scroll offset.
+    """
+
+    name = collection.collection_name
+    # an incremental export never resumes (or overwrites) a full one, nor one with another `since`
+    stem = name if since is None else f"{name}_since_{since}"
+    work_dir = os.path.join(folder, f"export_{stem}")
+    os.makedirs(work_dir, exist_ok=True)
+
+    vectors_path = os.path.join(work_dir, "vectors.f32")
+    payloads_path = os.path.join(work_dir, "payloads.ndjson")
+
+    progress = _load_progress(work_dir)
+    if progress is None:
+        progress = {
+            "offset": None,
+            "scrolled": 0,
+            "rows": 0,
+            "dim": None,
+            "until": since,
+            "vectors_bytes": 0,
+            "payloads_bytes": 0,
+        }
+    else:
+        log.info(f'Resuming export of collection "{name}" from row {progress["rows"]}')
+
+    with open(vectors_path, "ab") as fv, open(payloads_path, "ab") as fp:
+        # drop anything written after the last saved progress
+        fv.truncate(progress["vectors_bytes"])
+        fp.truncate(progress["payloads_bytes"])
+
+        offset = progress["offset"]
+        scroll_finished = progress["scrolled"] > 0 and offset is None
+        while not scroll_finished:
+            points, offset = collection.get_all_points(limit=batch_size, offset=offset)
+            progress["scrolled"] += len(points)
+
+            if since is not None:
+                points = [p for p in points if _point_when(p) > since]
+
+            if points:
+                # vectors size is read from the data, a dump may be taken before switching embedder
+                vectors = np.asarray([p.vector for p in points], dtype=np.float32)
+                progress["dim"] = vectors.shape[1]
+                fv.write(vectors.tobytes())
+                for p in points:
+                    line = {
+                        "id": p.id,
+                        "page_content": p.payload.get("page_content"),
+                        "metadata": p.payload.get("metadata"),
+                    }
+                    fp.write((json.dumps(line) + "\n").encode("utf-8"))
+                fv.flush()
+                fp.flush()
+
+                progress["rows"] += len(points)
+                progress["until"] = max(
+                    [_point_when(p) for p in points] + [progress["until"] or 0]
+                )
+                progress["vectors_bytes"] = fv.tell()
+                progress["payloads_bytes"] = fp.tell()
+
+            progress["offset"] = offset
+            _save_progress(work_dir, progress)
+            log.debug(f'Exported {progress["rows"]} points of collection "{name}"')
+            if on_progress:
+                on_progress(progress["rows"], None)
+
+            scroll_finished = offset is None
+
+    dim = progress["dim"] or collection.embedder_size
+    header = {
+        "format_version": ARCHIVE_FORMAT_VERSION,
+        "collection": name,
+        "embedder": embedder,
+        "embedder_name": embedder_name or collection.embedder_name,
+        "dim": dim,
+        "count": progress["rows"],
+        "since": since,
+        "until": progress["until"],
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+
+    npy_header = _npy_header(progress["rows"], dim)
+
+    archive_path = os.path.join(folder, f"{stem}.tar")
+    with tarfile.open(archive_path + ".tmp", "w") as tar:
+        info = tarfile.TarInfo("header.json")
+        info.size = len(header_bytes)
+        tar.addfile(info, io.BytesIO(header_bytes))
+
+        info = tarfile.TarInfo("vectors.npy")
+        info.size = len(npy_header) + progress["vectors_bytes"]
+        reader = _ChainedReader(npy_header, vectors_path)
+        tar.addfile(info, reader)
+        reader.close()
+
+        tar.add(payloads_path, arcname="payloads.ndjson")
+    os.replace(archive_path + ".tmp", archive_path)
+
+    shutil.rmtree(work_dir)
+    log.info(f'Exported {progress["rows"]} points of collection "{name}" to {archive_path}')
+
+    return archive_path
+
+
+def _point_when(point) -> float:
+    metadata = point.payload.get("metadata") or {}
+    return float(metadata.get("when") or 0)
+
+
+def _npy_header(rows: int, dim: int) -> bytes:
+    header = {"descr": "<f4", "fortran_order": False, "shape": (rows, dim)}
+    buffer = io.BytesIO()
+    np.lib.format.write_array_header_1_0(buffer, header)
+    return buffer.getvalue()
+
+
+def read_archive_header(archive_path: str) -> dict:
+    """Read the header of an archive without extracting the rest."""
+    with tarfile.open(archive_path, "r") as tar:
+        member = tar.next()
+        if member is None or member.name != "header.json":
+            raise Exception("Invalid memory archive: header.json must be the first member")
+        return json.load(tar.extractfile(member))
+
+
+def import_collection(
+    collection,
+    embedder: str,
+    archive_path: str,
+    folder: str = ARCHIVES_PATH,
+    batch_size: int = 500,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> int:
+    """Import a columnar archive in a collection with bounded-size batched upserts.
+
+    Parameters
+    ----------
+    collection : VectorMemoryCollection
+        Collection receiving the points.
+    embedder : str
+        Name of the embedder class in use, must match the archive one.
+    archive_path : str
+        Path of the tar archive.
+    folder : str
+        Where the archive is extracted and the progress is saved.
+    batch_size : int
+        Number of points for each upsert.
+    on_progress : Callable[[int, int], None]
+        Called after each batch with the number of imported points and the total.
+
+    Returns
+    -------
+    imported : int
+        Number of points in the archive.
+
+    Notes
+    -----
+    Point ids are kept, so re-importing is idempotent. If the same archive was partially imported before,
+    the import is resumed from the last stored batch.
+    """
+
+    header = read_archive_header(archive_path)
+
+    if header.get("format_version") != ARCHIVE_FORMAT_VERSION:
+        raise Exception(f"Unsupported memory archive version {header.get('format_version')}")
+
+    # the embedder model must match; the class name is also checked when the model has no name,
+    # it is not stored in dumps taken while switching embedder
+    same_embedder = header.get("embedder_name") == collection.embedder_name and (
+        collection.embedder_name != "default_embedder" or header["embedder"] == embedder
+    )
+    if not same_embedder:
+        message = f"Embedder mismatch: file embedder {header['embedder']} is different from {embedder}"
+        raise Exception(message)
+
+    if header["dim"] != collection.embedder_size:
+        message = f"Embedding size mismatch: vectors length should be {collection.embedder_size}"
+        raise Exception(message)
+
+    # same archive, same work dir: allows to resume
+    digest = hashlib.sha256()
+    with open(archive_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    work_dir = os.path.join(folder, f"import_{digest.hexdigest()[:16]}")
+    os.makedirs(work_dir, exist_ok=True)
+
+    progress = _load_progress(work_dir)
+    if progress is None:
+        with tarfile.open(archive_path, "r") as tar:
+            for member in tar:
+                if member.name in ARCHIVE_MEMBERS and member.isfile():
+                    with tar.extractfile(member) as src, open(
+                        os.path.join(work_dir, member.name), "wb"
+                    ) as dst:
+                        shutil.copyfileobj(src, dst)
+        progress = {"rows": 0}
+        _save_progress(work_dir, progress)
+    else:
+        log.info(f"Resuming import of {archive_path} from row {progress['rows']}")
+
+    vectors = np.load(os.path.join(work_dir, "vectors.npy"), mmap_mode="r")
+    total = header["count"]
+    if vectors.shape != (total, header["dim"]):
+        raise Exception("Invalid memory archive: vectors do not match the header")
+
+    def upsert(vectors, rows_start, lines):
+        payloads = [json.loads(line) for line in lines]
+        collection.add_points(
+            contents=[p["page_content"] for p in payloads],
+            vectors=vectors[rows_start : rows_start + len(payloads)].tolist(),
+            metadatas=[p["metadata"] for p in payloads],
+            ids=[p["id"] for p in payloads],
+        )
+        progress["rows"] = rows_start + len(payloads)
+        _save_progress(work_dir, progress)
+        if on_progress:
+            on_progress(progress["rows"], total)
+
+    with open(os.path.join(work_dir, "payloads.ndjson"), "r", encoding="utf-8") as f:
+        batch = []
+        batch_start = progress["rows"]
+        for row, line in enumerate(f):
+            if row < progress["rows"]:
+                continue
+            batch.append(line)
+            if len(batch) == batch_size:
+                upsert(vectors, batch_start, batch)
+                batch_start += len(batch)
+                batch = []
+        if batch:
+            upsert(vectors, batch_start, batch)
+
+    # release the memory map before removing its file
+    del vectors
+    shutil.rmtree(work_dir)
+    log.info(f'Imported {total} points in collection "{collection.collection_name}"')
+
+    return total
@@ -0,0 +1,242 @@
+"""Near-duplicate detection of chunks at ingestion.
+
+Documents repeat a lot of boilerplate (headers, footers, disclaimers, slide templates). With
+`CCAT_NEAR_DUPLICATES=upload`, chunks nearly identical to a chunk already stored during the same upload
+are skipped before they reach the embedder. With `CCAT_NEAR_DUPLICATES=collection`, chunks nearly identical
+to a chunk previously stored by the same user (from any source) are skipped as well.
+
+Chunks are compared by the Jaccard similarity of their word 3-grams, estimated with MinHash signatures.
+Signatures of a batch of chunks are computed in a single vectorized pass, and candidates are found with
+locality-sensitive hashing (bands of the signature used as bucket keys), so each chunk is compared
+only with a handful of others.
+"""
+
+import os
+import re
+import zlib
+import hashlib
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+
+from cat.log import log
+
+
+NEAR_DUPLICATES_PATH = "cat/data/near_duplicates/"
+
+# 2^61 - 1
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def _shingles(text: str, size: int = 3) -> List[str]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i : i + size]) for i in range(len(words) - size + 1)]
+
+
+class NearDuplicateIndex:
+    """MinHash LSH index of the chunks of a user, see module docstring.
+
+    Parameters
+    ----------
+    threshold : float
+        Minimum estimated Jaccard similarity for two chunks to be near-duplicates.
+    path : str
+        File the index is persisted in (collection mode), None to keep it for one upload only.
+    num_perm : int
+        Length of the MinHash signatures.
+    bands : int
+        Number of LSH bands, `num_perm` must be a multiple of it.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        path: str | None = None,
+        num_perm: int = 128,
+        bands: int = 16,
+    ):
+        self.threshold = threshold
+        self.path = path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        # same permutations in every process, as signatures are persisted
+        rng = np.random.RandomState(1)
+        self._a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+        # rows beyond len(self.ids) are free room, see `_append`
+        self._signatures = np.empty((1024, num_perm), dtype=np.uint32)
+        self.ids: List[str] = []
+        self.sources: List[str] = []
+        # (band, band bytes) -> rows of the signatures
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        self._removed: Set[int] = set()
+
+        if path and os.path.exists(path):
+            try:
+                with np.load(path) as data:
+                    self._append(
+                        data["signatures"], data["ids"].tolist(), data["sources"].tolist()
+                    )
+            except Exception as e:
+                log.warning(f"Near-duplicates index {path} unreadable, starting a new one: {e}")
+        # rows before this one were indexed by previous uploads
+        self._first_new = len(self.ids)
+
+    @classmethod
+    def for_user(cls, user_id: str, threshold: float, folder: str = NEAR_DUPLICATES_PATH):
+        key = hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+        return cls(threshold, path=os.path.join(folder, key + ".npz"))
+
+    def signature_matrix(self, texts: List[str]) -> np.ndarray:
+        """MinHash signatures of texts, one row each. Texts without words get a row of max values."""
+
+        shingles = [_shingles(text) for text in texts]
+        counts = np.array([len(s) for s in shingles])
+        signatures = np.full((len(texts), self.num_perm), _MAX_HASH, dtype=np.uint64)
+        if counts.sum() == 0:
+            return signatures.astype(np.uint32)
+
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for doc in shingles for s in doc),
+            dtype=np.uint64,
+            count=int(counts.sum()),
+        )
+        # universal hashing of every shingle with every permutation at once
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+
+        non_empty = counts > 0
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))[non_empty]
+        signatures[non_empty] = np.minimum.reduceat(permuted, offsets, axis=0)
+        return signatures.astype(np.uint32)
+
+    def filter(
+        self,
+        ids: List[str],
+        texts: List[str],
+        source: str,
+        exclude_source: bool = False,
+        exists: Callable[[List[str]], Set[str]] | None = None,
+    ) -> List[bool]:
+        """Check a batch of chunks and add the new ones to the index.
+
+        Parameters
+        ----------
+        ids : List[str]
+            Ids of the points the chunks will be stored as.
+        texts : List[str]
+            Contents of the chunks.
+        source : str
+            Source of the chunks.
+        exclude_source : bool
+            Ignore chunks of the same source added before this upload (they are being replaced).
+        exists : Callable[[List[str]], Set[str]]
+            Given ids of indexed chunks, return those still in memory. Indexed chunks deleted from memory
+            are forgotten instead of hiding new ones.
+
+        Returns
+        -------
+        kept : List[bool]
+            For each chunk, False if it is a near-duplicate of an indexed chunk.
+        """
+
+        signatures = self.signature_matrix(texts)
+        first_new = self._first_new
+        kept = []
+        for id, text, signature in zip(ids, texts, signatures):
+            if (signature == _MAX_HASH).all():
+                # no words to compare
+                kept.append(True)
+                continue
+
+            candidates = [
+                row
+                for row in self._candidates(signature)
+                if not (exclude_source and row < first_new and self.sources[row] == source)
+            ]
+            duplicate = None
+            if candidates:
+                similarity = (self.signatures[candidates] == signature).mean(axis=1)
+                matches = [c for c, s in zip(candidates, similarity) if s >= self.threshold]
+                # chunks indexed before this upload may have been deleted since
+                old = [self.ids[row] for row in matches if row < first_new]
+                alive = exists(old) if (exists and old) else set(old)
+                for row in matches:
+                    if row >= first_new or self.ids[row] in alive:
+                        duplicate = row
+                        break
+                    self._remove_row(row)
+
+            if duplicate is None:
+                self._append(signature[None, :], [id], [source])
+                kept.append(True)
+            else:
+                log.debug(f"Near-duplicate of {self.ids[duplicate]} skipped: {text[:80]}")
+                kept.append(False)
+
+        return kept
+
+    def remove(self, ids: Iterable[str]):
+        """Forget chunks (e.g. deleted from memory)."""
+        ids = set(ids)
+        for row, id in enumerate(self.ids):
+            if id in ids:
+                self._remove_row(row)
+
+    def relabel(self, ids: Dict[str, str]):
+        """Change the ids of chunks just indexed (e.g. to the ids they are finally stored with)."""
+        for row in range(max(len(self.ids) - len(ids), 0), len(self.ids)):
+            self.ids[row] = ids.get(self.ids[row], self.ids[row])
+
+    def save(self):
+        if not self.path:
+            return
+        alive = [row for row in range(len(self.ids)) if row not in self._removed]
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp.npz"
+        np.savez(
+            tmp,
+            signatures=self.signatures[alive],
+            ids=np.array([self.ids[row] for row in alive], dtype=str),
+            sources=np.array([self.sources[row] for row in alive], dtype=str),
+        )
+        os.replace(tmp, self.path)
+
+    @property
+    def signatures(self) -> np.ndarray:
+        return self._signatures[: len(self.ids)]
+
+    def _candidates(self, signature: np.ndarray) -> List[int]:
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            candidates.update(self._buckets.get((band, key), []))
+        return sorted(candidates - self._removed)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            signature[band * self.rows : (band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def _append(self, signatures: np.ndarray, ids: List[str], sources: List[str]):
+        start = len(self.ids)
+        if start + len(ids) > len(self._signatures):
+            grown = np.empty(
+                (max(2 * len(self._signatures), start + len(ids)), self.num_perm), dtype=np.uint32
+            )
+            grown[:start] = self.signatures
+            self._signatures = grown
+        self._signatures[start : start + len(ids)] = signatures
+        self.ids += ids
+        self.sources += sources
+        for row, signature in enumerate(self._signatures[start : start + len(ids)], start):
+            for band, key in enumerate(self._band_keys(signature)):
+                self._buckets.setdefault((band, key), []).append(row)
+
+    def _remove_row(self, row: int):
+        self._removed.add(row)
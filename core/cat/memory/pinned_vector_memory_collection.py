@@ -0,0 +1,98 @@
+from typing import List
+
+import numpy as np
+
+from langchain.docstore.document import Document
+
+from cat.memory.embedded_vector_memory_collection import (
+    conditions_from_dict,
+    payload_matches,
+)
+from cat.log import log
+
+
+class PinnedVectorMemoryCollection:
+    """Vector collection with recall served from RAM.
+
+    Wraps a `VectorMemoryCollection` (or any collection with the same interface) and keeps a copy
+    of all its points in an in-process NumPy matrix. Writes and reads other than recall go to the
+    wrapped collection, recall is a single vectorized cosine scoring with no vector DB round-trip.
+
+    Meant for small collections that change rarely, i.e. procedural memory which only holds
+    tools and forms triggers. The copy must be refreshed after the wrapped collection changes.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.refresh()
+
+    def __getattr__(self, name):
+        # avoid infinite recursion if `collection` is not set yet (i.e. during copies)
+        if name == "collection":
+            raise AttributeError(name)
+        return getattr(self.collection, name)
+
+    def refresh(self):
+        """Reload all the points of the wrapped collection in RAM."""
+
+        points = []
+        offset = None
+        while True:
+            page, offset = self.collection.get_all_points(offset=offset)
+            points += page
+            if offset is None:
+                break
+
+        self._ids = [p.id for p in points]
+        self._payloads = [p.payload for p in points]
+
+        vectors = np.asarray(
+            [p.vector for p in points], dtype=np.float32
+        ).reshape(len(points), self.collection.embedder_size)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self._vectors = vectors / norms
+
+        log.debug(
+            f'Collection "{self.collection.collection_name}" pinned in RAM with {len(points)} points'
+        )
+
+    def recall_memories_from_embedding(
+        self, embedding, metadata=None, k=5, threshold=None, with_vectors=True
+    ) -> List[tuple]:
+        """Retrieve similar memories from embedding, same output of `VectorMemoryCollection`."""
+
+        if len(self._ids) == 0 or not k:
+            return []
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query)
+        if query_norm > 0:
+            query = query / query_norm
+
+        scores = self._vectors @ query
+        conditions = conditions_from_dict(metadata)
+
+        langchain_documents_from_points = []
+        for i in np.argsort(-scores, kind="stable"):
+            if threshold is not None and scores[i] < threshold:
+                break
+            payload = self._payloads[i]
+            if conditions and not payload_matches(payload, conditions):
+                continue
+
+            langchain_documents_from_points.append(
+                (
+                    Document(
+                        page_content=payload.get("page_content"),
+                        metadata=payload.get("metadata") or {},
+                    ),
+                    float(scores[i]),
+                    self._vectors[i].tolist() if with_vectors else None,
+                    self._ids[i],
+                )
+            )
+            if len(langchain_documents_from_points) == k:
+                break
+
+        return langchain_documents_from_points
@@ -0,0 +1,330 @@
+"""Collection snapshots: streamed to disk, checksummed, resumable and available in every memory mode.
+
+- Remote Qdrant snapshots are downloaded in chunks (with a timeout), resuming a partial download with a
+  `Range` request, and verified against the checksum computed by Qdrant.
+- Snapshots taken from the Cat are columnar archives (see `cat.memory.memory_archive`), exported from
+  storage through the scroll cursor, so they also work with local Qdrant and the embedded backend.
+  Incremental snapshots only contain points whose `when` metadata is newer than the previous snapshot;
+  every archive of a collection is listed in a manifest, so the chain can be restored in order.
+- Every file gets a `.sha256` companion, checked before restoring.
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+from typing import Callable, Dict, List
+
+import requests
+
+from cat.log import log
+from cat.memory.memory_archive import (
+    export_collection,
+    import_collection,
+    read_archive_header,
+)
+
+
+SNAPSHOTS_PATH = "dormouse/"
+CHUNK_SIZE = 1024 * 1024
+
+# state of the snapshot jobs run by the WhiteRabbit, indexed by job id
+snapshot_jobs: Dict[str, Dict] = {}
+
+
+class SnapshotJobRunning(Exception):
+    """Raised when a snapshot job is scheduled on a collection that already has one in progress."""
+
+
+def file_checksum(path: str) -> str:
+    """Compute the SHA-256 of a file, reading it in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_checksum(path: str, checksum: str | None = None) -> str:
+    """Write a `sha256sum` compatible companion file and return the checksum."""
+    checksum = checksum or file_checksum(path)
+    with open(path + ".sha256", "w") as f:
+        f.write(f"{checksum}  {os.path.basename(path)}\n")
+    return checksum
+
+
+def verify_checksum(path: str):
+    """Raise if the file does not match its `.sha256` companion."""
+    with open(path + ".sha256", "r") as f:
+        expected = f.read().split()[0]
+    if file_checksum(path) != expected:
+        raise Exception(f"Checksum mismatch for snapshot {path}")
+
+
+def download_snapshot(
+    url: str,
+    path: str,
+    checksum: str | None = None,
+    timeout: float = 60,
+    on_progress: Callable[[int, int | None], None] | None = None,
+) -> str:
+    """Stream a snapshot from `url` to `path` in chunks.
+
+    A partial download of the same `url` is resumed with a `Range` request when the server supports it;
+    partial downloads of other snapshots to `path` are deleted. If `checksum` is given, the downloaded file
+    is verified against it.
+
+    Returns
+    -------
+    checksum : str
+        SHA-256 of the downloaded file.
+    """
+
+    # named after the snapshot: a part of another snapshot saved to the same path is never resumed
+    part_path = f"{path}.{hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]}.part"
+    _remove_stale_parts(path, keep=part_path)
+    downloaded = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={downloaded}-"} if downloaded else {}
+
+    with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+
+        if downloaded and response.status_code != 206:
+            # range not supported, start over
+            downloaded = 0
+
+        digest = hashlib.sha256()
+        if downloaded:
+            with open(part_path, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+
+        total = response.headers.get("Content-Length")
+        total = int(total) + downloaded if total else None
+
+        with open(part_path, "ab" if downloaded else "wb") as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+                digest.update(chunk)
+                downloaded += len(chunk)
+                if on_progress:
+                    on_progress(downloaded, total)
+
+    if checksum and digest.hexdigest() != checksum:
+        os.remove(part_path)
+        raise Exception(f"Checksum mismatch while downloading snapshot {url}")
+
+    os.replace(part_path, path)
+    return write_checksum(path, digest.hexdigest())
+
+
+def _remove_stale_parts(path: str, keep: str):
+    folder = os.path.dirname(path) or "."
+    prefix = os.path.basename(path) + "."
+    for name in os.listdir(folder):
+        part_path = os.path.join(folder, name)
+        if name.startswith(prefix) and name.endswith(".part") and part_path != keep:
+            log.info(f"Removing stale partial download {part_path}")
+            os.remove(part_path)
+
+
+def dump_remote_collection(collection, folder: str = SNAPSHOTS_PATH, alias: str | None = None) -> str:
+    """Create a native snapshot on the remote Qdrant and stream it to disk."""
+
+    os.makedirs(folder, exist_ok=True)
+
+    client = collection.client
+    host = client._client._host
+    port = client._client._port
+    snapshot_info = client.create_snapshot(collection_name=collection.storage_name)
+
+    url = (
+        f"http://{host}:{port}/collections/{collection.storage_name}"
+        f"/snapshots/{snapshot_info.name}"
+    )
+    alias = alias or collection.embedder_name + "_" + collection.storage_name
+    path = os.path.join(folder, alias.replace("/", "-") + ".snapshot")
+
+    download_snapshot(url, path, checksum=getattr(snapshot_info, "checksum", None))
+
+    for s in client.list_snapshots(collection.storage_name):
+        client.delete_snapshot(
+            collection_name=collection.storage_name, snapshot_name=s.name
+        )
+
+    return path
+
+
+def _manifest_path(folder: str, alias: str) -> str:
+    return os.path.join(folder, alias.replace("/", "-") + ".manifest.json")
+
+
+def load_manifest(folder: str, alias: str) -> List[Dict]:
+    """List of the archive snapshots of a collection, oldest first."""
+    path = _manifest_path(folder, alias)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        return json.load(f)["snapshots"]
+
+
+def take_snapshot(
+    collection,
+    embedder: str,
+    incremental: bool = False,
+    folder: str = SNAPSHOTS_PATH,
+    alias: str | None = None,
+    on_progress: Callable[[int, int | None], None] | None = None,
+) -> str:
+    """Export a collection to a checksummed snapshot archive.
+
+    Parameters
+    ----------
+    collection : VectorMemoryCollection
+        Collection to snapshot.
+    embedder : str
+        Name of the embedder class.
+    incremental : bool
+        Only export points newer than the last snapshot of the collection (deletions are not tracked).
+    folder : str
+        Where snapshots and manifest are saved.
+    alias : str
+        Embedder and collection identity, defaults to the current one of the collection.
+    on_progress : Callable[[int, int | None], None]
+        Called with the number of exported points.
+
+    Returns
+    -------
+    path : str
+        Path of the snapshot archive.
+    """
+
+    alias = alias or collection.embedder_name + "_" + collection.storage_name
+    embedder_name = alias[: -len("_" + collection.storage_name)]
+    os.makedirs(folder, exist_ok=True)
+
+    manifest = load_manifest(folder, alias)
+    since = None
+    if incremental and manifest:
+        since = manifest[-1]["until"] or 0
+
+    archive_path = export_collection(
+        collection,
+        embedder=embedder,
+        folder=folder,
+        since=since,
+        embedder_name=embedder_name,
+        on_progress=on_progress,
+    )
+
+    header_until = read_archive_header(archive_path)["until"]
+    path = os.path.join(
+        folder, f"{alias.replace('/', '-')}.{int(time.time() * 1000)}.tar"
+    )
+    os.replace(archive_path, path)
+    checksum = write_checksum(path)
+
+    manifest.append(
+        {
+            "file": os.path.basename(path),
+            "sha256": checksum,
+            "incremental": since is not None,
+            "since": since,
+            "until": header_until,
+        }
+    )
+    with open(_manifest_path(folder, alias) + ".tmp", "w") as f:
+        json.dump({"snapshots": manifest}, f, indent=2)
+    os.replace(_manifest_path(folder, alias) + ".tmp", _manifest_path(folder, alias))
+
+    log.info(f'Snapshot "{path}" completed')
+    return path
+
+
+def restore_snapshots(
+    collection,
+    embedder: str,
+    folder: str = SNAPSHOTS_PATH,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> int:
+    """Restore the latest full snapshot of a collection followed by its incremental snapshots.
+
+    Returns
+    -------
+    restored : int
+        Number of points imported.
+    """
+
+    alias = collection.embedder_name + "_" + collection.storage_name
+    manifest = load_manifest(folder, alias)
+
+    full = [i for i, s in enumerate(manifest) if not s["incremental"]]
+    if not full:
+        raise Exception(f"No snapshot available for {alias}")
+
+    restored = 0
+    for snapshot in manifest[full[-1] :]:
+        path = os.path.join(folder, snapshot["file"])
+        verify_checksum(path)
+        restored += import_collection(
+            collection, embedder=embedder, archive_path=path, on_progress=on_progress
+        )
+
+    log.info(f"Restored {restored} points from snapshots of {alias}")
+    return restored
+
+
+def run_snapshot_job(snapshot_job_id: str, task: Callable, **kwargs):
+    """Run a snapshot task keeping track of its status and progress in `snapshot_jobs`."""
+
+    job = snapshot_jobs[snapshot_job_id]
+    job["status"] = "running"
+
+    def on_progress(done, total):
+        job["progress"] = done
+        job["total"] = total
+
+    try:
+        job["result"] = task(on_progress=on_progress, **kwargs)
+        job["status"] = "completed"
+    except Exception as e:
+        log.error(f"Snapshot job {snapshot_job_id} failed: {e}")
+        job["status"] = "failed"
+        job["error"] = str(e)
+
+
+def schedule_snapshot_job(white_rabbit, task: Callable, **kwargs) -> str:
+    """Run a snapshot task (`take_snapshot` or `restore_snapshots`) in background with the WhiteRabbit.
+
+    Only one job at a time runs on a collection, `SnapshotJobRunning` is raised otherwise.
+    """
+
+    collection_name = kwargs["collection"].storage_name
+    for job in snapshot_jobs.values():
+        if job["collection"] == collection_name and job["status"] in ["scheduled", "running"]:
+            raise SnapshotJobRunning(
+                f'Snapshot job {job["id"]} is in progress on collection "{collection_name}"'
+            )
+
+    snapshot_job_id = f"{task.__name__}-{uuid.uuid4().hex[:8]}"
+    snapshot_jobs[snapshot_job_id] = {
+        "id": snapshot_job_id,
+        "task": task.__name__,
+        "collection": collection_name,
+        "status": "scheduled",
+        "progress": 0,
+        "total": None,
+        "result": None,
+        "error": None,
+    }
+
+    white_rabbit.schedule_job(
+        run_snapshot_job,
+        job_id=snapshot_job_id,
+        snapshot_job_id=snapshot_job_id,
+        task=task,
+        **kwargs,
+    )
+
+    return snapshot_job_id
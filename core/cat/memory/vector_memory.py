@@ -5,6 +5,8 @@ from cat.utils import extract_domain_from_url, is_https
 from qdrant_client import QdrantClient
 
 from cat.memory.vector_memory_collection import VectorMemoryCollection
+from cat.memory.embedded_vector_memory_collection import EmbeddedVectorMemoryCollection
+from cat.memory.pinned_vector_memory_collection import PinnedVectorMemoryCollection
 from cat.log import log
 from cat.env import get_env
 # from cat.utils import singleton
@@ -13,11 +15,13 @@ from cat.env import get_env
 # @singleton REFACTOR: worth it to have this (or LongTermMemory) as singleton?
 class VectorMemory:
     local_vector_db = None
+    collection_class = VectorMemoryCollection
 
     def __init__(
         self,
         embedder_name=None,
         embedder_size=None,
+        storage_names=None,
     ) -> None:
         # connects to Qdrant and creates self.vector_db attribute
         self.connect_to_vector_memory()
@@ -29,13 +33,20 @@ class VectorMemory:
         self.collections = {}
         for collection_name in ["episodic", "declarative", "procedural"]:
             # Instantiate collection
-            collection = VectorMemoryCollection(
+            collection = self.collection_class(
                 client=self.vector_db,
                 collection_name=collection_name,
                 embedder_name=embedder_name,
                 embedder_size=embedder_size,
+                # collections re-embedded for a new embedder live under another name in the DB
+                storage_name=(storage_names or {}).get(collection_name),
             )
 
+            # Procedural memory is small, changes only on plugins sync and is recalled every turn:
+            #   serve its recall from RAM (refreshed in CheshireCat.embed_procedures)
+            if collection_name == "procedural":
+                collection = PinnedVectorMemoryCollection(collection)
+
             # Update dictionary containing all collections
             # Useful for cross-searching and to create/use collections from plugins
             self.collections[collection_name] = collection
@@ -48,7 +59,12 @@ class VectorMemory:
         db_path = "cat/data/local_vector_memory/"
         qdrant_host = get_env("CCAT_QDRANT_HOST")
 
-        if not qdrant_host:
+        if not qdrant_host and get_env("CCAT_VECTOR_MEMORY_BACKEND") == "embedded":
+            log.debug("Using embedded vector memory")
+            # collections are stored in memory-mapped files, no client involved
+            self.vector_db = None
+            self.collection_class = EmbeddedVectorMemoryCollection
+        elif not qdrant_host:
             log.debug(f"Qdrant path: {db_path}")
             # Qdrant local vector DB client
 
@@ -83,12 +99,19 @@ class VectorMemory:
                 api_key=qdrant_api_key,
             )
 
+    def is_embedded(self) -> bool:
+        return self.collection_class is EmbeddedVectorMemoryCollection
+
     def delete_collection(self, collection_name: str):
         """Delete specific vector collection"""
-        
-        return self.vector_db.delete_collection(collection_name)
+
+        return self.collections[collection_name].delete_collection()
     
     def get_collection(self, collection_name: str):
         """Get collection info"""
-        
-        return self.vector_db.get_collection(collection_name)
+
+        if self.is_embedded():
+            return self.collections[collection_name].get_collection_info()
+        return self.vector_db.get_collection(
+            self.collections[collection_name].storage_name
+        )
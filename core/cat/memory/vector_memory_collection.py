@@ -1,7 +1,5 @@
-import os
 import uuid
-from typing import Any, List, Iterable, Optional
-import requests
+from typing import Any, Dict, List, Iterable, Optional
 
 from qdrant_client.qdrant_remote import QdrantRemote
 from qdrant_client.http.models import (
@@ -11,6 +9,7 @@ from qdrant_client.http.models import (
     Filter,
     FieldCondition,
     MatchValue,
+    Range,
     SearchParams,
     ScalarQuantization,
     ScalarQuantizationConfig,
@@ -19,12 +18,17 @@ from qdrant_client.http.models import (
     CreateAliasOperation,
     CreateAlias,
     OptimizersConfigDiff,
+    PayloadSchemaType,
+    SetPayload,
+    SetPayloadOperation,
 )
 
 from langchain.docstore.document import Document
 
 from cat.log import log
 from cat.env import get_env
+from cat.memory.snapshots import dump_remote_collection, take_snapshot
+from cat.memory.write_journal import journaled
 
 
 class VectorMemoryCollection:
@@ -34,10 +38,13 @@ class VectorMemoryCollection:
         collection_name: str,
         embedder_name: str,
         embedder_size: int,
+        storage_name: str | None = None,
     ):
         # Set attributes (metadata on the embedder are useful because it may change at runtime)
         self.client = client
         self.collection_name = collection_name
+        # name of the collection in the vector DB, differs from collection_name after a re-embedding
+        self.storage_name = storage_name or collection_name
         self.embedder_name = embedder_name
         self.embedder_size = embedder_size
 
@@ -49,19 +56,19 @@ class VectorMemoryCollection:
 
         # log collection info
         log.debug(f"Collection {self.collection_name}:")
-        log.debug(self.client.get_collection(self.collection_name))
+        log.debug(self.client.get_collection(self.storage_name))
 
     def check_embedding_size(self):
         # having the same size does not necessarily imply being the same embedder
         # having vectors with the same size but from diffent embedder in the same vector space is wrong
         same_size = (
-            self.client.get_collection(self.collection_name).config.params.vectors.size
+            self.client.get_collection(self.storage_name).config.params.vectors.size
             == self.embedder_size
         )
-        alias = self.embedder_name + "_" + self.collection_name
+        alias = self.embedder_name + "_" + self.storage_name
         if (
             alias
-            == self.client.get_collection_aliases(self.collection_name)
+            == self.client.get_collection_aliases(self.storage_name)
             .aliases[0]
             .alias_name
             and same_size
@@ -75,7 +82,7 @@ class VectorMemoryCollection:
                 # dump collection on disk before deleting
                 self.save_dump()
 
-            self.client.delete_collection(self.collection_name)
+            self.client.delete_collection(self.storage_name)
             log.warning(f'Collection "{self.collection_name}" deleted')
             self.create_collection()
 
@@ -83,7 +90,7 @@ class VectorMemoryCollection:
         # is collection present in DB?
         collections_response = self.client.get_collections()
         for c in collections_response.collections:
-            if c.name == self.collection_name:
+            if c.name == self.storage_name:
                 # collection exists. Do nothing
                 log.debug(
                     f'Collection "{self.collection_name}" already present in vector store'
@@ -96,7 +103,7 @@ class VectorMemoryCollection:
     def create_collection(self):
         log.warning(f'Creating collection "{self.collection_name}" ...')
         self.client.recreate_collection(
-            collection_name=self.collection_name,
+            collection_name=self.storage_name,
             vectors_config=VectorParams(
                 size=self.embedder_size, distance=Distance.COSINE
             ),
@@ -114,8 +121,8 @@ class VectorMemoryCollection:
             change_aliases_operations=[
                 CreateAliasOperation(
                     create_alias=CreateAlias(
-                        collection_name=self.collection_name,
-                        alias_name=self.embedder_name + "_" + self.collection_name,
+                        collection_name=self.storage_name,
+                        alias_name=self.embedder_name + "_" + self.storage_name,
                     )
                 )
             ]
@@ -189,9 +196,10 @@ class VectorMemoryCollection:
             vector=vector,
         )
 
-        update_status = self.client.upsert(
-            collection_name=self.collection_name, points=[point], **kwargs
-        )
+        with journaled(self.storage_name, ids=[point.id]):
+            update_status = self.client.upsert(
+                collection_name=self.storage_name, points=[point], **kwargs
+            )
 
         if update_status.status == "completed":
             # returnign stored point
@@ -199,32 +207,118 @@ class VectorMemoryCollection:
         else:
             return None
 
-    def delete_points_by_metadata_filter(self, metadata=None):
-        res = self.client.delete(
-            collection_name=self.collection_name,
-            points_selector=self._qdrant_filter_from_dict(metadata),
+    def add_points(
+        self,
+        contents: List[str],
+        vectors: List[Iterable],
+        metadatas: List[dict] = None,
+        ids: List[Optional[str]] = None,
+        **kwargs: Any,
+    ) -> List[PointStruct]:
+        """Add a batch of points (and their metadata) to the vectorstore with a single upsert.
+
+        Args:
+            contents: original texts.
+            vectors: Embedding vectors, one per text.
+            metadatas: Optional metadata dicts, one per text.
+            ids: Optional ids, one per text. Ids have to be uuid-like strings.
+
+        Returns:
+            List of points as saved into the vectorstore.
+        """
+
+        metadatas = metadatas or [None] * len(contents)
+        ids = ids or [None] * len(contents)
+        points = [
+            PointStruct(
+                id=id or uuid.uuid4().hex,
+                payload={
+                    "page_content": content,
+                    "metadata": metadata,
+                },
+                vector=vector,
+            )
+            for content, vector, metadata, id in zip(contents, vectors, metadatas, ids)
+        ]
+
+        with journaled(self.storage_name, ids=[p.id for p in points]):
+            update_status = self.client.upsert(
+                collection_name=self.storage_name, points=points, **kwargs
+            )
+
+        if update_status.status == "completed":
+            return points
+        else:
+            return []
+
+    def update_metadata(self, metadata: Dict[str, dict]):
+        """Merge keys in the metadata of points (point id -> keys), with a single request."""
+        if not metadata:
+            return None
+        with journaled(self.storage_name, ids=metadata.keys()):
+            return self.client.batch_update_points(
+                collection_name=self.storage_name,
+                update_operations=[
+                    SetPayloadOperation(
+                        set_payload=SetPayload(payload=keys, points=[id], key="metadata")
+                    )
+                    for id, keys in metadata.items()
+                ],
+            )
+
+    def create_payload_index(self, field: str, schema: str = "keyword"):
+        """Index a payload field (e.g. `metadata.tags`), so filters on it do not scan the points.
+
+        Creating an index that already exists does nothing.
+        """
+        return self.client.create_payload_index(
+            collection_name=self.storage_name,
+            field_name=field,
+            field_schema=PayloadSchemaType(schema),
         )
+
+    def delete_points_by_metadata_filter(self, metadata=None):
+        with journaled(self.storage_name, deleted_filter=metadata):
+            res = self.client.delete(
+                collection_name=self.storage_name,
+                points_selector=self._qdrant_filter_from_dict(metadata),
+            )
         return res
 
+    def delete_points_older_than(self, when: float) -> int:
+        """Delete points whose `when` metadata is older than a timestamp, with a server side range filter.
+
+        Returns the number of deleted points.
+        """
+        older = Filter(must=[FieldCondition(key="metadata.when", range=Range(lt=when))])
+        with journaled(self.storage_name, deleted_before=when):
+            n = self.client.count(
+                collection_name=self.storage_name, count_filter=older, exact=True
+            ).count
+            if n:
+                self.client.delete(collection_name=self.storage_name, points_selector=older)
+        return n
+
     def delete_points(self, points_ids):
         """Delete point in collection"""
-        res = self.client.delete(
-            collection_name=self.collection_name,
-            points_selector=points_ids,
-        )
+        with journaled(self.storage_name, ids=points_ids):
+            res = self.client.delete(
+                collection_name=self.storage_name,
+                points_selector=points_ids,
+            )
         return res
 
     def recall_memories_from_embedding(
-        self, embedding, metadata=None, k=5, threshold=None
+        self, embedding, metadata=None, k=5, threshold=None, with_vectors=True
     ):
         """Retrieve similar memories from embedding"""
 
         memories = self.client.search(
-            collection_name=self.collection_name,
+            collection_name=self.storage_name,
             query_vector=embedding,
             query_filter=self._qdrant_filter_from_dict(metadata),
             with_payload=True,
-            with_vectors=True,
+            with_vectors=with_vectors,
             limit=k,
             score_threshold=threshold,
             search_params=SearchParams(
@@ -257,25 +351,31 @@ class VectorMemoryCollection:
 
         return langchain_documents_from_points
     
-    def get_points(self, ids: List[str]):
+    def get_points(self, ids: List[str], with_vectors: bool = True, with_payload: bool = True):
         """Get points by their ids."""
         return self.client.retrieve(
-            collection_name=self.collection_name,
+            collection_name=self.storage_name,
             ids=ids,
-            with_vectors=True,
+            with_vectors=with_vectors,
+            with_payload=with_payload,
         )
 
     def get_all_points(
             self,
             limit: int = 10000,
-            offset: str | None = None
+            offset: str | None = None,
+            with_vectors: bool = True,
+            with_payload: bool | List[str] = True,
         ):
-        """Retrieve all the points in the collection with an optional offset and limit."""
-        
+        """Retrieve all the points in the collection with an optional offset and limit.
+
+        `with_payload` can be a list of payload keys to retrieve (e.g. `["metadata.when"]`)."""
+
         # retrieving the points
         all_points, next_page_offset = self.client.scroll(
-            collection_name=self.collection_name,
-            with_vectors=True,
+            collection_name=self.storage_name,
+            with_vectors=with_vectors,
+            with_payload=with_payload,
             offset=offset,  # Start from the given offset, or the beginning if None.
             limit=limit # Limit the number of points retrieved to the specified limit.
         )
@@ -285,47 +385,28 @@ class VectorMemoryCollection:
     def db_is_remote(self):
         return isinstance(self.client._client, QdrantRemote)
 
+    def delete_collection(self):
+        with journaled(self.storage_name, wipe=True):
+            return self.client.delete_collection(self.storage_name)
+
     # dump collection on disk before deleting
     def save_dump(self, folder="dormouse/"):
-        # only do snapshotting if using remote Qdrant
-        if not self.db_is_remote():
-            return
-
-        host = self.client._client._host
-        port = self.client._client._port
-
-        if os.path.isdir(folder):
-            log.debug("Directory dormouse exists")
-        else:
-            log.info("Directory dormouse does NOT exists, creating it.")
-            os.mkdir(folder)
-
-        self.snapshot_info = self.client.create_snapshot(
-            collection_name=self.collection_name
-        )
-        snapshot_url_in = (
-            "http://"
-            + str(host)
-            + ":"
-            + str(port)
-            + "/collections/"
-            + self.collection_name
-            + "/snapshots/"
-            + self.snapshot_info.name
-        )
-        snapshot_url_out = folder + self.snapshot_info.name
-        # rename snapshots for a easyer restore in the future
+        # the alias still refers to the embedder that produced the stored vectors
         alias = (
-            self.client.get_collection_aliases(self.collection_name)
+            self.client.get_collection_aliases(self.storage_name)
             .aliases[0]
             .alias_name
         )
-        response = requests.get(snapshot_url_in)
-        open(snapshot_url_out, "wb").write(response.content)
-        new_name = folder + alias.replace("/", "-") + ".snapshot"
-        os.rename(snapshot_url_out, new_name)
-        for s in self.client.list_snapshots(self.collection_name):
-            self.client.delete_snapshot(
-                collection_name=self.collection_name, snapshot_name=s.name
+
+        if self.db_is_remote():
+            # native Qdrant snapshot, streamed to disk
+            new_name = dump_remote_collection(self, folder=folder, alias=alias)
+        else:
+            # local mode: export points directly from storage
+            new_name = take_snapshot(
+                self,
+                embedder=alias[: -len("_" + self.storage_name)],
+                folder=folder,
+                alias=alias,
             )
         log.warning(f'Dump "{new_name}" completed')
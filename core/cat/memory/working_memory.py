@@ -22,6 +22,8 @@ class WorkingMemory(BaseModelDict):
         An optional reference to a CatForm currently in use.
     recall_query : str, default=""
         A string that stores the last recall query.
+    recall_query_embedding : List[float]
+        The embedding of the last recall query.
     episodic_memories : List
         A list for storing episodic memories.
     declarative_memories : List
@@ -38,6 +40,7 @@ class WorkingMemory(BaseModelDict):
 
     active_form: Optional[CatForm] = None
     recall_query: str = ""
+    recall_query_embedding: List[float] = []
     
     episodic_memories: List = []
     declarative_memories: List = []
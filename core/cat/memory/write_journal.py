@@ -0,0 +1,141 @@
+"""Writes to a collection while it is being copied elsewhere.
+
+`EmbedderMigration` re-embeds a collection into a new one while the old one keeps being used. Every write to the
+old collection (points added, updated or deleted) goes through the journal of its storage name, if there is one:
+the migration then replays the written ids from the old collection (or deletes them from the new one), and can
+block writers while it replays the last ones and switches to the new collection.
+"""
+
+import uuid
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+class CollectionReplaced(Exception):
+    pass
+
+
+def canonical_id(id) -> str:
+    """Point ids in canonical uuid form, as returned by Qdrant server."""
+    try:
+        return str(uuid.UUID(str(id)))
+    except ValueError:
+        return str(id)
+
+
+class WriteJournal:
+    """Ids written in a collection, metadata filters of deletions (None for the whole collection)
+    and the newest `when` points were deleted before."""
+
+    def __init__(
+        self,
+        ids: Iterable[str] = (),
+        filters: List[Dict | None] = (),
+        deleted_before: float | None = None,
+    ):
+        self._cond = threading.Condition()
+        self._writers = 0
+        self._blocked = False
+        self.closed = False
+        # ids as given to the collection (the embedded backend does not canonicalize them)
+        self.ids: Set[str] = {str(id) for id in ids}
+        self.filters: List[Dict | None] = list(filters)
+        self.deleted_before = deleted_before
+
+    @contextmanager
+    def write(
+        self,
+        ids: Iterable = (),
+        deleted_filter: Dict | None = None,
+        wipe: bool = False,
+        deleted_before: float | None = None,
+    ):
+        """Context of a write to the collection, recorded when it exits."""
+        with self._cond:
+            self._cond.wait_for(lambda: not self._blocked)
+            # dropping a replaced collection is fine, writing to it is not
+            if self.closed and not wipe:
+                raise CollectionReplaced(
+                    "Memory has just been re-embedded with a new embedder, retry"
+                )
+            self._writers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writers -= 1
+                self.ids.update(str(id) for id in ids)
+                if deleted_filter or wipe:
+                    self.filters.append(None if wipe else deleted_filter)
+                if deleted_before is not None:
+                    self.deleted_before = max(self.deleted_before or deleted_before, deleted_before)
+                self._cond.notify_all()
+
+    @contextmanager
+    def block(self):
+        """Wait for running writes to end and hold new ones until exit."""
+        with self._cond:
+            self._blocked = True
+            self._cond.wait_for(lambda: self._writers == 0)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._blocked = False
+                self._cond.notify_all()
+
+    def take(self) -> Tuple[List[str], List[Dict | None], float | None]:
+        """Return and forget what was recorded so far."""
+        with self._cond:
+            recorded = list(self.ids), self.filters, self.deleted_before
+            self.ids, self.filters, self.deleted_before = set(), [], None
+            return recorded
+
+    def to_dict(self) -> Dict:
+        with self._cond:
+            return {
+                "ids": list(self.ids),
+                "filters": list(self.filters),
+                "deleted_before": self.deleted_before,
+            }
+
+
+# storage name -> journal
+_journals: Dict[str, WriteJournal] = {}
+_journals_lock = threading.Lock()
+
+
+def open_journal(
+    storage_name: str,
+    ids: Iterable[str] = (),
+    filters: List = (),
+    deleted_before: float | None = None,
+) -> WriteJournal:
+    with _journals_lock:
+        journal = _journals.get(storage_name)
+        if journal is None or journal.closed:
+            journal = _journals[storage_name] = WriteJournal(ids, filters, deleted_before)
+        return journal
+
+
+def drop_journal(storage_name: str):
+    with _journals_lock:
+        _journals.pop(storage_name, None)
+
+
+@contextmanager
+def journaled(
+    storage_name: str,
+    ids: Iterable = (),
+    deleted_filter: Dict | None = None,
+    wipe: bool = False,
+    deleted_before: float | None = None,
+):
+    """Used by the collections around every write, does nothing when no migration is running."""
+    journal = _journals.get(storage_name)
+    if journal is None:
+        yield
+        return
+    with journal.write(ids, deleted_filter, wipe, deleted_before):
+        yield
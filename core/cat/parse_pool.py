@@ -0,0 +1,99 @@
+"""Parse documents in other processes.
+
+Parsing PDFs and Office documents is CPU bound Python code: run in an ingestion thread, it holds the GIL and chat
+turns slow down while a big file is parsed. When `CCAT_PARSE_PROCESSES` is above 0, `RabbitHole` hands the blobs
+whose mime type is listed in `CCAT_PARSE_PROCESS_MIME_TYPES` to a bounded pool of processes.
+
+PDFs are split in ranges of `CCAT_PARSE_PDF_PAGES_PER_TASK` pages, parsed in parallel and yielded back in page
+order. Other documents are parsed by one worker. Parsers that cannot be sent to another process (not picklable)
+are run in the calling thread as before.
+"""
+
+import pickle
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Set
+
+from langchain.docstore.document import Document
+from langchain.document_loaders.blob_loaders.schema import Blob
+from langchain_core.document_loaders import BaseBlobParser
+
+from cat.env import get_env
+from cat.log import log
+from cat.parsers import PDFMinerPagesParser
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    return int(get_env("CCAT_PARSE_PROCESSES")) > 0
+
+
+def offloaded_mime_types() -> Set[str]:
+    return {
+        m.strip() for m in get_env("CCAT_PARSE_PROCESS_MIME_TYPES").split(",") if m.strip()
+    }
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # forking a process running threads (the server) is not safe
+            _pool = ProcessPoolExecutor(
+                max_workers=int(get_env("CCAT_PARSE_PROCESSES")),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _parse(parser: BaseBlobParser, blob: Blob) -> List[Document]:
+    return list(parser.lazy_parse(blob))
+
+
+def _pdf_page_count(blob: Blob) -> int:
+    from pdfminer.pdfpage import PDFPage
+
+    with blob.as_bytes_io() as pdf_file_obj:
+        return sum(1 for _ in PDFPage.get_pages(pdf_file_obj))
+
+
+def parse_in_pool(parser: BaseBlobParser, blob: Blob) -> Iterator[Document]:
+    """Parse a blob in the process pool, see module docstring."""
+
+    try:
+        pickle.dumps(parser)
+    except Exception as e:
+        log.warning(f"{type(parser).__name__} cannot be run in another process ({e}), parsing here")
+        yield from parser.lazy_parse(blob)
+        return
+
+    pool = get_parse_pool()
+
+    if isinstance(parser, PDFMinerPagesParser) and parser.page_numbers is None:
+        pages_per_task = int(get_env("CCAT_PARSE_PDF_PAGES_PER_TASK"))
+        n_pages = pool.submit(_pdf_page_count, blob).result()
+        tasks = (
+            (PDFMinerPagesParser(page_numbers=range(start, min(start + pages_per_task, n_pages))), blob)
+            for start in range(0, n_pages, pages_per_task)
+        )
+    else:
+        tasks = iter([(parser, blob)])
+
+    # a few tasks ahead of the one being read, so results do not pile up in memory
+    max_pending = 2 * pool._max_workers
+    pending = deque()
+    try:
+        while True:
+            while len(pending) < max_pending and (task := next(tasks, None)):
+                pending.append(pool.submit(_parse, *task))
+            if not pending:
+                break
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,44 @@
+import io
+from typing import Container, Iterator
+
+from langchain.docstore.document import Document
+from langchain_core.document_loaders import BaseBlobParser
+from langchain.document_loaders.blob_loaders.schema import Blob
+
+
+class PDFMinerPagesParser(BaseBlobParser):
+    """Parse a PDF page by page with PDFMiner, in a single pass.
+
+    Pages are yielded as soon as they are extracted, so ingestion can start embedding
+    before the whole file is parsed (`PDFMinerParser` either concatenates all pages or
+    re-opens the document for every page).
+
+    Only the pages in `page_numbers` (0-based) are extracted, if given.
+    """
+
+    def __init__(self, page_numbers: Container[int] | None = None):
+        self.page_numbers = page_numbers
+
+    def lazy_parse(self, blob: Blob) -> Iterator[Document]:
+        from pdfminer.converter import TextConverter
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+
+        text_io = io.StringIO()
+        with blob.as_bytes_io() as pdf_file_obj:
+            rsrcmgr = PDFResourceManager()
+            device = TextConverter(rsrcmgr, text_io, laparams=LAParams())
+            interpreter = PDFPageInterpreter(rsrcmgr, device)
+            for i, page in enumerate(PDFPage.get_pages(pdf_file_obj)):
+                if self.page_numbers is not None and i not in self.page_numbers:
+                    continue
+                interpreter.process_page(page)
+                content = text_io.getvalue()
+                text_io.truncate(0)
+                text_io.seek(0)
+                yield Document(
+                    page_content=content,
+                    metadata={"source": blob.source, "page": str(i)},
+                )
+            device.close()
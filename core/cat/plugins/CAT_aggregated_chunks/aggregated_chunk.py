@@ -3,6 +3,8 @@ from langchain.docstore.document import Document
 
 from cat.log import log
 
+from .parent_store import attach_parents, expand_parents
+
 
 @hook
 def after_rabbithole_splitted_text(chunks, cat):
@@ -15,20 +17,33 @@ def after_rabbithole_splitted_text(chunks, cat):
             "no sense": ["nonsense", "gibberish", "random", "unclear"],
             "header or footer": ["copyright", "footer", "header", "page number", "confidential"]
         }
-        filtered_chunks = []
-        for chunk in chunks:
-            classification = cat.classify(chunk.page_content, labels=classification_labels)
-            cat.send_ws_message(classification)
-            if classification in ["useful"]:
-                filtered_chunks.append(chunk)
+        # few sentences per LLM call, some calls at the same time
+        classifications = cat.classify_many(
+            [chunk.page_content for chunk in chunks],
+            labels=classification_labels,
+            mode=settings.get("classification_mode", "llm"),
+        )
+        filtered_chunks = [
+            chunk
+            for chunk, classification in zip(chunks, classifications)
+            if classification in ["useful"]
+        ]
+        cat.send_ws_message(
+            f"{len(filtered_chunks)} of {len(chunks)} chunks classified as useful"
+        )
     else:
         filtered_chunks = chunks  # Skip classification if disabled
 
-    # Original aggregation logic on filtered chunks
-    concatenated_chunks_list = []
     settings = cat.mad_hatter.get_plugin().load_settings()
     n_of_chunks = settings["n_of_chunks"]
 
+    if settings.get("parent_document_mode", False):
+        # only the children are embedded, the first one of each group carries the aggregate
+        return attach_parents(filtered_chunks, n_of_chunks)
+
+    # Original aggregation logic on filtered chunks
+    concatenated_chunks_list = []
+
     for i in range(0, len(filtered_chunks), n_of_chunks):
         chunk_group = filtered_chunks[i:i + n_of_chunks]
         concatenated_content = ''.join(chunk.page_content for chunk in chunk_group)
@@ -37,3 +52,15 @@ def after_rabbithole_splitted_text(chunks, cat):
         filtered_chunks.append(concatenated_new_document)
     
     return filtered_chunks
+
+
+@hook
+def after_cat_recalls_memories(cat):
+    # child hits are replaced by their parent text, once per parent
+    settings = cat.mad_hatter.get_plugin().load_settings()
+    cat.working_memory.declarative_memories = expand_parents(
+        cat.working_memory.declarative_memories,
+        cat.memory.vectors.declarative,
+        cat.working_memory.recall_query_embedding,
+        settings["n_of_chunks"],
+    )
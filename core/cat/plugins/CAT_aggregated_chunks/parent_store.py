@@ -0,0 +1,74 @@
+import hashlib
+from typing import List, Tuple
+
+from langchain.docstore.document import Document
+
+
+# parent (aggregated) chunks are not embedded: every child keeps the id of its parent, and the parent text is
+# stored once, in the payload of its first child, so it is deleted, exported and restored together with them
+PARENT_ID_KEY = "parent_id"
+PARENT_CONTENT_KEY = "parent_content"
+
+
+def parent_id(content: str) -> str:
+    # same text, same id
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def attach_parents(chunks: List[Document], n_of_chunks: int) -> List[Document]:
+    """Group chunks by `n_of_chunks`, store in each chunk the id of its group and in the first one its text."""
+    for i in range(0, len(chunks), n_of_chunks):
+        chunk_group = chunks[i:i + n_of_chunks]
+        concatenated_content = ''.join(chunk.page_content for chunk in chunk_group)
+        id = parent_id(concatenated_content)
+        for chunk in chunk_group:
+            chunk.metadata[PARENT_ID_KEY] = id
+        chunk_group[0].metadata[PARENT_CONTENT_KEY] = concatenated_content
+    return chunks
+
+
+def find_parents(collection, parent_ids: List[str], embedding, n_of_chunks: int) -> dict:
+    """Read the text of the parents from the collection, looking among the children of each one."""
+    parents = {}
+    for id in parent_ids:
+        children = collection.recall_memories_from_embedding(
+            embedding, metadata={PARENT_ID_KEY: id}, k=n_of_chunks, with_vectors=False
+        )
+        for doc, _, _, _ in children:
+            if PARENT_CONTENT_KEY in doc.metadata:
+                parents[id] = doc.metadata[PARENT_CONTENT_KEY]
+                break
+    return parents
+
+
+def expand_parents(memories: List[Tuple], collection, embedding, n_of_chunks: int) -> List[Tuple]:
+    """Replace recalled children with the text of their parent, once per parent.
+
+    Memories are sorted by score, the best child of each parent is kept.
+    A child whose parent text is not found (its first sibling was not stored) keeps its own text.
+    """
+    parents = {}
+    for doc, _, _, _ in memories:
+        parent = doc.metadata.get(PARENT_ID_KEY)
+        if parent and PARENT_CONTENT_KEY in doc.metadata:
+            parents[parent] = doc.metadata[PARENT_CONTENT_KEY]
+    missing = {
+        doc.metadata[PARENT_ID_KEY]
+        for doc, _, _, _ in memories
+        if doc.metadata.get(PARENT_ID_KEY) and doc.metadata[PARENT_ID_KEY] not in parents
+    }
+    if missing:
+        parents.update(find_parents(collection, sorted(missing), embedding, n_of_chunks))
+
+    expanded = []
+    seen = set()
+    for doc, score, vector, id in memories:
+        parent = doc.metadata.get(PARENT_ID_KEY)
+        if parent in parents:
+            if parent in seen:
+                continue
+            seen.add(parent)
+            metadata = {k: v for k, v in doc.metadata.items() if k != PARENT_CONTENT_KEY}
+            doc = Document(page_content=parents[parent], metadata=metadata)
+        expanded.append((doc, score, vector, id))
+    return expanded
@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic import BaseModel
 from cat.mad_hatter.decorators import plugin
 from pydantic import BaseModel, Field, field_validator
@@ -6,6 +7,10 @@ from pydantic import BaseModel, Field, field_validator
 class MySettings(BaseModel):
     n_of_chunks: int = 5
     enable_classification: bool = True  # New setting to enable/disable classification
+    # "embedding" asks the LLM only for the chunks not clearly close to a label
+    classification_mode: Literal["llm", "embedding"] = "llm"
+    # embed only the chunks, aggregates are stored aside and returned in place of their chunks at recall
+    parent_document_mode: bool = False
 
 @plugin
 def settings_schema():
@@ -0,0 +1,83 @@
+# cat/plugins/CAT_doc_front_end_manager/tag_fields.py
+
+from typing import Iterable, List
+
+from cat.log import log
+
+
+# I chunk portano i tag e gli utenti in due array di keyword indicizzati:
+#   metadata.tags = ["tag_1", ...], metadata.users = ["alice", ...]
+# (prima: una chiave booleana per tag e per utente, {tag_1: True, alice: True}, non indicizzabile)
+TAGS_FIELD = "tags"
+USERS_FIELD = "users"
+
+MIGRATION_BATCH_SIZE = 500
+
+
+def _merge(current, values: Iterable[str]) -> List[str]:
+    merged = list(current) if isinstance(current, list) else []
+    for v in values:
+        if v not in merged:
+            merged.append(v)
+    return merged
+
+
+def tag_metadata(metadata: dict, tags: List[str], user: str) -> dict:
+    """Metadata del chunk con tag e utente aggiunti agli array (senza perdere quelli già presenti)."""
+    metadata = dict(metadata or {})
+    metadata[TAGS_FIELD] = _merge(metadata.get(TAGS_FIELD), tags)
+    metadata[USERS_FIELD] = _merge(metadata.get(USERS_FIELD), [user])
+    return metadata
+
+
+def tag_filter(tags: List[str], user: str) -> dict:
+    """
+    Filtro di recall: il chunk deve avere TUTTI i tag attivi e l'utente.
+    Ogni valore diventa una condizione `must` sull'array (match di un elemento), coperta dall'indice.
+    """
+    return {TAGS_FIELD: list(tags), USERS_FIELD: [user]}
+
+
+def create_tag_indexes(collection) -> None:
+    for field in (TAGS_FIELD, USERS_FIELD):
+        collection.create_payload_index(f"metadata.{field}", "keyword")
+
+
+def migrate_boolean_tags(collection, tags: List[str], users: Iterable[str]) -> int:
+    """
+    Converte in blocco i chunk con lo schema vecchia maniera ({tag: True, user: True})
+    negli array `tags`/`users`, con un aggiornamento (set_payload) per pagina di punti.
+    Diventano utenti solo le chiavi booleane di utenti noti (user_status.json e db utenti):
+    le altre (es. is_public: True) restano metadati qualsiasi.
+    Le vecchie chiavi booleane restano (innocue). I chunk già convertiti vengono saltati.
+    Restituisce il numero di chunk convertiti.
+    """
+    tags = set(tags)
+    users = set(users) - tags
+    migrated = 0
+    offset = None
+    while True:
+        points, offset = collection.get_all_points(
+            limit=MIGRATION_BATCH_SIZE, offset=offset, with_vectors=False
+        )
+
+        updates = {}
+        for point in points:
+            metadata = (point.payload or {}).get("metadata") or {}
+            if TAGS_FIELD in metadata or USERS_FIELD in metadata:
+                continue
+            flags = [k for k, v in metadata.items() if v is True]
+            point_tags = [k for k in flags if k in tags]
+            point_users = [k for k in flags if k in users]
+            if point_tags or point_users:
+                updates[point.id] = {TAGS_FIELD: point_tags, USERS_FIELD: point_users}
+
+        if updates:
+            collection.update_metadata(updates)
+            migrated += len(updates)
+
+        if offset is None:
+            break
+
+    log.info(f"[tag_fields] {migrated} chunks migrated to {TAGS_FIELD}/{USERS_FIELD} arrays")
+    return migrated
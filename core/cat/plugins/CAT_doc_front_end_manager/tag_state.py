@@ -0,0 +1,303 @@
+# cat/plugins/CAT_doc_front_end_manager/tag_state.py
+
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from cat.log import log
+
+# --- helper: file-lock cross-process + merge atomico ---
+try:
+    import fcntl
+    _HAS_FCNTL = True
+except Exception:
+    _HAS_FCNTL = False
+
+
+# === Costanti/risorse ===
+STATIC_DIR = Path(os.environ.get("CCAT_ROOT", os.getcwd())) / "cat/static"
+USER_STATUS_PATH = STATIC_DIR / "user_status.json"
+TAGS_PATH = STATIC_DIR / "tags.json"
+_LOCK = threading.Lock()
+
+
+# === I/O atomico su user_status.json ===
+def _atomic_write_json(path: Path, data: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+    tmp.replace(path)
+
+
+def _load_json_safe(path: Path, default: dict) -> dict:
+    if not path.exists():
+        return default
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        log.error(f"[tag_state] JSON load error on {path}: {e}")
+        return default
+
+
+def _mtime(path: Path) -> Optional[int]:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _update_user_status_atomic(mutator: Callable[[dict], dict]) -> dict:
+    """
+    read-merge-write atomico di USER_STATUS_PATH sotto lock di file (se disponibile),
+    altrimenti sotto lock di thread (_LOCK). Restituisce lo stato scritto.
+    """
+    USER_STATUS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    if not USER_STATUS_PATH.exists():
+        _atomic_write_json(USER_STATUS_PATH, {})
+
+    if _HAS_FCNTL:
+        with open(USER_STATUS_PATH, "r+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                data = json.loads(raw) if raw.strip() else {}
+            except Exception:
+                data = {}
+            new_data = mutator(data)
+
+            _atomic_write_json(USER_STATUS_PATH, new_data)
+            fcntl.flock(f, fcntl.LOCK_UN)
+    else:
+        with _LOCK:
+            data = _load_json_safe(USER_STATUS_PATH, {})
+            new_data = mutator(data)
+            _atomic_write_json(USER_STATUS_PATH, new_data)
+    return new_data
+
+
+# === Schema e normalizzazione ===
+def _default_tag_obj() -> dict:
+    return {
+        "status": False,
+        "documents": [],
+        "prompt_list": [],      # es.: [{"prompt_title": "Default", "prompt_content": ""}]
+        "selected_prompt": "",  # può contenere direttamente il contenuto, o il titolo
+        "prompt": ""            # legacy (non usato per il prefix)
+    }
+
+
+def _complete_tag_obj(t: dict) -> None:
+    if "status" not in t:
+        t["status"] = bool(t.get("status", False))
+    if "documents" not in t:
+        t["documents"] = t.get("documents", [])
+    if "prompt_list" not in t:
+        t["prompt_list"] = t.get("prompt_list", [])
+    if "selected_prompt" not in t:
+        t["selected_prompt"] = t.get("selected_prompt", "")
+    if "prompt" not in t:
+        t["prompt"] = t.get("prompt", "")
+
+
+def _tags_list(tags_data: dict) -> List[str]:
+    tags = tags_data.get("tags", []) if isinstance(tags_data, dict) else []
+    # normalizza a lista di stringhe (accetta int, converte a str)
+    return [str(t) for t in tags if isinstance(t, (str, int))]
+
+
+def _ensure_user_status_schema(user_status: dict, tags: List[str]) -> dict:
+    """
+    Porta lo schema alla forma: user -> tag -> tag_obj completo.
+    Non rimuove tag “extra”, integra solo i mancanti.
+    """
+    for user, tagmap in list(user_status.items()):
+        if not isinstance(tagmap, dict):
+            user_status[user] = {}
+            tagmap = user_status[user]
+
+        for tag in tags:
+            if tag not in tagmap or not isinstance(tagmap.get(tag), dict):
+                tagmap[tag] = _default_tag_obj()
+            else:
+                _complete_tag_obj(tagmap[tag])
+    return user_status
+
+
+def _resolve_selected_prompt(tag_obj: dict) -> Optional[str]:
+    """
+    Restituisce SOLO il contenuto deciso da selected_prompt, senza fallback a 'prompt'.
+
+    Regole:
+    - Se selected_prompt coincide con un 'prompt_content' presente in prompt_list -> usa quello (selected_prompt stesso).
+    - Altrimenti se selected_prompt coincide con un 'prompt_title' -> ritorna il relativo 'prompt_content' (se non vuoto).
+    - Altrimenti, se selected_prompt è una stringa non vuota -> consideralo già contenuto e usalo così com'è.
+    - Se selected_prompt è vuoto -> None.
+    """
+    sel = (tag_obj.get("selected_prompt") or "").strip()
+    if not sel:
+        return None
+
+    plist = tag_obj.get("prompt_list") or []
+
+    # 1) match come contenuto
+    for item in plist:
+        if (item.get("prompt_content") or "").strip() == sel:
+            return sel  # è già il contenuto scelto
+
+    # 2) match come titolo
+    for item in plist:
+        if (item.get("prompt_title") or "").strip() == sel:
+            content = (item.get("prompt_content") or "").strip()
+            return content if content else None
+
+    # 3) selected_prompt non è nel plist ma è valorizzato -> trattalo come contenuto diretto
+    return sel
+
+
+class _UserView:
+    """Dati di un utente già pronti per gli hook (calcolati una volta per versione dei file)."""
+
+    def __init__(self, tags_for_user: dict):
+        self.tags = tags_for_user
+        # ordine naturale del dict (inserimento)
+        self.active_tags = [
+            tag for tag, obj in tags_for_user.items()
+            if isinstance(obj, dict) and obj.get("status", False)
+        ]
+        self.prompt = None
+        for tag in self.active_tags:
+            resolved = _resolve_selected_prompt(tags_for_user[tag])
+            if resolved:
+                self.prompt = resolved
+                break
+
+
+class TagStateStore:
+    """
+    Stato di user_status.json e tags.json tenuto in memoria, per processo.
+
+    - I file vengono riletti (e lo schema riallineato) solo se il loro mtime cambia,
+      quindi gli hook di ogni turno di chat non fanno parsing né validazione.
+    - Le letture per utente usano viste precalcolate (tag attivi, prompt selezionato).
+    - Le scritture restano read-merge-write atomiche sul file (altri processi possono scriverlo);
+      i documenti caricati vengono scritti una volta sola a fine upload (`add_documents`).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._mtimes = (None, None)
+        self._raw_status: dict = {}
+        self._raw_tags: Optional[dict] = None
+        self._status: dict = {}
+        self._views: Dict[str, _UserView] = {}
+
+    # --- letture ---
+    def _refresh(self) -> None:
+        mtimes = (_mtime(USER_STATUS_PATH), _mtime(TAGS_PATH))
+        if mtimes == self._mtimes:
+            return
+        with self._lock:
+            if mtimes == self._mtimes:
+                return
+            self._raw_status = _load_json_safe(USER_STATUS_PATH, {})
+            self._raw_tags = _load_json_safe(TAGS_PATH, None) if mtimes[1] else None
+            self._set_status(self._raw_status)
+            self._mtimes = mtimes
+
+    def _set_status(self, raw_status: dict) -> None:
+        tags = _tags_list(self._raw_tags or {})
+        self._status = _ensure_user_status_schema(json.loads(json.dumps(raw_status)), tags)
+        self._views = {}
+
+    def _view(self, user: str) -> _UserView:
+        self._refresh()
+        with self._lock:
+            view = self._views.get(user)
+            if view is None:
+                view = _UserView(self._status.get(user, {}))
+                self._views[user] = view
+            return view
+
+    def user_status(self) -> dict:
+        """Stato di tutti gli utenti, con lo schema completo."""
+        self._refresh()
+        return self._status
+
+    def raw_user_status(self) -> Optional[dict]:
+        """Contenuto di user_status.json così com'è, None se il file non esiste."""
+        self._refresh()
+        if self._mtimes[0] is None:
+            return None
+        return self._raw_status
+
+    def tags_data(self) -> Optional[dict]:
+        """Contenuto di tags.json, None se il file non esiste."""
+        self._refresh()
+        return self._raw_tags
+
+    def tags(self) -> List[str]:
+        self._refresh()
+        return _tags_list(self._raw_tags or {})
+
+    def tags_for_user(self, user: str) -> dict:
+        return self._view(user).tags
+
+    def active_tags(self, user: str) -> List[str]:
+        return self._view(user).active_tags
+
+    def selected_prompt(self, user: str) -> Optional[str]:
+        return self._view(user).prompt
+
+    # --- scritture ---
+    def update(self, mutator: Callable[[dict], dict]) -> None:
+        """read-merge-write atomico di user_status.json, la copia in memoria viene aggiornata."""
+        with self._lock:
+            self._refresh()
+            new_status = _update_user_status_atomic(mutator)
+            self._raw_status = new_status
+            self._set_status(new_status)
+            self._mtimes = (_mtime(USER_STATUS_PATH), self._mtimes[1])
+
+    def replace_user_status(self, new_user_status: dict) -> None:
+        self.update(lambda current: new_user_status)
+
+    def replace_tags(self, tags: List[str]) -> None:
+        with self._lock:
+            self._refresh()
+            self._raw_tags = {"tags": tags}
+            _atomic_write_json(TAGS_PATH, self._raw_tags)
+            self._set_status(self._raw_status)
+            self._mtimes = (self._mtimes[0], _mtime(TAGS_PATH))
+
+    def add_documents(self, user: str, tags: List[str], sources: List[str]) -> None:
+        """Aggiunge in un'unica operazione atomica i documenti caricati da un utente ai suoi tag."""
+        # salva sempre basename
+        sources = [Path(s.strip()).name for s in sources if isinstance(s, str) and s.strip()]
+        if not sources or not tags:
+            return
+
+        def mutator(state: dict):
+            user_map = state.setdefault(user, {})
+            for tag in tags:
+                tag_obj = user_map.setdefault(tag, _default_tag_obj())
+                docs_list = tag_obj.get("documents", [])
+                if not isinstance(docs_list, list):
+                    docs_list = []
+                for s in sources:
+                    if s not in docs_list:
+                        docs_list.append(s)
+                tag_obj["documents"] = docs_list
+                user_map[tag] = tag_obj
+            state[user] = user_map
+            return state
+
+        self.update(mutator)
+
+
+# istanza condivisa da hook ed endpoint del plugin
+tag_state = TagStateStore()
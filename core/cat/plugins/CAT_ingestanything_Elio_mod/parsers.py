@@ -8,6 +8,7 @@ from langchain_community.document_loaders.base import BaseBlobParser
 from langchain_community.document_loaders.blob_loaders import Blob
 
 import pandas as pd
+import openpyxl
 import json
 from typing import Iterator
 from abc import ABC
@@ -27,26 +28,75 @@ from io import BytesIO
 # #         yield Document(page_content=text, metadata={})
 
 class TableParser(BaseBlobParser, ABC):
+    """Streams spreadsheet rows in windows of `rows_per_document`, one `Document` per window.
+
+    The file is never loaded whole: CSV files are read in chunks by pandas, XLSX workbooks are opened
+    in openpyxl read-only mode. Each `Document` has the `sheet` (XLSX only), the rows it contains
+    (`row_start`, `row_end`, numbered as in the file, the header being row 1) and the `header` in its metadata.
+    """
+
+    def __init__(self, rows_per_document: int = 200):
+        self.rows_per_document = rows_per_document
 
     def lazy_parse(self, blob: Blob) -> Iterator[Document]:
         with blob.as_bytes_io() as file:
             if blob.mimetype == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet":
+                yield from self._parse_xlsx(file)
+            elif blob.mimetype == "text/csv":
+                yield from self._parse_csv(file)
+            else:
+                raise ValueError(f"Unsupported mime type: {blob.mimetype}")
 
-                # Read the Excel file - df is a dictionary of DataFrames (one per sheet)
-                df_dict = pd.read_excel(file, sheet_name=None)
-                all_records = []
-                # Process each sheet
-                for sheet_name, sheet_df in df_dict.items():
-                    # Convert each sheet's DataFrame to records and add to our list
-                    sheet_records = sheet_df.to_dict("records")
-                    all_records.extend(sheet_records)
+    def _parse_csv(self, file) -> Iterator[Document]:
+        row = 2
+        for chunk in pd.read_csv(file, chunksize=self.rows_per_document):
+            records = chunk.to_dict("records")
+            yield self._document(records, list(chunk.columns), row)
+            row += len(records)
 
-            elif blob.mimetype == "text/csv":
-                # For CSV files, use read_csv instead of read_excel
-                df = pd.read_csv(file)
-                all_records = df.to_dict("records")
-            
-        yield Document(page_content=json.dumps(all_records), metadata={})
+    def _parse_xlsx(self, file) -> Iterator[Document]:
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                rows = sheet.iter_rows(values_only=True)
+                header = next(rows, None)
+                if header is None:
+                    continue
+                # same names pandas gives to columns without header
+                header = [
+                    str(h) if h is not None else f"Unnamed: {i}"
+                    for i, h in enumerate(header)
+                ]
+
+                records = []
+                row = last = 2
+                for n, values in enumerate(rows, start=2):
+                    # blank rows (even formatted ones at the end of the sheet) are skipped
+                    if all(v is None for v in values):
+                        continue
+                    if not records:
+                        row = n
+                    last = n
+                    records.append(dict(zip(header, values)))
+                    if len(records) == self.rows_per_document:
+                        yield self._document(records, header, row, sheet.title, last)
+                        records = []
+                if records:
+                    yield self._document(records, header, row, sheet.title, last)
+        finally:
+            # read-only workbooks keep the file open until closed
+            workbook.close()
+
+    def _document(self, records, header, row_start, sheet=None, row_end=None) -> Document:
+        metadata = {
+            "row_start": row_start,
+            "row_end": row_end or row_start + len(records) - 1,
+            "header": header,
+        }
+        if sheet is not None:
+            metadata["sheet"] = sheet
+        # dates and times are written as strings
+        return Document(page_content=json.dumps(records, default=str), metadata=metadata)
 
 class PowerPointParser(BaseBlobParser, ABC):
     
@@ -1,18 +1,19 @@
 import os
 import time
+import copy
 import json
 import mimetypes
-import httpx
-from typing import List, Union
+import queue
+import threading
+import uuid
+from itertools import islice
+from typing import Callable, List, Union, Iterable, Iterator
 from urllib.parse import urlparse
-from urllib.error import HTTPError
 
 from starlette.datastructures import UploadFile
 from langchain.docstore.document import Document
-from qdrant_client.http import models
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders.parsers.pdf import PDFMinerParser
+from langchain.text_splitter import RecursiveCharacterTextSplitter, TextSplitter
 from langchain_community.document_loaders.parsers.generic import MimeTypeBasedParser
 from langchain_community.document_loaders.parsers.txt import TextParser
 from langchain_community.document_loaders.parsers.html.bs4 import BS4HTMLParser
@@ -20,20 +21,85 @@ from langchain.document_loaders.blob_loaders.schema import Blob
 
 from cat.utils import singleton
 from cat.log import log
+from cat.env import get_env
+from cat.parsers import PDFMinerPagesParser
+from cat import parse_pool
+from cat.cache.parsed_text_cache import ParsedTextCache
+from cat.url_fetcher import UrlFetcher
+from cat.memory.memory_archive import read_archive_header, import_collection
+from cat.memory.ingestion_manifest import IngestionManifest, chunk_hash, existing_ids
+from cat.memory.near_duplicates import NearDuplicateIndex
+
+
+def _batched(iterable: Iterable, n: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, n)):
+        yield batch
+
+
+def _prefetch(iterator: Iterator, buffer_size: int) -> Iterator:
+    """Consume an iterator in a background thread, keeping at most `buffer_size` items ready."""
+
+    buffer = queue.Queue(maxsize=buffer_size)
+    done = object()
+    # set when the consumer stops early, so the producer does not wait forever
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+        except Exception as e:
+            put(e)
+        put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    try:
+        while (item := buffer.get()) is not done:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
 
 
 @singleton
 class RabbitHole:
     """Manages content ingestion. I'm late... I'm late!"""
 
+    # parsed documents (e.g. PDF pages) waiting to be split
+    parse_buffer_size = 8
+    # characters of parsed text split at once
+    split_window_size = 100_000
+    # chunks embedded and stored at once
+    store_batch_size = 32
+    # retries of a batch that failed to be embedded or stored
+    store_retries = 2
+
     def __init__(self, cat) -> None:
         self.__cat = cat
+        # splitters instantiated by the hooks, see `get_text_splitter`
+        self.__text_splitters = {}
+        self.__text_splitters_lock = threading.Lock()
+        # parser output reused when the same file is ingested again
+        self.parsed_text_cache = ParsedTextCache()
 
     # each time we access the file handlers, plugins can intervene
     def __reload_file_handlers(self):
         # default file handlers
         self.__file_handlers = {
-            "application/pdf": PDFMinerParser(),
+            "application/pdf": PDFMinerPagesParser(),
             "text/plain": TextParser(),
             "text/markdown": TextParser(),
             "text/html": BS4HTMLParser(),
@@ -44,9 +110,9 @@ class RabbitHole:
             "rabbithole_instantiates_parsers", self.__file_handlers, cat=self.__cat
         )
 
-    def __reload_text_splitter(self):
+    def __instantiate_text_splitter(self):
         # default text splitter
-        self.__text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
             chunk_size=256,
             chunk_overlap=64,
             separators=["\\n\\n", "\n\n", ".\\n", ".\n", "\\n", "\n", " ", ""],
@@ -56,21 +122,70 @@ class RabbitHole:
         )
 
         # no access to StrayCat yet
-        self.__text_splitter = self.__cat.mad_hatter.execute_hook(
-            "rabbithole_instantiates_splitter", self.__text_splitter, cat=self.__cat
+        return self.__cat.mad_hatter.execute_hook(
+            "rabbithole_instantiates_splitter", text_splitter, cat=self.__cat
+        )
+
+    def __splitter_hooks_config(self):
+        """Plugins implementing `rabbithole_instantiates_splitter`, with their settings."""
+        mad_hatter = self.__cat.mad_hatter
+        return tuple(
+            (
+                hook.plugin_id,
+                json.dumps(
+                    mad_hatter.plugins[hook.plugin_id].load_settings(),
+                    sort_keys=True,
+                    default=str,
+                ),
+            )
+            for hook in mad_hatter.hooks.get("rabbithole_instantiates_splitter", [])
         )
 
+    def get_text_splitter(
+        self, chunk_size: int | None = None, chunk_overlap: int | None = None
+    ) -> TextSplitter:
+        """Text splitter chosen by the hooks, with the given chunk size and overlap.
+
+        Splitters are cached per plugins configuration, chunk size and overlap: the
+        `rabbithole_instantiates_splitter` hook runs again only when one of them changes
+        (or when plugins are synced, see `clear_text_splitters`).
+        A cached splitter is shared across ingestions and must not be modified.
+        """
+
+        key = (self.__splitter_hooks_config(), chunk_size, chunk_overlap)
+        with self.__text_splitters_lock:
+            if key not in self.__text_splitters:
+                default_key = (key[0], None, None)
+                if default_key not in self.__text_splitters:
+                    self.__text_splitters[default_key] = self.__instantiate_text_splitter()
+
+                text_splitter = copy.copy(self.__text_splitters[default_key])
+                # override chunk_size and chunk_overlap only if the request has those info
+                if chunk_size:
+                    text_splitter._chunk_size = chunk_size
+                if chunk_overlap:
+                    text_splitter._chunk_overlap = chunk_overlap
+                self.__text_splitters[key] = text_splitter
+
+            return self.__text_splitters[key]
+
+    def clear_text_splitters(self):
+        """Forget cached splitters, hooks may have changed."""
+        with self.__text_splitters_lock:
+            self.__text_splitters = {}
+
     def ingest_memory(
             self,
             cat,
-            file: UploadFile
+            file: Union[str, UploadFile]
         ):
         """Upload memories to the declarative memory from a JSON file.
 
         Parameters
         ----------
-        file : UploadFile
-            File object sent via `rabbithole/memory` hook.
+        file : str | UploadFile
+            Path of the JSON file spooled to disk by `rabbithole/memory` (removed once read),
+            or the uploaded file object.
 
         Notes
         -----
@@ -81,11 +196,15 @@ class RabbitHole:
 
         """
 
-        # Get file bytes
-        file_bytes = file.file.read()
-
-        # Load fyle byte in a dict
-        memories = json.loads(file_bytes.decode("utf-8"))
+        # Load the file in a dict
+        if isinstance(file, str):
+            try:
+                with open(file, "r", encoding="utf-8") as f:
+                    memories = json.load(f)
+            finally:
+                os.remove(file)
+        else:
+            memories = json.loads(file.file.read().decode("utf-8"))
 
         # Check the embedder used for the uploaded memories is the same the Cat is using now
         upload_embedder = memories["embedder"]
@@ -118,19 +237,58 @@ class RabbitHole:
             )
             raise Exception(message)
 
-        # Upsert memories in batch mode # TODO REFACTOR: use VectorMemoryCollection.add_point
-        cat.memory.vectors.vector_db.upsert(
-            collection_name="declarative",
-            points=models.Batch(ids=ids, payloads=payloads, vectors=vectors),
+        # Upsert memories in batch mode
+        cat.memory.vectors.declarative.add_points(
+            contents=[p["page_content"] for p in payloads],
+            vectors=vectors,
+            metadatas=[p["metadata"] for p in payloads],
+            ids=ids,
+        )
+
+    def ingest_memory_archive(self, cat, archive_path: str):
+        """Upload memories from a columnar archive produced by `GET /memory/collections/{collection_id}/export`.
+
+        Parameters
+        ----------
+        archive_path : str
+            Path of the tar archive on disk, removed once ingested.
+
+        Notes
+        -----
+        Unlike `ingest_memory`, the archive is never fully loaded in memory: vectors are memory mapped
+        and points are upserted in bounded batches. Embedder and embedding size are checked against the
+        archive header. An interrupted import of the same archive is resumed.
+        """
+
+        header = read_archive_header(archive_path)
+
+        collection_name = header["collection"]
+        if collection_name not in ["declarative", "episodic"]:
+            raise Exception(f"Collection {collection_name} cannot be imported")
+
+        def on_progress(imported, total):
+            log.info(f"Imported {imported}/{total} memories in {collection_name}")
+            cat.send_ws_message(
+                f"Imported {imported}/{total} memories in {collection_name}"
+            )
+
+        import_collection(
+            cat.memory.vectors.collections[collection_name],
+            embedder=str(cat.embedder.__class__.__name__),
+            archive_path=archive_path,
+            on_progress=on_progress,
         )
 
+        os.remove(archive_path)
+
     def ingest_file(
         self,
         cat,
         file: Union[str, UploadFile],
         chunk_size: int | None = None,
         chunk_overlap: int | None = None,
-        metadata: dict = {}
+        metadata: dict = {},
+        on_progress: Callable[[int], None] | None = None,
     ):
         """Load a file in the Cat's declarative memory.
 
@@ -148,32 +306,123 @@ class RabbitHole:
             Number of overlapping tokens between consecutive chunks.
         metadata : dict
             Metadata to be stored with each chunk.
+        on_progress : Callable[[int], None]
+            Called with the number of chunks read after each batch is stored, see `store_documents`.
+
+        Returns
+        -------
+        result : dict
+            Chunk counts returned by `store_documents`, None if the file was not ingested because unchanged.
 
         Notes
         ----------
         Currently supported formats are `.txt`, `.pdf` and `.md`.
         You cn add custom ones or substitute the above via RabbitHole hooks.
+        The file is parsed, split, embedded and stored in a streaming fashion: chunks are embedded
+        while the rest of the file is still being parsed.
 
         See Also
         ----------
         before_rabbithole_stores_documents
         """
 
-        # split file into a list of docs
-        docs = self.file_to_docs(
+        # store in memory
+        if isinstance(file, str):
+            filename = file
+        else:
+            filename = file.filename
+
+        blob = self.file_to_blob(file)
+
+        # skip URLs not modified since they were last ingested with the same parameters (and still all in memory)
+        version = blob.metadata.get("version")
+        params = IngestionManifest.ingestion_params(chunk_size, chunk_overlap, metadata)
+        manifest = IngestionManifest(filename, cat.user_id)
+        if (
+            manifest.is_unchanged(version, params)
+            and manifest.prune(cat.memory.vectors.declarative) == 0
+        ):
+            message = f"{filename} is not changed since it was last read"
+            cat.send_ws_message(message)
+            log.info(message)
+            return None
+
+        # lazily split file into docs
+        docs = self.blob_to_docs_stream(
             cat=cat,
-            file=file,
+            blob=blob,
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap
         )
 
-        # store in memory
-        if isinstance(file, str):
-            filename = file
+        # a file uploaded again replaces its previous version, only changed chunks are embedded
+        return self.store_documents(
+            cat=cat,
+            docs=docs,
+            source=filename,
+            metadata=metadata,
+            incremental=True,
+            on_progress=on_progress,
+            version=version,
+            params=params,
+        )
+
+    def file_to_blob(self, file: Union[str, UploadFile]) -> Blob:
+        """Wrap a file in a Langchain `Blob`, with its mime type and source.
+
+        Files on disk are referenced by path and read lazily by the parsers.
+
+        Parameters
+        ----------
+        file : str, UploadFile
+            The file can be either a string path if loaded programmatically, a FastAPI `UploadFile`
+            if coming from the `/rabbithole/` endpoint or a URL if coming from the `/rabbithole/web` endpoint.
+
+        Returns
+        -------
+        blob : Blob
+            Blob of the file.
+        """
+
+        # Check type of incoming file.
+        if isinstance(file, UploadFile):
+            # Get mime type and source of UploadFile
+            content_type = mimetypes.guess_type(file.filename)[0]
+            source = file.filename
+
+            # uploads spooled to disk are read lazily by the parsers, like paths
+            path = getattr(file.file, "name", None)
+            if isinstance(path, str) and os.path.isfile(path):
+                return Blob.from_path(
+                    path, mime_type=content_type, metadata={"source": source}
+                )
+
+            # Get file bytes
+            file_bytes = file.file.read()
+        elif isinstance(file, str):
+            # Check if string file is a string or url
+            parsed_file = urlparse(file)
+            is_url = all([parsed_file.scheme, parsed_file.netloc])
+
+            if is_url:
+                # Download to the local cache (conditional GET if already there)
+                fetched = UrlFetcher().fetch(file)
+                return Blob.from_path(
+                    fetched.path,
+                    mime_type=fetched.content_type,
+                    metadata={"source": file, "version": fetched.version},
+                )
+            else:
+                # Get mime type from file extension and source, content is read by the parser
+                content_type = mimetypes.guess_type(file)[0]
+                source = os.path.basename(file)
+                return Blob.from_path(
+                    file, mime_type=content_type, metadata={"source": source}
+                )
         else:
-            filename = file.filename
+            raise ValueError(f"{type(file)} is not a valid type.")
 
-        self.store_documents(cat=cat, docs=docs, source=filename, metadata=metadata)
+        return Blob.from_data(data=file_bytes, mime_type=content_type, path=source)
 
     def file_to_docs(
         self,
@@ -209,47 +458,27 @@ class RabbitHole:
 
         """
 
-        # Check type of incoming file.
-        if isinstance(file, UploadFile):
-            # Get mime type and source of UploadFile
-            content_type = mimetypes.guess_type(file.filename)[0]
-            source = file.filename
-
-            # Get file bytes
-            file_bytes = file.file.read()
-        elif isinstance(file, str):
-            # Check if string file is a string or url
-            parsed_file = urlparse(file)
-            is_url = all([parsed_file.scheme, parsed_file.netloc])
+        return list(
+            self.file_to_docs_stream(
+                cat=cat,
+                file=file,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap
+            )
+        )
 
-            if is_url:
-                # Make a request with a fake browser name
-                request = httpx.get(file, headers={"User-Agent": "Magic Browser"})
-
-                # Define mime type and source of url
-                content_type = request.headers["Content-Type"].split(";")[0]
-                source = file
-
-                try:
-                    # Get binary content of url
-                    file_bytes = request.content
-                except HTTPError as e:
-                    log.error(e)
-            else:
-                # Get mime type from file extension and source
-                content_type = mimetypes.guess_type(file)[0]
-                source = os.path.basename(file)
+    def file_to_docs_stream(
+        self,
+        cat,
+        file: Union[str, UploadFile],
+        chunk_size: int | None = None,
+        chunk_overlap: int | None = None
+    ) -> Iterator[Document]:
+        """Like `file_to_docs`, but chunks are yielded as soon as they are ready (see `blob_to_docs_stream`)."""
 
-                # Get file bytes
-                with open(file, "rb") as f:
-                    file_bytes = f.read()
-        else:
-            raise ValueError(f"{type(file)} is not a valid type.")
-        return self.string_to_docs(
+        return self.blob_to_docs_stream(
             cat=cat,
-            file_bytes=file_bytes,
-            source=source,
-            content_type=content_type,
+            blob=self.file_to_blob(file),
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap
         )
@@ -291,32 +520,113 @@ class RabbitHole:
         blob = Blob(data=file_bytes, mimetype=content_type, source=source).from_data(
             data=file_bytes, mime_type=content_type, path=source
         )
+
+        return list(
+            self.blob_to_docs_stream(
+                cat=cat,
+                blob=blob,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+            )
+        )
+
+    def blob_to_docs_stream(
+        self,
+        cat,
+        blob: Blob,
+        chunk_size: int | None = None,
+        chunk_overlap: int | None = None
+    ) -> Iterator[Document]:
+        """Parse and split a `Blob` lazily.
+
+        The parser output (e.g. PDF pages) is produced in a background thread, with at most `parse_buffer_size`
+        parsed documents waiting. Parsed documents are grouped in windows of about `split_window_size` characters;
+        each window goes through the split hooks and the text splitter, and its chunks are yielded right away.
+
+        Parameters
+        ----------
+        blob : Blob
+            Content to be parsed, with its mime type.
+        chunk_size : int
+            Number of tokens in each document chunk.
+        chunk_overlap : int
+            Number of overlapping tokens between consecutive chunks.
+
+        Returns
+        -------
+        docs : Iterator[Document]
+            Langchain `Document` of chunked text.
+        """
+
         # Parser based on the mime type
-        parser = MimeTypeBasedParser(handlers=self.file_handlers)
+        file_handlers = self.file_handlers
+
+        cache_key = None
+        parsed_docs = None
+        if self.parsed_text_cache.enabled and blob.mimetype in file_handlers:
+            cache_key = self.parsed_text_cache.key(blob, file_handlers[blob.mimetype])
+            parsed_docs = self.parsed_text_cache.get(cache_key)
+
+        if parsed_docs is not None:
+            log.info(f"Parsed text of {blob.source} found in cache")
+        elif (
+            parse_pool.is_enabled()
+            and blob.mimetype in file_handlers
+            and blob.mimetype in parse_pool.offloaded_mime_types()
+        ):
+            # CPU heavy parsers run in other processes, not to hold the GIL
+            parsed_docs = parse_pool.parse_in_pool(file_handlers[blob.mimetype], blob)
+        else:
+            parsed_docs = MimeTypeBasedParser(handlers=file_handlers).lazy_parse(blob)
+
+        if cache_key is not None and not isinstance(parsed_docs, list):
+            parsed_docs = self.parsed_text_cache.cached_parse(parsed_docs, cache_key)
+
+        # hooks decide the text splitter (see `get_text_splitter`), once for the whole file
+        text_splitter = self.get_text_splitter(chunk_size, chunk_overlap)
 
         # Parse the text
         cat.send_ws_message(
             "I'm parsing the content. Big content could require some minutes..."
         )
-        super_docs = parser.parse(blob)
 
-        # Split
-        cat.send_ws_message("Parsing completed. Now let's go with reading process...")
-        docs = self.__split_text(
-            cat=cat,
-            text=super_docs,
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-        )
-        return docs
+        window = []
+        window_size = 0
+        for doc in _prefetch(parsed_docs, self.parse_buffer_size):
+            window.append(doc)
+            window_size += len(doc.page_content)
+
+            if window_size >= self.split_window_size:
+                yield from self.__split_text(
+                    cat=cat,
+                    text=window,
+                    chunk_size=chunk_size,
+                    chunk_overlap=chunk_overlap,
+                    text_splitter=text_splitter,
+                )
+                window = []
+                window_size = 0
+
+        if window:
+            yield from self.__split_text(
+                cat=cat,
+                text=window,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                text_splitter=text_splitter,
+            )
 
     def store_documents(
             self,
             cat,
-            docs: List[Document],
+            docs: Iterable[Document],
             source: str, # TODOV2: is this necessary?
-            metadata: dict = {}
-        ) -> None:
+            metadata: dict = {},
+            incremental: bool = False,
+            on_progress: Callable[[int], None] | None = None,
+            version: str | None = None,
+            params: dict | None = None,
+        ) -> dict:
         """Add documents to the Cat's declarative memory.
 
         This method loops a list of Langchain `Document` and adds some metadata. Namely, the source filename and the
@@ -324,68 +634,144 @@ class RabbitHole:
 
         Parameters
         ----------
-        docs : List[Document]
-            List of Langchain `Document` to be inserted in the Cat's declarative memory.
+        docs : Iterable[Document]
+            Langchain `Document` to be inserted in the Cat's declarative memory. Can be a generator, documents are
+            consumed and embedded in batches of `store_batch_size`.
         source : str
             Source name to be added as a metadata. It can be a file name or an URL.
         metadata : dict
             Metadata to be stored with each chunk.
+        incremental : bool
+            If True, `docs` are the new version of the source: chunks already stored (same content hash)
+            are left alone, only new ones are embedded and chunks no longer present are deleted.
+            New chunks get ids derived from their content, so storing the same version again is idempotent.
+        on_progress : Callable[[int], None]
+            Called with the number of chunks read after each batch is stored. Can raise to stop storing.
+        version : str
+            Version of the source (e.g. the ETag of a URL), saved with the chunks when `incremental`.
+        params : dict
+            Parameters the chunks were made with (see `IngestionManifest.ingestion_params`), saved with `version`.
+
+        Returns
+        -------
+        result : dict
+            Number of chunks read (`chunks`), of chunks embedded and stored (`stored`) and of chunks skipped
+            as near-duplicates (`duplicates`, see `CCAT_NEAR_DUPLICATES`).
 
         Notes
         -------
         At this point, it is possible to customize the Cat's behavior using the `before_rabbithole_insert_memory` hook
         to edit the memories before they are inserted in the vector database.
+        The `before_rabbithole_stores_documents` hook receives one batch of documents at a time.
 
         See Also
         --------
         before_rabbithole_insert_memory
         """
 
-        log.info(f"Preparing to memorize {len(docs)} vectors")
-
-        # hook the docs before they are stored in the vector memory
-        docs = cat.mad_hatter.execute_hook(
-            "before_rabbithole_stores_documents", docs, cat=cat
-        )
+        log.info(f"Preparing to memorize {source}")
+
+        declarative = cat.memory.vectors.declarative
+        manifest = None
+        if incremental:
+            manifest = IngestionManifest(source, cat.user_id)
+            manifest.prune(declarative)
+
+        # skip boilerplate repeated across chunks, see `cat.memory.near_duplicates`
+        near_duplicates = None
+        near_duplicates_mode = get_env("CCAT_NEAR_DUPLICATES")
+        threshold = float(get_env("CCAT_NEAR_DUPLICATES_THRESHOLD"))
+        if near_duplicates_mode == "collection":
+            near_duplicates = NearDuplicateIndex.for_user(cat.user_id, threshold)
+        elif near_duplicates_mode == "upload":
+            near_duplicates = NearDuplicateIndex(threshold)
+        n_duplicates = 0
+        n_stored = 0
+
+        def stored_ids(ids: List[str]) -> set:
+            found = existing_ids(declarative, ids)
+            return {id for id in ids if str(uuid.UUID(id)) in found}
 
-        # classic embed
         time_last_notification = time.time()
         time_interval = 10  # a notification every 10 secs
+        n_docs = 0
         stored_points = []
-        for d, doc in enumerate(docs):
+        for batch in _batched(docs, self.store_batch_size):
+            # hook the docs before they are stored in the vector memory
+            batch = cat.mad_hatter.execute_hook(
+                "before_rabbithole_stores_documents", batch, cat=cat
+            )
+
+            to_embed = []
+            for doc in batch:
+                n_docs += 1
+
+                # add default metadata
+                doc.metadata["source"] = source
+                doc.metadata["when"] = time.time()
+                # add custom metadata (sent via endpoint)
+                for k,v in metadata.items():
+                    doc.metadata[k] = v
+
+                doc = cat.mad_hatter.execute_hook(
+                    "before_rabbithole_insert_memory", doc, cat=cat
+                )
+                inserting_info = f"{n_docs}):    {doc.page_content}"
+                if doc.page_content == "":
+                    log.info(f"Skipped memory insertion of empty doc ({inserting_info})")
+                elif manifest and manifest.match(doc):
+                    log.debug(f"Unchanged memory ({inserting_info})")
+                else:
+                    to_embed.append(doc)
+                    log.info(f"Inserting into memory ({inserting_info})")
+
+            ids = None
+            if to_embed and near_duplicates:
+                ids = [uuid.uuid4().hex for _ in to_embed]
+                kept = near_duplicates.filter(
+                    ids=ids,
+                    texts=[doc.page_content for doc in to_embed],
+                    source=source,
+                    exclude_source=incremental,
+                    exists=stored_ids,
+                )
+                n_duplicates += kept.count(False)
+                to_embed = [doc for doc, k in zip(to_embed, kept) if k]
+                ids = [id for id, k in zip(ids, kept) if k]
+
+            if to_embed:
+                if manifest:
+                    manifest_ids = [manifest.add(chunk_hash(doc)) for doc in to_embed]
+                    if near_duplicates:
+                        near_duplicates.relabel(dict(zip(ids, manifest_ids)))
+                    ids = manifest_ids
+                stored_points += self.__store_batch(cat, to_embed, ids)
+                n_stored += len(to_embed)
+
+                # wait a little to avoid APIs rate limit errors
+                time.sleep(0.05)
+
+            if on_progress:
+                on_progress(n_docs)
+
             if time.time() - time_last_notification > time_interval:
                 time_last_notification = time.time()
-                perc_read = int(d / len(docs) * 100)
-                read_message = f"Read {perc_read}% of {source}"
+                read_message = f"Read {n_docs} chunks of {source}"
                 cat.send_ws_message(read_message)
                 log.info(read_message)
 
-            # add default metadata
-            doc.metadata["source"] = source
-            doc.metadata["when"] = time.time()
-            # add custom metadata (sent via endpoint)
-            for k,v in metadata.items():
-                doc.metadata[k] = v
+        if manifest:
+            obsolete_ids = manifest.obsolete_ids()
+            if obsolete_ids:
+                declarative.delete_points(obsolete_ids)
+                if near_duplicates:
+                    near_duplicates.remove(obsolete_ids)
+            manifest.version = version
+            manifest.params = params
+            manifest.save()
 
-            doc = cat.mad_hatter.execute_hook(
-                "before_rabbithole_insert_memory", doc, cat=cat
-            )
-            inserting_info = f"{d + 1}/{len(docs)}):    {doc.page_content}"
-            if doc.page_content != "":
-                doc_embedding = cat.embedder.embed_documents([doc.page_content])
-                stored_point = cat.memory.vectors.declarative.add_point(
-                    doc.page_content,
-                    doc_embedding[0],
-                    doc.metadata,
-                )
-                stored_points.append(stored_point)
-
-                log.info(f"Inserted into memory ({inserting_info})")
-            else:
-                log.info(f"Skipped memory insertion of empty doc ({inserting_info})")
-
-            # wait a little to avoid APIs rate limit errors
-            time.sleep(0.05)
+        if near_duplicates:
+            near_duplicates.save()
 
         # hook the points after they are stored in the vector memory
         cat.mad_hatter.execute_hook(
@@ -394,14 +780,36 @@ class RabbitHole:
 
         # notify client
         finished_reading_message = (
-            f"Finished reading {source}, I made {len(docs)} thoughts on it."
+            f"Finished reading {source}, I made {n_docs} thoughts on it."
         )
+        if n_duplicates:
+            finished_reading_message += f" {n_duplicates} were near-duplicates and were skipped."
 
         cat.send_ws_message(finished_reading_message)
 
         log.info(f"Done uploading {source}")
 
-    def __split_text(self, cat, text, chunk_size, chunk_overlap):
+        return {"chunks": n_docs, "stored": n_stored, "duplicates": n_duplicates}
+
+    def __store_batch(self, cat, docs: List[Document], ids: List[str] | None):
+        """Embed and store a batch of documents, retrying on errors (e.g. embedder rate limits)."""
+
+        contents = [doc.page_content for doc in docs]
+        for attempt in range(self.store_retries + 1):
+            try:
+                return cat.memory.vectors.declarative.add_points(
+                    contents=contents,
+                    vectors=cat.embedder.embed_documents(contents),
+                    metadatas=[doc.metadata for doc in docs],
+                    ids=ids,
+                )
+            except Exception as e:
+                if attempt == self.store_retries:
+                    raise
+                log.warning(f"Storing a batch of {len(docs)} chunks failed ({e}), retrying")
+                time.sleep(2**attempt)
+
+    def __split_text(self, cat, text, chunk_size, chunk_overlap, text_splitter=None):
         """Split text in overlapped chunks.
 
         This method executes the `rabbithole_splits_text` to split the incoming text in overlapped
@@ -415,6 +823,8 @@ class RabbitHole:
             Number of tokens in each document chunk.
         chunk_overlap : int
             Number of overlapping tokens between consecutive chunks.
+        text_splitter : TextSplitter
+            Splitter to use, defaults to the one chosen by the hooks.
 
         Returns
         -------
@@ -438,14 +848,9 @@ class RabbitHole:
             "before_rabbithole_splits_text", text, cat=cat
         )
 
-        # hooks decide the test splitter (see @property .text_splitter)
-        text_splitter = self.text_splitter
-
-        # override chunk_size and chunk_overlap only if the request has those info
-        if chunk_size:
-            text_splitter._chunk_size = chunk_size
-        if chunk_overlap:
-            text_splitter._chunk_overlap = chunk_overlap
+        # hooks decide the text splitter (see `get_text_splitter`)
+        if text_splitter is None:
+            text_splitter = self.get_text_splitter(chunk_size, chunk_overlap)
 
         log.info(f"Chunk size: {chunk_size}, chunk overlap: {chunk_overlap}")
         # split text
@@ -467,8 +872,7 @@ class RabbitHole:
         self.__reload_file_handlers()
         return self.__file_handlers
 
-    # each time we access the text splitter, plugins can intervene
+    # plugins can intervene when they change, see `get_text_splitter`
     @property
     def text_splitter(self):
-        self.__reload_text_splitter()
-        return self.__text_splitter
+        return self.get_text_splitter()
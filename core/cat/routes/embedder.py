@@ -6,6 +6,7 @@ from fastapi import Request, APIRouter, Body, HTTPException
 from cat.factory.embedder import get_allowed_embedder_models, get_embedders_schemas
 from cat.db import crud, models
 from cat.log import log
+from cat.env import get_env
 from cat import utils
 
 router = APIRouter()
@@ -117,6 +118,18 @@ def upsert_embedder_setting(
             },
         )
 
+    ccat = request.app.state.ccat
+
+    # re-embed memories in background, the current embedder is kept until the migration is done
+    if get_env("CCAT_REEMBED_ON_EMBEDDER_CHANGE") == "true":
+        try:
+            migration = ccat.embedder_migration.start(languageEmbedderName, payload)
+        except Exception as e:
+            raise HTTPException(
+                status_code=400, detail={"error": utils.explicit_error_message(f"Error while changing embedder: {e}")}
+            )
+        return {"name": languageEmbedderName, "value": payload, "migration": migration}
+
     # get selected config if any
     selected = crud.get_setting_by_name(name=EMBEDDER_SELECTED_NAME)
     if selected is not None:
@@ -139,7 +152,6 @@ def upsert_embedder_setting(
 
     status = {"name": languageEmbedderName, "value": final_setting["value"]}
 
-    ccat = request.app.state.ccat
     # reload llm and embedder of the cat
     ccat.load_natural_language()
     # crete new collections (different embedder!)
@@ -177,3 +189,14 @@ def upsert_embedder_setting(
     ccat.mad_hatter.find_plugins()
 
     return status
+
+
+@router.get("/migration")
+def get_embedder_migration(
+    request: Request,
+    cat=check_permissions(AuthResource.EMBEDDER, AuthPermission.READ),
+) -> Dict:
+    """Get status and progress of the background re-embedding started by an embedder change"""
+
+    ccat = request.app.state.ccat
+    return ccat.embedder_migration.state or {}
@@ -143,3 +143,32 @@ def upsert_llm_setting(
     ccat.mad_hatter.find_plugins()
 
     return status
+
+
+# response cache metrics
+@router.get("/response_cache")
+def get_response_cache(
+    request: Request,
+    cat=check_permissions(AuthResource.LLM, AuthPermission.READ),
+) -> Dict:
+    """Get status and hit rate of the semantic response cache"""
+
+    response_cache = request.app.state.ccat.main_agent.response_cache
+    return {
+        "enabled": response_cache.enabled,
+        "threshold": response_cache.threshold,
+        "ttl": response_cache.ttl,
+        "max_entries": response_cache.max_entries,
+        "metrics": response_cache.get_metrics(),
+    }
+
+
+@router.delete("/response_cache")
+def clear_response_cache(
+    request: Request,
+    cat=check_permissions(AuthResource.LLM, AuthPermission.DELETE),
+) -> Dict:
+    """Drop all the replies in the semantic response cache"""
+
+    request.app.state.ccat.main_agent.response_cache.clear()
+    return {"cleared": True}
@@ -1,10 +1,24 @@
+import os
+import shutil
+import tempfile
 from typing import Dict
 from fastapi import Request, APIRouter, HTTPException
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
 
 from cat.looking_glass.cheshire_cat import CheshireCat
 from cat.auth.permissions import AuthPermission, AuthResource, check_permissions
 from cat.memory.vector_memory import VectorMemory
 from cat.looking_glass.stray_cat import StrayCat
+from cat.memory.memory_archive import ARCHIVES_PATH, export_collection
+from cat.concurrency import run_blocking
+from cat.memory.snapshots import (
+    SnapshotJobRunning,
+    snapshot_jobs,
+    schedule_snapshot_job,
+    take_snapshot,
+    restore_snapshots,
+)
 
 router = APIRouter()
 
@@ -21,7 +35,7 @@ async def get_collections(
     
     collections_metadata = []
     for c in collections:
-        coll_meta = vector_memory.get_collection(c)
+        coll_meta = await run_blocking(vector_memory.get_collection, c)
         collections_metadata.append({
             "name": c,
             "vectors_count": coll_meta.points_count
@@ -30,6 +44,28 @@ async def get_collections(
     return {"collections": collections_metadata}
 
 
+# GET episodic retention policies and reclaimed points
+@router.get("/retention")
+async def get_episodic_retention(
+    request: Request,
+    cat: StrayCat = check_permissions(AuthResource.MEMORY, AuthPermission.READ),
+) -> Dict:
+    """Episodic memory retention policies and number of points deleted so far"""
+
+    retention = request.app.state.ccat.episodic_retention
+    return {
+        "enabled": retention.is_enabled(),
+        "policies": {
+            "max_age_days": retention.max_age_days,
+            "max_points_per_user": retention.max_points_per_user,
+            "dedup_threshold": retention.dedup_threshold,
+            "dedup_after_days": retention.dedup_after_days,
+            "interval_minutes": retention.interval_minutes,
+        },
+        "metrics": retention.metrics,
+    }
+
+
 # DELETE all collections
 @router.delete("/collections")
 async def wipe_collections(
@@ -85,3 +121,125 @@ async def wipe_single_collection(
     }
 
 
+# GET a collection as a columnar archive
+@router.get("/collections/{collection_id}/export")
+def export_single_collection(
+    request: Request,
+    collection_id: str,
+    cat: StrayCat = check_permissions(AuthResource.MEMORY, AuthPermission.READ),
+) -> FileResponse:
+    """Export a collection as a tar archive (header, float32 vectors in .npy, NDJSON payloads).
+
+    The archive can be uploaded back with `POST /rabbithole/memory`."""
+
+    vector_memory: VectorMemory = cat.memory.vectors
+    collections = list(vector_memory.collections.keys())
+
+    if collection_id not in collections:
+        raise HTTPException(
+            status_code=400, detail={"error": "Collection does not exist."}
+        )
+
+    if collection_id == "procedural":
+        raise HTTPException(
+            status_code=400, detail={"error": "Procedural memory is not exportable."}
+        )
+
+    # one folder per export, removed once the archive is sent
+    os.makedirs(ARCHIVES_PATH, exist_ok=True)
+    folder = tempfile.mkdtemp(prefix="download_", dir=ARCHIVES_PATH)
+    try:
+        archive_path = export_collection(
+            vector_memory.collections[collection_id],
+            embedder=str(cat.embedder.__class__.__name__),
+            folder=folder,
+        )
+    except Exception:
+        shutil.rmtree(folder, ignore_errors=True)
+        raise
+
+    return FileResponse(
+        archive_path,
+        media_type="application/x-tar",
+        filename=os.path.basename(archive_path),
+        background=BackgroundTask(shutil.rmtree, folder, ignore_errors=True),
+    )
+
+
+# POST a background snapshot of a collection
+@router.post("/collections/{collection_id}/snapshots")
+async def snapshot_single_collection(
+    request: Request,
+    collection_id: str,
+    incremental: bool = False,
+    cat: StrayCat = check_permissions(AuthResource.MEMORY, AuthPermission.READ),
+) -> Dict:
+    """Snapshot a collection on disk in background.
+
+    Incremental snapshots only contain points newer (by `when`) than the previous snapshot.
+    Use the returned job id to follow the progress."""
+
+    vector_memory: VectorMemory = cat.memory.vectors
+    if collection_id not in vector_memory.collections.keys():
+        raise HTTPException(
+            status_code=400, detail={"error": "Collection does not exist."}
+        )
+
+    try:
+        job_id = schedule_snapshot_job(
+            cat.white_rabbit,
+            take_snapshot,
+            collection=vector_memory.collections[collection_id],
+            embedder=str(cat.embedder.__class__.__name__),
+            incremental=incremental,
+        )
+    except SnapshotJobRunning as e:
+        raise HTTPException(status_code=400, detail={"error": str(e)})
+
+    return {"job_id": job_id}
+
+
+# POST a background restore of the snapshots of a collection
+@router.post("/collections/{collection_id}/snapshots/restore")
+async def restore_single_collection(
+    request: Request,
+    collection_id: str,
+    cat: StrayCat = check_permissions(AuthResource.MEMORY, AuthPermission.WRITE),
+) -> Dict:
+    """Restore the latest full snapshot of a collection, followed by its incremental snapshots, in background."""
+
+    vector_memory: VectorMemory = cat.memory.vectors
+    if collection_id not in vector_memory.collections.keys():
+        raise HTTPException(
+            status_code=400, detail={"error": "Collection does not exist."}
+        )
+
+    try:
+        job_id = schedule_snapshot_job(
+            cat.white_rabbit,
+            restore_snapshots,
+            collection=vector_memory.collections[collection_id],
+            embedder=str(cat.embedder.__class__.__name__),
+        )
+    except SnapshotJobRunning as e:
+        raise HTTPException(status_code=400, detail={"error": str(e)})
+
+    return {"job_id": job_id}
+
+
+# GET status and progress of a snapshot job
+@router.get("/collections/{collection_id}/snapshots/jobs/{job_id}")
+async def get_snapshot_job(
+    request: Request,
+    collection_id: str,
+    job_id: str,
+    cat: StrayCat = check_permissions(AuthResource.MEMORY, AuthPermission.READ),
+) -> Dict:
+    """Get status and progress of a snapshot job"""
+
+    if job_id not in snapshot_jobs:
+        raise HTTPException(
+            status_code=400, detail={"error": "Snapshot job does not exist."}
+        )
+
+    return snapshot_jobs[job_id]
@@ -1,12 +1,15 @@
-from typing import Dict, List
+from typing import Dict, List, Literal
 from pydantic import BaseModel
 from fastapi import Query, Body, Request, APIRouter, HTTPException
 import time
+import base64
+import numpy as np
 
 from cat.auth.permissions import AuthPermission, AuthResource, check_permissions
 from cat.memory.vector_memory import VectorMemory
 from cat.looking_glass.stray_cat import StrayCat
 from cat.log import log
+from cat.concurrency import run_blocking
 
 class MemoryPointBase(BaseModel):
     content: str
@@ -19,6 +22,61 @@ class MemoryPoint(MemoryPointBase):
     vector: List[float]
 
 
+# float: JSON array of floats (default)
+# base64_float32 / base64_float16: base64 of the little-endian floats, decode with
+#   np.frombuffer(base64.b64decode(vector), dtype="<f4") (or "<f2")
+VectorEncoding = Literal["float", "base64_float32", "base64_float16"]
+
+VECTOR_DTYPES = {
+    "base64_float32": "<f4",
+    "base64_float16": "<f2",
+}
+
+
+def encode_vector(vector, encoding: VectorEncoding):
+    """Encode a vector for a response, base64 vectors are 4 to 8 times smaller than float arrays in JSON."""
+    if vector is None or encoding == "float":
+        return vector
+    return base64.b64encode(
+        np.asarray(vector, dtype=VECTOR_DTYPES[encoding]).tobytes()
+    ).decode("ascii")
+
+
+def project_payload(payload: Dict, keys: List[str] | None) -> Dict:
+    """Keep only the given payload keys, nested keys are dotted (e.g. `metadata.source`)."""
+    if keys is None:
+        return payload
+
+    projected = {}
+    for key in keys:
+        head, _, tail = key.partition(".")
+        if head not in payload:
+            continue
+        if not tail:
+            projected[head] = payload[head]
+        elif isinstance(payload[head], dict) and tail in payload[head]:
+            if projected.get(head) is not payload[head]:
+                projected.setdefault(head, {})[tail] = payload[head][tail]
+    return projected
+
+
+def format_recalled(memories, with_vectors, vector_encoding, payload_keys) -> List[Dict]:
+    recalled = []
+    for document, score, vector, id in memories:
+        memory_dict = project_payload(
+            {"page_content": document.page_content, "metadata": document.metadata},
+            payload_keys,
+        )
+        if payload_keys is None:
+            memory_dict["type"] = document.type
+        memory_dict["id"] = id
+        memory_dict["score"] = float(score)
+        if with_vectors:
+            memory_dict["vector"] = encode_vector(vector, vector_encoding)
+        recalled.append(memory_dict)
+    return recalled
+
+
 router = APIRouter()
 
 
@@ -28,17 +86,22 @@ async def recall_memory_points_from_text(
     request: Request,
     text: str = Query(description="Find memories similar to this text."),
     k: int = Query(default=100, description="How many memories to return."),
+    with_vectors: bool = Query(default=True, description="Return the vectors of query and memories."),
+    vector_encoding: VectorEncoding = Query(default="float", description="How vectors are encoded."),
+    payload_keys: List[str] | None = Query(
+        default=None,
+        description="Payload keys to return (e.g. `page_content`, `metadata.source`), all if not given.",
+    ),
     cat: StrayCat = check_permissions(AuthResource.MEMORY, AuthPermission.READ),
 ) -> Dict:
     """Search k memories similar to given text."""
     log.warning("Deprecated: This endpoint will be removed in the next major version.")
 
     # Embed the query to plot it in the Memory page
-    query_embedding = cat.embedder.embed_query(text)
-    query = {
-        "text": text,
-        "vector": query_embedding,
-    }
+    query_embedding = await run_blocking(cat.embedder.embed_query, text)
+    query = {"text": text}
+    if with_vectors:
+        query["vector"] = encode_vector(query_embedding, vector_encoding)
 
     # Loop over collections and retrieve nearby memories
     collections = list(
@@ -53,18 +116,17 @@ async def recall_memory_points_from_text(
         else:
             user_filter = None
 
-        memories = cat.memory.vectors.collections[c].recall_memories_from_embedding(
-            query_embedding, k=k, metadata=user_filter
+        memories = await run_blocking(
+            cat.memory.vectors.collections[c].recall_memories_from_embedding,
+            query_embedding,
+            k=k,
+            metadata=user_filter,
+            with_vectors=with_vectors,
         )
 
-        recalled[c] = []
-        for metadata, score, vector, id in memories:
-            memory_dict = dict(metadata)
-            memory_dict.pop("lc_kwargs", None)  # langchain stuff, not needed
-            memory_dict["id"] = id
-            memory_dict["score"] = float(score)
-            memory_dict["vector"] = vector
-            recalled[c].append(memory_dict)
+        recalled[c] = format_recalled(
+            memories, with_vectors, vector_encoding, payload_keys
+        )
 
     return {
         "query": query,
@@ -86,6 +148,12 @@ async def recall_memory_points(
                         description="Flat dictionary where each key-value pair represents a filter." 
                                     "The memory points returned will match the specified metadata criteria."
                         ),
+    with_vectors: bool = Body(default=True, description="Return the vectors of query and memories."),
+    vector_encoding: VectorEncoding = Body(default="float", description="How vectors are encoded."),
+    payload_keys: List[str] | None = Body(
+        default=None,
+        description="Payload keys to return (e.g. `page_content`, `metadata.source`), all if not given.",
+    ),
     cat: StrayCat = check_permissions(AuthResource.MEMORY, AuthPermission.READ),
 ) -> Dict:
     """Search k memories similar to given text with specified metadata criteria.
@@ -115,16 +183,25 @@ async def recall_memory_points(
     )
     json = res.json()
     print(json)
+
+    # only ids, scores and sources, without vectors
+    req_json = {
+        "text": "CAT",
+        "with_vectors": False,
+        "payload_keys": ["metadata.source"],
+    }
+    res = requests.post(
+        f"http://localhost:1865/memory/recall", json=req_json
+    )
     ```
 
     """
 
     # Embed the query to plot it in the Memory page
-    query_embedding = cat.embedder.embed_query(text)
-    query = {
-        "text": text,
-        "vector": query_embedding,
-    }
+    query_embedding = await run_blocking(cat.embedder.embed_query, text)
+    query = {"text": text}
+    if with_vectors:
+        query["vector"] = encode_vector(query_embedding, vector_encoding)
 
     # Loop over collections and retrieve nearby memories
     collections = list(
@@ -139,18 +216,18 @@ async def recall_memory_points(
         else:
             metadata.pop("source", None)
 
-        memories = cat.memory.vectors.collections[c].recall_memories_from_embedding(
-            query_embedding, k=k, metadata=metadata
+        # the filter is copied, it is edited for the next collection while the search runs
+        memories = await run_blocking(
+            cat.memory.vectors.collections[c].recall_memories_from_embedding,
+            query_embedding,
+            k=k,
+            metadata=dict(metadata),
+            with_vectors=with_vectors,
         )
 
-        recalled[c] = []
-        for metadata_memories, score, vector, id in memories:
-            memory_dict = dict(metadata_memories)
-            memory_dict.pop("lc_kwargs", None)  # langchain stuff, not needed
-            memory_dict["id"] = id
-            memory_dict["score"] = float(score)
-            memory_dict["vector"] = vector
-            recalled[c].append(memory_dict)
+        recalled[c] = format_recalled(
+            memories, with_vectors, vector_encoding, payload_keys
+        )
 
     return {
         "query": query,
@@ -186,7 +263,7 @@ async def create_memory_point(
         )
 
     # embed content
-    embedding = cat.embedder.embed_query(point.content)
+    embedding = await run_blocking(cat.embedder.embed_query, point.content)
 
     # ensure source is set
     if not point.metadata.get("source"):
@@ -199,8 +276,11 @@ async def create_memory_point(
         point.metadata["when"] = time.time() #if when is not in the metadata set the current time
 
     # create point
-    qdrant_point = vector_memory.collections[collection_id].add_point(
-        content=point.content, vector=embedding, metadata=point.metadata
+    qdrant_point = await run_blocking(
+        vector_memory.collections[collection_id].add_point,
+        content=point.content,
+        vector=embedding,
+        metadata=point.metadata,
     )
 
     return MemoryPoint(
@@ -230,14 +310,15 @@ async def delete_memory_point(
         )
 
     # check if point exists
-    points = vector_memory.collections[collection_id].get_points(
+    points = await run_blocking(
+        vector_memory.collections[collection_id].get_points,
         ids=[point_id],
     )
     if points == []:
         raise HTTPException(status_code=400, detail={"error": "Point does not exist."})
 
     # delete point
-    vector_memory.collections[collection_id].delete_points([point_id])
+    await run_blocking(vector_memory.collections[collection_id].delete_points, [point_id])
 
     return {"deleted": point_id}
 
@@ -254,7 +335,10 @@ async def delete_memory_points_by_metadata(
     vector_memory: VectorMemory = cat.memory.vectors
     
     # delete points
-    vector_memory.collections[collection_id].delete_points_by_metadata_filter(metadata)
+    await run_blocking(
+        vector_memory.collections[collection_id].delete_points_by_metadata_filter,
+        metadata,
+    )
 
     return {
         "deleted": []  # TODO: Qdrant does not return deleted points?
@@ -274,6 +358,12 @@ async def get_points_in_collection(
         default=None,
         description="If provided (or not empty string) - skip points with ids less than given `offset`"
     ),
+    with_vectors: bool = Query(default=True, description="Return the vectors of the points."),
+    vector_encoding: VectorEncoding = Query(default="float", description="How vectors are encoded."),
+    payload_keys: List[str] | None = Query(
+        default=None,
+        description="Payload keys to return (e.g. `page_content`, `metadata.source`), all if not given.",
+    ),
     cat: StrayCat = check_permissions(AuthResource.MEMORY, AuthPermission.READ),
 ) -> Dict:
     """Retrieve all the points from a single collection
@@ -321,6 +411,17 @@ async def get_points_in_collection(
         if next_offset is None:
             break
     ```
+
+    Example with compact vectors
+    ----------
+    ```
+    res = requests.get(
+        f"http://localhost:1865/memory/collections/{collection}/points",
+        params={"vector_encoding": "base64_float32", "payload_keys": ["page_content"]},
+    )
+    for point in res.json()["points"]:
+        vector = np.frombuffer(base64.b64decode(point["vector"]), dtype="<f4")
+    ```
     """
 
     # do not allow procedural memory reads via network
@@ -347,10 +448,22 @@ async def get_points_in_collection(
         offset = None
     
     memory_collection = cat.memory.vectors.collections[collection_id]
-    points, next_offset = memory_collection.get_all_points(limit=limit, offset=offset)
+    points, next_offset = await run_blocking(
+        memory_collection.get_all_points,
+        limit=limit,
+        offset=offset,
+        with_vectors=with_vectors,
+    )
+
+    records = []
+    for point in points:
+        record = point.model_dump()
+        record["payload"] = project_payload(record["payload"], payload_keys)
+        record["vector"] = encode_vector(record["vector"], vector_encoding)
+        records.append(record)
     
     return {
-        "points": points,
+        "points": records,
         "next_offset": next_offset
     }
 
@@ -417,14 +530,16 @@ async def edit_memory_point(
         )
 
     #ensure point exist
-    points = vector_memory.collections[collection_id].get_points([point_id])
+    points = await run_blocking(
+        vector_memory.collections[collection_id].get_points, [point_id]
+    )
     if points is None or len(points) == 0:
         raise HTTPException(
             status_code=400, detail={"error": "Point does not exist."}
         )
 
     # embed content
-    embedding = cat.embedder.embed_query(point.content)
+    embedding = await run_blocking(cat.embedder.embed_query, point.content)
 
     # ensure source is set
     if not point.metadata.get("source"):
@@ -437,8 +552,12 @@ async def edit_memory_point(
         point.metadata["when"] = time.time() #if when is not in the metadata set the current time
 
     # edit point
-    qdrant_point = vector_memory.collections[collection_id].add_point(
-        content=point.content, vector=embedding, metadata=point.metadata, id=point_id
+    qdrant_point = await run_blocking(
+        vector_memory.collections[collection_id].add_point,
+        content=point.content,
+        vector=embedding,
+        metadata=point.metadata,
+        id=point_id,
     )
 
     return MemoryPoint(
@@ -1,9 +1,10 @@
+import os
+import uuid
+import shutil
 import mimetypes
 import httpx
-import io
 import json
 from typing import Dict, List
-from copy import deepcopy
 
 from pydantic import BaseModel, Field, ConfigDict
 
@@ -18,6 +19,10 @@ from fastapi import (
 
 from cat.auth.permissions import AuthPermission, AuthResource, check_permissions
 from cat.log import log
+from cat.memory.memory_archive import ARCHIVES_PATH
+from cat.ingestion_queue import IngestionQuotaExceeded
+from cat.url_fetcher import UrlFetcher, UrlTooLarge
+from cat.concurrency import run_blocking
 
 
 # TODOV2:
@@ -29,10 +34,23 @@ from cat.log import log
 router = APIRouter()
 
 
-def format_upload_file(upload_file: UploadFile) -> UploadFile:
-    file_content = upload_file.file.read()
-    return UploadFile(filename=upload_file.filename, file=io.BytesIO(file_content))
+async def enqueue_ingestion(request: Request, cat, file, priority: str, **options) -> Dict:
+    """Queue a file or URL for ingestion, see `IngestionQueue`.
 
+    Uploaded files are copied to disk by the queue: it runs in the blocking executor.
+    """
+    try:
+        return await run_blocking(
+            request.app.state.ccat.ingestion_queue.enqueue,
+            cat.user_data,
+            file,
+            priority=priority,
+            **options,
+        )
+    except IngestionQuotaExceeded as e:
+        raise HTTPException(status_code=429, detail={"error": str(e)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"error": str(e)})
 
 
 # receive files via http endpoint
@@ -40,7 +58,6 @@ def format_upload_file(upload_file: UploadFile) -> UploadFile:
 async def upload_file(
     request: Request,
     file: UploadFile,
-    background_tasks: BackgroundTasks,
     chunk_size: int | None = Form(
         default=None,
         description="Maximum length of each chunk after the document is split (in tokens)"
@@ -54,6 +71,10 @@ async def upload_file(
         description="Metadata to be stored with each chunk (e.g. author, category, etc.). "
                     "Since we are passing this along side form data, must be a JSON string (use `json.dumps(metadata)`)."
     ),
+    priority: str = Form(
+        default="normal",
+        description="Priority of the ingestion job: `high`, `normal` or `low`"
+    ),
     cat=check_permissions(AuthResource.UPLOAD, AuthPermission.WRITE),
 ) -> Dict:
     """Upload a file containing text (.txt, .md, .pdf, etc.). File content will be extracted and segmented into chunks.
@@ -110,12 +131,11 @@ async def upload_file(
         )
 
     # upload file to long term memory, in the background
-    background_tasks.add_task(
-        # we deepcopy the file because FastAPI does not keep the file in memory after the response returns to the client
-        # https://github.com/tiangolo/fastapi/discussions/10936
-        cat.rabbit_hole.ingest_file,
+    job = await enqueue_ingestion(
+        request,
         cat,
-        deepcopy(format_upload_file(file)),
+        file,
+        priority,
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
         metadata=json.loads(metadata)
@@ -126,6 +146,7 @@ async def upload_file(
         "filename": file.filename,
         "content_type": file.content_type,
         "info": "File is being ingested asynchronously",
+        "job_id": job["id"],
     }
 
 
@@ -134,7 +155,6 @@ async def upload_file(
 async def upload_files(
     request: Request,
     files: List[UploadFile],
-    background_tasks: BackgroundTasks,
     chunk_size: int | None = Form(
         default=None,
         description="Maximum length of each chunk after the document is split (in tokens)"
@@ -148,6 +168,10 @@ async def upload_files(
         description="Metadata to be stored where each key is the name of a file being uploaded, and the corresponding value is another dictionary containing metadata specific to that file. "
                     "Since we are passing this along side form data, metadata must be a JSON string (use `json.dumps(metadata)`)."
     ),
+    priority: str = Form(
+        default="normal",
+        description="Priority of the ingestion jobs: `high`, `normal` or `low`"
+    ),
     cat=check_permissions(AuthResource.UPLOAD, AuthPermission.WRITE),
 ) -> Dict:
     """Batch upload multiple files containing text (.txt, .md, .pdf, etc.). File content will be extracted and segmented into chunks.
@@ -220,13 +244,14 @@ async def upload_files(
                 },
             )
 
+    # files are queued only once all of them are accepted
+    for file in files:
         # upload file to long term memory, in the background
-        background_tasks.add_task(
-            # we deepcopy the file because FastAPI does not keep the file in memory after the response returns to the client
-            # https://github.com/tiangolo/fastapi/discussions/10936
-            cat.rabbit_hole.ingest_file,
+        job = await enqueue_ingestion(
+            request,
             cat,
-            deepcopy(format_upload_file(file)),
+            file,
+            priority,
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
             # if file.filename in dictionary pass the metadata otherwise pass empty dictionary 
@@ -238,6 +263,7 @@ async def upload_files(
             "filename": file.filename,
             "content_type": file.content_type,
             "info": "File is being ingested asynchronously",
+            "job_id": job["id"],
         }
 
     return response
@@ -260,47 +286,54 @@ class UploadURLConfig(BaseModel):
         default={},
         description="Metadata to be stored with each chunk (e.g. author, category, etc.)"
     )
+    priority: str = Field(
+        default="normal",
+        description="Priority of the ingestion job: `high`, `normal` or `low`"
+    )
     model_config: ConfigDict = {"extra": "forbid"}
 
 @router.post("/web")
 async def upload_url(
-    background_tasks: BackgroundTasks,
+    request: Request,
     upload_config: UploadURLConfig,
     cat=check_permissions(AuthResource.UPLOAD, AuthPermission.WRITE),
 ):
     """Upload a url. Website content will be extracted and segmented into chunks.
     Chunks will be then vectorized and stored into documents memory."""
     
-    # check that URL is valid
+    # download the URL to the local cache, which also checks it is valid.
+    # The ingestion job then only revalidates the cached copy
     try:
-        # Send a HEAD request to the specified URL
-        async with httpx.AsyncClient() as client:
-            response = await client.head(
-                upload_config.url,
-                headers={"User-Agent": "Magic Browser"},
-                follow_redirects=True,
-            )
-
-        if response.status_code == 200:
-            # upload file to long term memory, in the background
-            background_tasks.add_task(
-                cat.rabbit_hole.ingest_file,
-                cat,
-                upload_config.url,
-                **upload_config.model_dump(exclude={"url"})
-            )
-            return {"url": upload_config.url, "info": "URL is being ingested asynchronously"}
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail={"error": "Invalid URL", "url": upload_config.url},
-            )
-    except httpx.RequestError as _e:
+        await UrlFetcher().fetch_async(upload_config.url)
+    except httpx.RequestError:
         log.error(f"Unable to reach the URL {upload_config.url}")
         raise HTTPException(
             status_code=400,
             detail={"error": "Unable to reach the URL", "url": upload_config.url},
         )
+    except httpx.HTTPStatusError:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "Invalid URL", "url": upload_config.url},
+        )
+    except UrlTooLarge as e:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": str(e), "url": upload_config.url},
+        )
+
+    # upload file to long term memory, in the background
+    job = await enqueue_ingestion(
+        request,
+        cat,
+        upload_config.url,
+        **upload_config.model_dump(exclude={"url"})
+    )
+    return {
+        "url": upload_config.url,
+        "info": "URL is being ingested asynchronously",
+        "job_id": job["id"],
+    }
 
 
 @router.post("/memory")
@@ -310,25 +343,41 @@ async def upload_memory(
     background_tasks: BackgroundTasks,
     cat=check_permissions(AuthResource.MEMORY, AuthPermission.WRITE),
 ) -> Dict:
-    """Upload a memory json file to the cat memory"""
+    """Upload a memory json file or a memory archive (.tar) to the cat memory"""
 
     # Get file mime type
     content_type = mimetypes.guess_type(file.filename)[0]
     log.info(f"Uploading {content_type} down the rabbit hole")
-    if content_type != "application/json":
+    admitted_types = ["application/json", "application/x-tar"]
+    if content_type not in admitted_types:
         raise HTTPException(
             status_code=400,
             detail={
-                "error": f"MIME type {content_type} not supported. Admitted types: 'application/json'"
+                "error": f'MIME type {content_type} not supported. Admitted types: {" - ".join(admitted_types)}'
             },
         )
 
-    # Ingest memories in background and notify client
-    background_tasks.add_task(
-        cat.rabbit_hole.ingest_memory,
-        cat,
-        deepcopy(file)
-    )
+    # stream the upload to disk, the background task reads it from there and removes it
+    os.makedirs(ARCHIVES_PATH, exist_ok=True)
+    extension = "tar" if content_type == "application/x-tar" else "json"
+    upload_path = os.path.join(ARCHIVES_PATH, f"upload_{uuid.uuid4().hex}.{extension}")
+    with open(upload_path, "wb") as f:
+        await run_blocking(shutil.copyfileobj, file.file, f)
+
+    if content_type == "application/x-tar":
+        # ingested in bounded batches
+        background_tasks.add_task(
+            cat.rabbit_hole.ingest_memory_archive,
+            cat,
+            upload_path
+        )
+    else:
+        # Ingest memories in background and notify client
+        background_tasks.add_task(
+            cat.rabbit_hole.ingest_memory,
+            cat,
+            upload_path
+        )
 
     # reply to client
     return {
@@ -350,3 +399,46 @@ async def get_allowed_mimetypes(
     admitted_types = list(ccat.rabbit_hole.file_handlers.keys())
 
     return {"allowed": admitted_types}
+
+
+@router.get("/jobs")
+async def get_ingestion_jobs(
+    request: Request,
+    cat=check_permissions(AuthResource.UPLOAD, AuthPermission.LIST),
+) -> Dict:
+    """List the ingestion jobs of the user, newest first"""
+
+    jobs = request.app.state.ccat.ingestion_queue.get_jobs(user_id=cat.user_id)
+    return {"jobs": jobs}
+
+
+@router.get("/jobs/{job_id}")
+async def get_ingestion_job(
+    request: Request,
+    job_id: str,
+    cat=check_permissions(AuthResource.UPLOAD, AuthPermission.READ),
+) -> Dict:
+    """Status and progress (chunks read, near-duplicate chunks skipped) of an ingestion job"""
+
+    job = request.app.state.ccat.ingestion_queue.get_job(job_id, user_id=cat.user_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404, detail={"error": f"Ingestion job {job_id} not found"}
+        )
+    return job
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_ingestion_job(
+    request: Request,
+    job_id: str,
+    cat=check_permissions(AuthResource.UPLOAD, AuthPermission.DELETE),
+) -> Dict:
+    """Cancel an ingestion job. A running job stops after the batch of chunks being stored"""
+
+    job = request.app.state.ccat.ingestion_queue.cancel(job_id, user_id=cat.user_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404, detail={"error": f"Ingestion job {job_id} not found"}
+        )
+    return job
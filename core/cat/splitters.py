@@ -0,0 +1,92 @@
+import copy
+from bisect import bisect_left, bisect_right
+from typing import Any, List
+
+import tiktoken
+from langchain.text_splitter import TextSplitter
+
+
+class TokenOffsetTextSplitter(TextSplitter):
+    """Split text in chunks of tokens, tokenizing it only once.
+
+    `RecursiveCharacterTextSplitter.from_tiktoken_encoder` measures every candidate piece with the tokenizer,
+    so overlapping text is encoded many times. Here the whole text is encoded once; chunks are cut on token
+    offsets and their end is moved back to the best separator in the second half of the chunk
+    (separators are tried in order, as in `RecursiveCharacterTextSplitter`).
+    The overlap of the next chunk starts after the first separator found, so chunks do not start mid-word.
+    Splitting cost is linear in the length of the text.
+    """
+
+    def __init__(
+        self,
+        encoding_name: str = "cl100k_base",
+        separators: List[str] | None = None,
+        encoding: tiktoken.Encoding | None = None,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self._encoding = encoding or tiktoken.get_encoding(encoding_name)
+        self._separators = [
+            s for s in (separators or ["\n\n", "\n", ". ", " "]) if s
+        ]
+
+    def __deepcopy__(self, memo):
+        # hooks deep-copy the splitter, the (immutable) encoding can be shared
+        new = copy.copy(self)
+        new._separators = list(self._separators)
+        return new
+
+    def split_text(self, text: str) -> List[str]:
+        tokens = self._encoding.encode(text, disallowed_special=())
+        if not tokens:
+            return []
+
+        # character offset where each token starts, plus the end of the text
+        _, offsets = self._encoding.decode_with_offsets(tokens)
+        bounds = offsets + [len(text)]
+
+        chunks = []
+        start = 0
+        while start < len(tokens):
+            end = min(start + self._chunk_size, len(tokens))
+            if end < len(tokens):
+                end = self._snap_end(text, bounds, start, end)
+
+            chunk = text[bounds[start] : bounds[end]]
+            if self._strip_whitespace:
+                chunk = chunk.strip()
+            if chunk:
+                chunks.append(chunk)
+
+            if end == len(tokens):
+                break
+            start = self._snap_start(
+                text, bounds, max(end - self._chunk_overlap, start + 1), end
+            )
+
+        return chunks
+
+    def _snap_end(self, text: str, bounds: List[int], start: int, end: int) -> int:
+        """Move the end of a chunk back to the best separator in its second half."""
+        lowest = bounds[start + (end - start) // 2]
+        for separator in self._separators:
+            position = text.rfind(separator, lowest, bounds[end])
+            if position != -1:
+                cut = position + len(separator)
+                snapped = bisect_right(bounds, cut, lo=start + 1, hi=end + 1) - 1
+                if snapped > start:
+                    return snapped
+        return end
+
+    def _snap_start(self, text: str, bounds: List[int], start: int, end: int) -> int:
+        """Move the start of an overlap forward, after the first separator."""
+        positions = []
+        for separator in self._separators:
+            position = text.find(separator, bounds[start], bounds[end])
+            if position != -1:
+                positions.append(position + len(separator))
+        if positions:
+            snapped = bisect_left(bounds, min(positions), lo=start, hi=end)
+            if snapped < end:
+                return snapped
+        return start
@@ -7,9 +7,11 @@ from fastapi.routing import APIRoute
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
 from cat.log import log
 from cat.env import get_env
+from cat.concurrency import LoopLagMonitor
 from cat.routes import (
     base,
     auth,
@@ -47,11 +49,24 @@ async def lifespan(app: FastAPI):
     # keep track of websocket connections
     app.state.websocket_manager = WebsocketManager()
 
+    # log callbacks blocking the event loop
+    loop_lag_monitor = None
+    loop_lag_threshold = int(get_env("CCAT_LOOP_LAG_THRESHOLD_MS"))
+    if loop_lag_threshold > 0:
+        loop_lag_monitor = LoopLagMonitor(threshold=loop_lag_threshold / 1000)
+        loop_lag_monitor.start()
+
     # startup message with admin, public and swagger addresses
     log.welcome()
 
     yield
 
+    if loop_lag_monitor:
+        loop_lag_monitor.stop()
+
+    # let ingestion workers finish their current job
+    app.state.ccat.ingestion_queue.stop()
+
 
 def custom_generate_unique_id(route: APIRoute):
     return f"{route.name}"
@@ -83,6 +98,9 @@ if cors_enabled == "true":
         allow_headers=["*"],
     )
 
+# Compress large responses (memory points and recall can reach megabytes)
+cheshire_cat_api.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Add routers to the middleware stack.
 cheshire_cat_api.include_router(base.router, tags=["Home"])
 cheshire_cat_api.include_router(auth.router, tags=["User Auth"], prefix="/auth")
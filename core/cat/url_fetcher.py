@@ -0,0 +1,174 @@
+"""Download of web pages and files for the RabbitHole.
+
+URLs are fetched with a pooled async client running on its own event loop, so they can be downloaded both from
+async routes and from ingestion workers. Bodies are streamed to disk under a size cap and kept in a local cache
+together with their `ETag` / `Last-Modified` validators: fetching a URL again sends a conditional GET and, if the
+server answers `304 Not Modified`, the cached copy is used.
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import threading
+from dataclasses import dataclass
+
+import httpx
+
+from cat.env import get_env
+from cat.log import log
+from cat.utils import singleton
+
+
+URL_CACHE_PATH = "cat/data/url_cache/"
+
+
+class UrlTooLarge(Exception):
+    pass
+
+
+@dataclass
+class FetchedUrl:
+    url: str
+    path: str
+    content_type: str
+    # ETag, Last-Modified or content hash: identifies the version of the resource
+    version: str
+    # False if the server answered 304 Not Modified
+    modified: bool
+
+
+@singleton
+class UrlFetcher:
+    """Fetches URLs to a local cache, see module docstring."""
+
+    timeout = 30
+    chunk_size = 64 * 1024
+    # cached bodies beyond this size are evicted, least recently fetched first
+    max_cache_bytes = 512 * 1024 * 1024
+
+    def __init__(self, folder: str = URL_CACHE_PATH):
+        self.folder = folder
+        os.makedirs(self.folder, exist_ok=True)
+        self.max_bytes = int(get_env("CCAT_URL_MAX_SIZE_MB")) * 1024 * 1024
+
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(
+            target=self._loop.run_forever, name="url-fetcher", daemon=True
+        ).start()
+        self._client = None
+
+    def fetch(self, url: str) -> FetchedUrl:
+        """Fetch a URL from a thread without an event loop (e.g. an ingestion worker)."""
+        return asyncio.run_coroutine_threadsafe(self._fetch(url), self._loop).result()
+
+    async def fetch_async(self, url: str) -> FetchedUrl:
+        """Fetch a URL from a coroutine (e.g. a route)."""
+        return await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(self._fetch(url), self._loop)
+        )
+
+    def _cache_paths(self, url: str):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return (
+            os.path.join(self.folder, key + ".json"),
+            os.path.join(self.folder, key + ".body"),
+        )
+
+    async def _fetch(self, url: str) -> FetchedUrl:
+        if self._client is None:
+            # created on the fetcher loop, connections are reused across fetches
+            self._client = httpx.AsyncClient(
+                headers={"User-Agent": "Magic Browser"},
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            )
+
+        info_path, body_path = self._cache_paths(url)
+        cached = None
+        if os.path.exists(info_path) and os.path.exists(body_path):
+            with open(info_path, "r") as f:
+                cached = json.load(f)
+
+        headers = {}
+        if cached and cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+        async with self._client.stream("GET", url, headers=headers) as response:
+            if cached and response.status_code == 304:
+                log.debug(f"{url} not modified, using cached copy")
+                cached["fetched_at"] = time.time()
+                self._write_info(info_path, cached)
+                return FetchedUrl(
+                    url, body_path, cached["content_type"], cached["version"], False
+                )
+
+            response.raise_for_status()
+
+            length = response.headers.get("Content-Length")
+            if length and int(length) > self.max_bytes:
+                raise UrlTooLarge(f"{url} is larger than {self.max_bytes} bytes")
+
+            tmp_path = f"{body_path}.{uuid.uuid4().hex}.tmp"
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                with open(tmp_path, "wb") as f:
+                    async for chunk in response.aiter_bytes(self.chunk_size):
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            raise UrlTooLarge(
+                                f"{url} is larger than {self.max_bytes} bytes"
+                            )
+                        digest.update(chunk)
+                        f.write(chunk)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            os.replace(tmp_path, body_path)
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        info = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_type": response.headers.get("Content-Type", "text/html").split(";")[0],
+            "version": etag or last_modified or digest.hexdigest(),
+            "size": size,
+            "fetched_at": time.time(),
+        }
+        self._write_info(info_path, info)
+        self._evict()
+
+        return FetchedUrl(url, body_path, info["content_type"], info["version"], True)
+
+    def _write_info(self, info_path: str, info: dict):
+        with open(info_path + ".tmp", "w") as f:
+            json.dump(info, f)
+        os.replace(info_path + ".tmp", info_path)
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.folder):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(self.folder, name), "r") as f:
+                        info = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                entries.append((info["fetched_at"], info["size"], info["url"]))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, url in sorted(entries):
+            if total <= self.max_cache_bytes:
+                break
+            for path in self._cache_paths(url):
+                if os.path.exists(path):
+                    os.remove(path)
+            total -= size
@@ -0,0 +1,58 @@
+from langchain_community.chat_models.fake import FakeListChatModel
+
+from cat.cache.llm_cache import LLMCache
+from cat.auth.permissions import AuthUserInfo
+from cat.looking_glass.stray_cat import StrayCat
+
+
+def test_llm_cache_memory_lru():
+    cache = LLMCache()
+    cache.max_entries = 2
+    llm = FakeListChatModel(responses=["meow"])
+
+    keys = [cache.key(llm, f"prompt {i}") for i in range(3)]
+    assert len(set(keys)) == 3
+    # same prompt, other model
+    assert cache.key(FakeListChatModel(responses=["purr"]), "prompt 0") != keys[0]
+
+    for i, key in enumerate(keys):
+        cache.put(key, f"reply {i}")
+
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) == "reply 2"
+    assert cache.get_metrics() == {"hits": 1, "disk_hits": 0, "misses": 1, "entries": 2}
+
+
+def test_llm_cache_disk(monkeypatch, tmp_path):
+    monkeypatch.setenv("CCAT_LLM_CACHE_DISK", "true")
+    path = str(tmp_path / "llm_cache.db")
+
+    LLMCache(path).put("key", "reply")
+
+    # survives a restart
+    cache = LLMCache(path)
+    assert cache.get("key") == "reply"
+    assert cache.get("key") == "reply"
+    assert cache.get_metrics()["disk_hits"] == 1
+    assert cache.get_metrics()["hits"] == 1
+
+
+def test_stray_llm_cache(client, monkeypatch):
+    ccat = client.app.state.ccat
+    monkeypatch.setattr(
+        ccat, "_llm", FakeListChatModel(responses=["first", "second", "third"])
+    )
+    stray = StrayCat(AuthUserInfo(id="Alice", name="Alice"))
+
+    assert stray.llm("Is the Queen angry?", cache=True) == "first"
+    assert stray.llm("Is the Queen angry?", cache=True) == "first"
+    # not cached
+    assert stray.llm("Is the Queen angry?") == "second"
+
+    interactions = stray.working_memory.model_interactions
+    assert [i.cached for i in interactions] == [False, True, False]
+    assert interactions[1].reply == "first"
+    assert interactions[1].started_at == interactions[1].ended_at
+
+    # CheshireCat.llm shares the cache
+    assert ccat.llm("Is the Queen angry?", cache=True) == "first"
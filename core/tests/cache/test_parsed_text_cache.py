@@ -0,0 +1,73 @@
+import os
+
+from langchain.docstore.document import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.document_loaders.blob_loaders.schema import Blob
+from langchain_community.document_loaders.parsers.txt import TextParser
+
+from cat.parsers import PDFMinerPagesParser
+from cat.cache.parsed_text_cache import ParsedTextCache
+
+
+def test_parsed_text_cache_key():
+    cache = ParsedTextCache()
+    blob = Blob.from_data("meow", mime_type="text/plain")
+
+    assert cache.key(blob, TextParser()) == cache.key(blob, TextParser())
+    assert cache.key(blob, TextParser()) != cache.key(
+        Blob.from_data("purr", mime_type="text/plain"), TextParser()
+    )
+    # other parser, other parameters
+    assert cache.key(blob, TextParser()) != cache.key(blob, PDFMinerPagesParser())
+    assert cache.key(blob, PDFMinerPagesParser()) != cache.key(
+        blob, PDFMinerPagesParser(page_numbers=[0])
+    )
+
+
+def test_parsed_text_cache_stores_and_evicts(monkeypatch, tmp_path):
+    monkeypatch.setenv("CCAT_PARSED_TEXT_CACHE", "true")
+    cache = ParsedTextCache(str(tmp_path))
+
+    docs = [Document(page_content=f"page {i}", metadata={"page": i}) for i in range(3)]
+    assert list(cache.cached_parse(iter(docs), "a")) == docs
+    assert cache.get("a") == docs
+    assert cache.get("b") is None
+    assert cache.metrics["hits"] == 1 and cache.metrics["misses"] == 1
+
+    # room for one entry only, the least recently read goes
+    cache.max_size = os.path.getsize(tmp_path / "a.json.gz") + 10
+    cache.put("b", docs)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == docs
+    assert cache.metrics["evictions"] == 1
+
+
+def test_rabbit_hole_reuses_parsed_text(stray, monkeypatch, tmp_path):
+    from cat.looking_glass.cheshire_cat import CheshireCat
+
+    monkeypatch.setenv("CCAT_PARSED_TEXT_CACHE", "true")
+    rabbit_hole = CheshireCat().rabbit_hole
+    rabbit_hole.parsed_text_cache = ParsedTextCache(str(tmp_path))
+
+    # no tokenizer download
+    monkeypatch.setattr(
+        rabbit_hole,
+        "get_text_splitter",
+        lambda chunk_size, chunk_overlap: RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap
+        ),
+    )
+
+    parsed = []
+    original = TextParser.lazy_parse
+    monkeypatch.setattr(
+        TextParser, "lazy_parse", lambda self, blob: parsed.append(blob) or original(self, blob)
+    )
+
+    blob = Blob.from_data("meow " * 50, mime_type="text/plain", path="meow.txt")
+    first = list(rabbit_hole.blob_to_docs_stream(stray, blob, chunk_size=32, chunk_overlap=0))
+    second = list(rabbit_hole.blob_to_docs_stream(stray, blob, chunk_size=64, chunk_overlap=0))
+
+    assert len(parsed) == 1
+    assert len(first) > len(second) > 0
@@ -0,0 +1,127 @@
+from langchain.docstore.document import Document
+
+from cat.agents import AgentOutput
+from cat.cache.response_cache import ResponseCache
+
+
+def declarative_memory(id, content):
+    return (Document(page_content=content, metadata={}), 0.9, [], id)
+
+
+def fingerprint(declarative=[], prefix="prefix", scope=()):
+    return ResponseCache.fingerprint(declarative, prefix, scope)
+
+
+def test_response_cache_similarity_and_fingerprint():
+    cache = ResponseCache()
+    key = fingerprint([declarative_memory("a", "doc")])
+
+    cache.put([1.0, 0.0], key, AgentOutput(output="meow"))
+
+    # similar question, same context
+    assert cache.get([0.99, 0.05], key).output == "meow"
+    # different question
+    assert cache.get([0.0, 1.0], key) is None
+    # edited document, other prompt
+    assert cache.get([1.0, 0.0], fingerprint([declarative_memory("a", "new doc")])) is None
+    assert cache.get([1.0, 0.0], fingerprint([declarative_memory("a", "doc")], prefix="other")) is None
+
+    metrics = cache.get_metrics()
+    assert metrics["hits"] == 1
+    assert metrics["misses"] == 3
+    assert metrics["hit_rate"] == 0.25
+
+
+def test_response_cache_scope(monkeypatch):
+    from cat.convo.messages import ConversationMessage
+
+    history = [ConversationMessage(user_id="user", who="Human", text="What is a cat?")]
+
+    # shared by default
+    cache = ResponseCache()
+    assert cache.scope == "global"
+    assert fingerprint(scope=cache.scope_of("alice", history)) == fingerprint(
+        scope=cache.scope_of("bob", [])
+    )
+
+    monkeypatch.setenv("CCAT_RESPONSE_CACHE_SCOPE", "user")
+    cache = ResponseCache()
+    key = fingerprint(scope=cache.scope_of("alice", history))
+    assert fingerprint(scope=cache.scope_of("alice", [])) == key
+    assert fingerprint(scope=cache.scope_of("bob", history)) != key
+
+    # follow-up question
+    monkeypatch.setenv("CCAT_RESPONSE_CACHE_SCOPE", "conversation")
+    cache = ResponseCache()
+    key = fingerprint(scope=cache.scope_of("alice", history))
+    assert fingerprint(scope=cache.scope_of("alice", [])) != key
+    assert fingerprint(scope=cache.scope_of("bob", history)) != key
+
+
+def test_response_cache_ttl_and_eviction():
+    cache = ResponseCache()
+    cache.max_entries = 2
+
+    cache.put([1.0, 0.0], "a", AgentOutput(output="a"))
+    cache.put([0.0, 1.0], "b", AgentOutput(output="b"))
+    cache.get([1.0, 0.0], "a")
+    cache.put([1.0, 1.0], "c", AgentOutput(output="c"))
+
+    # least recently used is evicted
+    assert cache.get([0.0, 1.0], "b") is None
+    assert cache.get([1.0, 0.0], "a").output == "a"
+    assert cache.get_metrics()["evictions"] == 1
+
+    cache.ttl = -1
+    assert cache.get([1.0, 0.0], "a") is None
+    assert cache.get_metrics()["entries"] == 1
+
+
+def test_response_cache_in_agent(client, main_agent, stray, monkeypatch):
+    response_cache = main_agent.response_cache
+    assert not response_cache.enabled
+    monkeypatch.setattr(response_cache, "enabled", True)
+
+    stray.working_memory.recall_query_embedding = [1.0, 0.0, 0.0]
+    first = main_agent.execute(stray)
+    n_interactions = len(stray.working_memory.model_interactions)
+    second = main_agent.execute(stray)
+
+    assert second.output == first.output
+    # no LLM call for the cached reply
+    assert len(stray.working_memory.model_interactions) == n_interactions
+    metrics = client.get("/llm/response_cache").json()["metrics"]
+    assert metrics["hits"] == 1
+    assert metrics["stores"] == 1
+
+    # plugins can opt out
+    def agent_allows_response_cache(allow, cat):
+        return False
+
+    hook = main_agent.mad_hatter.hooks["agent_allows_response_cache"][0]
+    monkeypatch.setattr(hook, "function", agent_allows_response_cache)
+    main_agent.execute(stray)
+    assert client.get("/llm/response_cache").json()["metrics"]["hits"] == 1
+
+    # same question from another user, after its first copy is stored in episodic memory: still a hit
+    from cat.auth.permissions import AuthUserInfo
+    from cat.looking_glass.stray_cat import StrayCat
+
+    monkeypatch.setattr(hook, "function", lambda allow, cat: True)
+    bob = StrayCat(AuthUserInfo(id="Bob", name="Bob"))
+    bob.working_memory.user_message_json = {"user_id": "Bob", "text": "meow"}
+    bob.working_memory.recall_query_embedding = [1.0, 0.0, 0.0]
+    bob.working_memory.episodic_memories = [
+        (Document(page_content="meow", metadata={}), 0.99, [], "new-uuid")
+    ]
+    assert main_agent.execute(bob).output == first.output
+    assert client.get("/llm/response_cache").json()["metrics"]["hits"] == 2
+
+    # unless replies are scoped to the user
+    monkeypatch.setattr(response_cache, "scope", "user")
+    main_agent.execute(bob)
+    assert client.get("/llm/response_cache").json()["metrics"]["hits"] == 2
+
+    res = client.delete("/llm/response_cache")
+    assert res.status_code == 200
+    assert client.get("/llm/response_cache").json()["metrics"]["entries"] == 0
@@ -16,6 +16,7 @@ from cat.looking_glass.stray_cat import StrayCat
 from cat.auth.permissions import AuthUserInfo
 from cat.db.database import Database
 import cat.utils as utils
+import cat.memory.write_journal as write_journal
 from cat.memory.vector_memory import VectorMemory
 from cat.mad_hatter.plugin import Plugin
 from cat.startup import cheshire_cat_api
@@ -66,6 +67,11 @@ def clean_up_mocks():
         "tests/mocks/mock_plugin/settings.json",
         "tests/mocks/mock_plugin_folder/mock_plugin",
         "tests/mocks/empty_folder",
+        "cat/data/memory_archives",
+        "cat/data/embedder_migration.json",
+        "cat/data/ingestion_manifests",
+        "cat/data/ingestion_queue",
+        "cat/data/url_cache",
         "/tmp_test",
     ]
     for tbr in to_be_removed:
@@ -95,6 +101,8 @@ def client(monkeypatch) -> Generator[TestClient, Any, None]:
     mock_classes(monkeypatch)
     # delete all singletons!!!
     utils.singleton.instances = {}
+    # journals of embedder migrations (an interrupted one is left open)
+    write_journal._journals.clear()
     
     with TestClient(cheshire_cat_api) as client:
         yield client
@@ -1,5 +1,8 @@
+import re
 import pytest
 
+from langchain_core.runnables import RunnableLambda
+
 from cat.auth.permissions import AuthUserInfo
 from cat.looking_glass.stray_cat import StrayCat
 from cat.memory.working_memory import WorkingMemory
@@ -68,6 +71,73 @@ def test_stray_classify(stray_cat):
     assert label is None  # TODO: should be "negative"
 
 
+def test_stray_classify_many(stray_cat, monkeypatch):
+
+    def label(sentence):
+        return "positive" if "good" in sentence else "negative"
+
+    # replies to batch prompts, skipping a sentence, and to single sentence prompts
+    def fake_llm(prompt_value):
+        prompt = prompt_value.to_string()
+        if "Classify this sentence" in prompt:
+            return label(prompt.splitlines()[1])
+        lines = re.findall(r'^(\d+)\. "(.*)"$', prompt, re.MULTILINE)
+        return "\n".join(
+            f"{n} -> {label(sentence)}" for n, sentence in lines if "skip" not in sentence
+        )
+
+    monkeypatch.setattr(stray_cat.__class__, "_llm", RunnableLambda(fake_llm))
+
+    sentences = ["good", "bad", "so good", "skip bad", "skip good", "very\nbad", "good!"]
+    labels = stray_cat.classify_many(
+        sentences, labels=["positive", "negative"], batch_size=3, max_concurrency=2
+    )
+
+    assert labels == [label(s) for s in sentences]
+    # 3 batches and 2 single sentences
+    assert len(stray_cat.working_memory.model_interactions) == 5
+
+
+def test_stray_classify_by_embedding(stray_cat, monkeypatch):
+
+    vectors = {
+        "header": [1.0, 0.0, 0.0],
+        "Page 1": [0.9, 0.1, 0.0],
+        "content": [0.0, 1.0, 0.0],
+        "The cat sat": [0.1, 0.9, 0.0],
+        "Page 2": [0.95, 0.05, 0.0],
+        "The dog sat": [0.05, 0.95, 0.0],
+        "Half and half": [0.5, 0.5, 0.0],
+    }
+
+    class FakeEmbedder:
+        calls = 0
+
+        def embed_documents(self, texts):
+            self.calls += 1
+            return [vectors[t] for t in texts]
+
+    embedder = FakeEmbedder()
+    monkeypatch.setattr(stray_cat.__class__, "embedder", embedder)
+    # the LLM is asked only for ambiguous sentences
+    monkeypatch.setattr(
+        stray_cat.__class__, "_llm", RunnableLambda(lambda prompt: "content")
+    )
+
+    labels = {"header": ["Page 1"], "content": ["The cat sat"]}
+    assert stray_cat.classify("Page 2", labels, mode="embedding") == "header"
+    assert stray_cat.classify("The dog sat", labels, mode="embedding") == "content"
+    assert stray_cat.working_memory.model_interactions == []
+
+    assert stray_cat.classify_many(
+        ["Page 2", "Half and half", "The dog sat"], labels, mode="embedding"
+    ) == ["header", "content", "content"]
+    assert len(stray_cat.working_memory.model_interactions) == 1
+
+    # centroids are embedded once
+    assert embedder.calls == 4
+
+
 def test_recall_to_working_memory(stray_cat):
     # empty working memory / episodic
     assert stray_cat.working_memory.episodic_memories == []
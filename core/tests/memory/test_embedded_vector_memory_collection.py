@@ -0,0 +1,188 @@
+import os
+import uuid
+
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import VectorParams, Distance, PointStruct
+
+from cat.memory.embedded_vector_memory_collection import (
+    EmbeddedVectorMemoryCollection,
+    migrate_from_local_qdrant,
+)
+from cat.memory.ingestion_manifest import existing_ids
+
+
+def create_collection(path, embedder_name="test_embedder", embedder_size=3):
+    return EmbeddedVectorMemoryCollection(
+        collection_name="declarative",
+        embedder_name=embedder_name,
+        embedder_size=embedder_size,
+        path=str(path),
+    )
+
+
+def test_add_and_recall(tmp_path):
+    collection = create_collection(tmp_path)
+
+    collection.add_point("x axis", [1, 0, 0], {"source": "a"})
+    collection.add_point("y axis", [0, 1, 0], {"source": "b"})
+    collection.add_point("almost x", [0.9, 0.1, 0], {"source": "b"})
+
+    memories = collection.recall_memories_from_embedding([1, 0, 0], k=2)
+    assert [m[0].page_content for m in memories] == ["x axis", "almost x"]
+    assert abs(memories[0][1] - 1.0) < 1e-6
+    assert len(memories[0][2]) == 3
+
+    # threshold
+    memories = collection.recall_memories_from_embedding([1, 0, 0], k=10, threshold=0.5)
+    assert len(memories) == 2
+
+    # metadata filter
+    memories = collection.recall_memories_from_embedding(
+        [1, 0, 0], k=10, metadata={"source": "b"}
+    )
+    assert [m[0].page_content for m in memories] == ["almost x", "y axis"]
+
+
+def test_filter_on_nested_and_array_metadata(tmp_path):
+    collection = create_collection(tmp_path)
+
+    collection.add_point("a", [1, 0, 0], {"tags": ["red", "blue"], "doc": {"year": 2020}})
+    collection.add_point("b", [1, 0, 0], {"tags": ["green"], "doc": {"year": 2021}, "flag": 1})
+    collection.add_point("c", [1, 0, 0], {"flag": True})
+
+    def recall(metadata):
+        memories = collection.recall_memories_from_embedding([1, 0, 0], k=10, metadata=metadata)
+        return sorted(m[0].page_content for m in memories)
+
+    assert recall({"tags": "blue"}) == ["a"]
+    assert recall({"doc": {"year": 2021}}) == ["b"]
+    assert recall({"flag": True}) == ["c"]
+
+
+def test_update_metadata(tmp_path):
+    collection = create_collection(tmp_path)
+    point = collection.add_point("a", [1, 0, 0], {"source": "a", "red": True})
+
+    collection.create_payload_index("metadata.tags")
+    collection.update_metadata({point.id: {"tags": ["red"], "users": ["alice"]}})
+
+    assert collection.get_points([point.id])[0].payload["metadata"] == {
+        "source": "a",
+        "red": True,
+        "tags": ["red"],
+        "users": ["alice"],
+    }
+    memories = collection.recall_memories_from_embedding(
+        [1, 0, 0], k=10, metadata={"tags": ["red"], "users": ["alice"]}
+    )
+    assert [m[0].page_content for m in memories] == ["a"]
+
+
+def test_existing_ids(tmp_path):
+    collection = create_collection(tmp_path)
+    points = collection.add_points(
+        ["one", "two", "three"], [[1, 0, 0], [0, 1, 0], [0, 0, 1]], [{"source": "s"}] * 3
+    )
+    collection.delete_points([points[1].id])
+
+    records = collection.get_points([p.id for p in points], with_vectors=False, with_payload=False)
+    assert all(r.vector is None and r.payload is None for r in records)
+
+    missing = str(uuid.uuid4())
+    ids = [p.id for p in points] + [missing]
+    # in canonical uuid form, as returned by Qdrant server
+    assert existing_ids(collection, ids, batch_size=2) == {
+        str(uuid.UUID(points[0].id)),
+        str(uuid.UUID(points[2].id)),
+    }
+
+
+def test_upsert_delete_and_scroll(tmp_path):
+    collection = create_collection(tmp_path)
+
+    points = collection.add_points(
+        ["one", "two", "three"],
+        [[1, 0, 0], [0, 1, 0], [0, 0, 1]],
+        [{"source": "s"}] * 3,
+    )
+    assert collection.get_collection_info().points_count == 3
+
+    # same id overwrites the point
+    collection.add_point("one bis", [1, 1, 0], {"source": "s"}, id=points[0].id)
+    assert collection.get_collection_info().points_count == 3
+    assert collection.get_points([points[0].id])[0].payload["page_content"] == "one bis"
+
+    collection.delete_points([points[1].id])
+    assert collection.get_points([points[1].id]) == []
+    memories = collection.recall_memories_from_embedding([0, 1, 0], k=10)
+    assert points[1].id not in [m[3] for m in memories]
+
+    page, next_offset = collection.get_all_points(limit=1)
+    assert len(page) == 1
+    page, next_offset = collection.get_all_points(limit=1, offset=next_offset)
+    assert len(page) == 1
+    assert next_offset is None
+
+    collection.delete_points_by_metadata_filter({"source": "s"})
+    assert collection.get_collection_info().points_count == 0
+
+
+def test_persistence_and_growth(tmp_path):
+    collection = create_collection(tmp_path)
+
+    n = 3000  # more than the initial capacity of the matrix
+    collection.add_points(
+        [str(i) for i in range(n)],
+        [[1, i, 0] for i in range(n)],
+    )
+
+    reopened = create_collection(tmp_path)
+    assert reopened.get_collection_info().points_count == n
+    memories = reopened.recall_memories_from_embedding([1, 0, 0], k=1)
+    assert memories[0][0].page_content == "0"
+
+
+def test_embedder_change_empties_collection(tmp_path):
+    collection = create_collection(tmp_path)
+    collection.add_point("meow", [1, 0, 0], {})
+
+    changed = create_collection(tmp_path, embedder_name="another_embedder", embedder_size=4)
+    assert changed.get_collection_info().points_count == 0
+    assert changed.get_collection_info().alias == "another_embedder_declarative"
+
+    changed.delete_collection()
+    assert not os.path.exists(os.path.join(tmp_path, "declarative"))
+
+
+def test_migrate_from_local_qdrant(tmp_path):
+    qdrant_path = str(tmp_path / "qdrant")
+    client = QdrantClient(path=qdrant_path)
+    client.create_collection(
+        "episodic", vectors_config=VectorParams(size=3, distance=Distance.COSINE)
+    )
+    client.upsert(
+        "episodic",
+        points=[
+            PointStruct(
+                id=i,
+                vector=[1, i, 0],
+                payload={"page_content": f"m{i}", "metadata": {"source": "user"}},
+            )
+            for i in range(10)
+        ],
+    )
+    client.close()
+
+    migrated = migrate_from_local_qdrant(
+        qdrant_path, str(tmp_path / "embedded"), batch_size=3
+    )
+    assert migrated == {"episodic": 10}
+
+    collection = EmbeddedVectorMemoryCollection(
+        collection_name="episodic",
+        embedder_name="default_embedder",
+        embedder_size=3,
+        path=str(tmp_path / "embedded"),
+    )
+    memories = collection.recall_memories_from_embedding([1, 0, 0], k=1)
+    assert memories[0][0].page_content == "m0"
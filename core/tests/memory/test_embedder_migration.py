@@ -0,0 +1,149 @@
+import os
+import time
+
+import pytest
+
+import cat.memory.write_journal as write_journal
+from cat.memory.vector_memory import VectorMemory
+from cat.memory.embedder_migration import EmbedderMigration
+from tests.utils import (
+    get_collections_names_and_point_count,
+    get_procedural_memory_contents,
+)
+
+
+def create_declarative_points(client, n):
+    for i in range(n):
+        res = client.post(
+            "/memory/collections/declarative/points",
+            json={"content": f"memory {i}", "metadata": {"source": "test"}},
+        )
+        assert res.status_code == 200
+
+
+# memory is reloaded at the end of the migration: keep the same in memory vector DB, as it happens for local and remote Qdrant
+def keep_vector_db(client, monkeypatch):
+    vector_db = client.app.state.ccat.memory.vectors.vector_db
+
+    def connect_to_vector_memory(self):
+        self.vector_db = vector_db
+
+    monkeypatch.setattr(VectorMemory, "connect_to_vector_memory", connect_to_vector_memory)
+
+
+def test_reembed_on_embedder_change(client, monkeypatch):
+    keep_vector_db(client, monkeypatch)
+    monkeypatch.setenv("CCAT_REEMBED_ON_EMBEDDER_CHANGE", "true")
+    create_declarative_points(client, 3)
+
+    response = client.put("/embedder/settings/EmbedderFakeConfig", json={"size": 64})
+    assert response.status_code == 200
+    assert response.json()["migration"]["status"] == "running"
+
+    for _ in range(50):
+        migration = client.get("/embedder/migration").json()
+        if migration["status"] != "running":
+            break
+        time.sleep(0.1)
+
+    assert migration["status"] == "completed"
+    assert migration["collections"]["declarative"]["migrated"] == 3
+
+    # new embedder selected, memories kept and re-embedded
+    response = client.get("/embedder/settings")
+    assert response.json()["selected_configuration"] == "EmbedderFakeConfig"
+
+    ccat = client.app.state.ccat
+    declarative = ccat.memory.vectors.declarative
+    points, _ = declarative.get_all_points()
+    assert sorted(p.payload["page_content"] for p in points) == ["memory 0", "memory 1", "memory 2"]
+    assert all(len(p.vector) == 64 for p in points)
+    for procedure in get_procedural_memory_contents(client):
+        assert len(procedure["vector"]) == 64
+
+    assert declarative.storage_name != "declarative"
+    assert declarative.embedder_size == 64
+
+    # journals of the old collections are gone, a new "declarative" collection can be written
+    assert write_journal._journals == {}
+    create_declarative_points(client, 1)
+
+
+def test_migration_is_resumed(client, monkeypatch, tmp_path):
+    keep_vector_db(client, monkeypatch)
+    create_declarative_points(client, 5)
+    ccat = client.app.state.ccat
+    monkeypatch.setattr(EmbedderMigration, "_schedule", lambda self: None)
+    monkeypatch.setattr(EmbedderMigration, "batch_size", 2)
+    state_path = str(tmp_path / "migration.json")
+
+    # simulate a crash after the first batch
+    class Crash(BaseException):
+        pass
+
+    original_save_state = EmbedderMigration._save_state
+    saves = []
+
+    def crashing_save_state(self):
+        original_save_state(self)
+        saves.append(1)
+        if len(saves) == 5:  # start, episodic (empty) scroll, completion and replay, first declarative batch
+            raise Crash()
+
+    monkeypatch.setattr(EmbedderMigration, "_save_state", crashing_save_state)
+    migration = EmbedderMigration(ccat, state_path=state_path)
+    migration.start("EmbedderFakeConfig", {"size": 64})
+    with pytest.raises(Crash):
+        migration.run()
+    assert migration.state["collections"]["declarative"]["migrated"] == 2
+
+    # at next boot the migration is loaded from disk and completed
+    monkeypatch.setattr(EmbedderMigration, "_save_state", original_save_state)
+    resumed = EmbedderMigration(ccat, state_path=state_path)
+    assert resumed.is_running()
+    resumed.run()
+
+    assert resumed.state["status"] == "completed"
+    assert resumed.state["collections"]["declarative"]["migrated"] == 5
+    assert ccat.memory.vectors.declarative.embedder_size == 64
+    assert get_collections_names_and_point_count(client)["declarative"] == 5
+    assert os.path.exists(state_path)
+
+
+def test_writes_during_migration_are_replayed(client, monkeypatch, tmp_path):
+    keep_vector_db(client, monkeypatch)
+    create_declarative_points(client, 5)
+    ccat = client.app.state.ccat
+    monkeypatch.setattr(EmbedderMigration, "_schedule", lambda self: None)
+    monkeypatch.setattr(EmbedderMigration, "batch_size", 2)
+
+    source = ccat.memory.vectors.declarative
+    # first page of the migration scroll
+    copied, _ = source.get_all_points(limit=2, with_vectors=False)
+    deleted_id, updated_id = copied[0].id, copied[1].id
+
+    original_copy = EmbedderMigration._copy
+    writes = []
+
+    def copy_then_write(self, points, target, embedder):
+        original_copy(self, points, target, embedder)
+        if not writes and target.collection_name == "declarative":
+            # write to the old collection points already copied
+            writes.append(1)
+            source.delete_points([deleted_id])
+            source.update_metadata({updated_id: {"source": "edited"}})
+
+    monkeypatch.setattr(EmbedderMigration, "_copy", copy_then_write)
+    migration = EmbedderMigration(ccat, state_path=str(tmp_path / "migration.json"))
+    migration.start("EmbedderFakeConfig", {"size": 64})
+    migration.run()
+
+    assert migration.state["status"] == "completed"
+    declarative = ccat.memory.vectors.declarative
+    assert declarative.storage_name != source.storage_name
+    points, _ = declarative.get_all_points(with_vectors=False)
+    ids = {str(p.id) for p in points}
+    assert len(points) == 4
+    assert str(deleted_id) not in ids
+    updated = [p for p in points if str(p.id) == str(updated_id)][0]
+    assert updated.payload["metadata"]["source"] == "edited"
@@ -0,0 +1,108 @@
+import time
+
+from cat.memory.episodic_retention import EpisodicRetention
+
+
+DAY = 86400
+
+
+def create_episodic_point(client, content, source, when):
+    res = client.post(
+        "/memory/collections/episodic/points",
+        json={"content": content, "metadata": {"source": source, "when": when}},
+    )
+    assert res.status_code == 200
+
+
+def get_episodic_contents(client):
+    points = client.get("/memory/collections/episodic/points").json()["points"]
+    return sorted(
+        (p["payload"]["metadata"]["source"], p["payload"]["page_content"])
+        for p in points
+    )
+
+
+def get_retention(client, monkeypatch, **policies):
+    for name, value in policies.items():
+        monkeypatch.setenv(f"CCAT_EPISODIC_{name.upper()}", str(value))
+    return EpisodicRetention(client.app.state.ccat)
+
+
+def test_retention_disabled_by_default(client):
+    retention = client.app.state.ccat.episodic_retention
+    assert not retention.is_enabled()
+    assert client.app.state.ccat.white_rabbit.get_job("episodic_retention") is None
+
+
+def test_retention_max_age_and_max_points(client, monkeypatch):
+    now = time.time()
+    create_episodic_point(client, "too old", "Alice", now - 40 * DAY)
+    for i in range(4):
+        create_episodic_point(client, f"alice {i}", "Alice", now - i * DAY)
+    create_episodic_point(client, "bob 0", "Bob", now - 2 * DAY)
+
+    retention = get_retention(
+        client, monkeypatch, max_age_days=30, max_points_per_user=2
+    )
+    # scheduled with the WhiteRabbit
+    assert client.app.state.ccat.white_rabbit.get_job("episodic_retention")
+
+    reclaimed = retention.run()
+
+    assert reclaimed == {"max_age": 1, "max_points": 2, "near_duplicates": 0}
+    assert get_episodic_contents(client) == [
+        ("Alice", "alice 0"),
+        ("Alice", "alice 1"),
+        ("Bob", "bob 0"),
+    ]
+    assert retention.metrics["runs"] == 1
+    # points too old are deleted by the vector DB, before scanning
+    assert retention.metrics["last_run_scanned"] == 5
+    assert retention.metrics["total_reclaimed"]["max_points"] == 2
+
+    # nothing left to reclaim
+    assert sum(retention.run().values()) == 0
+    assert retention.metrics["total_reclaimed"]["max_points"] == 2
+
+
+def test_retention_near_duplicates(client, monkeypatch):
+    now = time.time()
+    # old duplicates are down-sampled, recent ones are kept
+    for i in range(3):
+        create_episodic_point(client, "same old message", "Alice", now - (10 + i) * DAY)
+    create_episodic_point(client, "same old message", "Alice", now)
+    create_episodic_point(client, "same old message", "Bob", now - 10 * DAY)
+
+    retention = get_retention(
+        client, monkeypatch, dedup_threshold=0.99, dedup_after_days=7
+    )
+    reclaimed = retention.run()
+
+    assert reclaimed["near_duplicates"] == 2
+    assert get_episodic_contents(client) == [
+        ("Alice", "same old message"),
+        ("Alice", "same old message"),
+        ("Bob", "same old message"),
+    ]
+
+
+def test_retention_endpoint(client):
+    res = client.get("/memory/retention")
+    assert res.status_code == 200
+    json = res.json()
+    assert json["enabled"] is False
+    assert json["policies"]["max_points_per_user"] == 0
+    assert json["metrics"]["runs"] == 0
+
+
+def test_retention_max_age_only_does_not_scan(client, monkeypatch):
+    now = time.time()
+    create_episodic_point(client, "too old", "Alice", now - 40 * DAY)
+    create_episodic_point(client, "recent", "Alice", now - DAY)
+
+    retention = get_retention(client, monkeypatch, max_age_days=30)
+    reclaimed = retention.run()
+
+    assert reclaimed == {"max_age": 1, "max_points": 0, "near_duplicates": 0}
+    assert retention.metrics["last_run_scanned"] == 0
+    assert get_episodic_contents(client) == [("Alice", "recent")]
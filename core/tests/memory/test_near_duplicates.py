@@ -0,0 +1,45 @@
+from cat.memory.near_duplicates import NearDuplicateIndex
+
+
+DISCLAIMER = (
+    "This document is confidential and property of Meow Corporation, "
+    "it must not be shared outside the company without written approval"
+)
+
+
+def test_near_duplicates_in_upload():
+    index = NearDuplicateIndex(threshold=0.8)
+    texts = [
+        DISCLAIMER,
+        "Cats sleep between twelve and sixteen hours a day, mostly in boxes",
+        DISCLAIMER + " Page 2",
+        DISCLAIMER.replace("Meow", "MEOW"),
+        "",
+        "...",
+    ]
+
+    kept = index.filter([str(i) for i in range(len(texts))], texts, "manual.pdf")
+    assert kept == [True, True, False, False, True, True]
+    # chunks of the next batches are compared too
+    assert index.filter(["6"], [DISCLAIMER], "manual.pdf") == [False]
+
+
+def test_near_duplicates_in_collection(tmp_path):
+    path = str(tmp_path / "index.npz")
+    index = NearDuplicateIndex(threshold=0.8, path=path)
+    index.filter(["a"], [DISCLAIMER], "manual.pdf")
+    index.save()
+
+    # other sources
+    index = NearDuplicateIndex(threshold=0.8, path=path)
+    assert index.filter(["b"], [DISCLAIMER], "other.pdf", exists=lambda ids: set(ids)) == [False]
+
+    # the same source uploaded again replaces its chunks
+    index = NearDuplicateIndex(threshold=0.8, path=path)
+    assert index.filter(["c"], [DISCLAIMER], "manual.pdf", exclude_source=True) == [True]
+
+    # chunks deleted from memory do not count
+    index = NearDuplicateIndex(threshold=0.8, path=path)
+    assert index.filter(["d"], [DISCLAIMER], "other.pdf", exists=lambda ids: set()) == [True]
+    index.save()
+    assert NearDuplicateIndex(threshold=0.8, path=path).ids == ["d"]
@@ -0,0 +1,47 @@
+from cat.memory.embedded_vector_memory_collection import EmbeddedVectorMemoryCollection
+from cat.memory.pinned_vector_memory_collection import PinnedVectorMemoryCollection
+
+
+def create_pinned_collection(path):
+    collection = EmbeddedVectorMemoryCollection(
+        collection_name="procedural",
+        embedder_name="test_embedder",
+        embedder_size=3,
+        path=str(path),
+    )
+    collection.add_point("tool a", [1, 0, 0], {"source": "a", "type": "tool"})
+    collection.add_point("tool b", [0.8, 0.2, 0], {"source": "b", "type": "tool"})
+    collection.add_point("form c", [0, 1, 0], {"source": "c", "type": "form"})
+    return PinnedVectorMemoryCollection(collection)
+
+
+def test_pinned_recall_matches_wrapped_collection(tmp_path):
+    pinned = create_pinned_collection(tmp_path)
+
+    for config in [
+        {"embedding": [1, 0.1, 0], "k": 2},
+        {"embedding": [0.3, 1, 0], "k": 3, "threshold": 0.5},
+        {"embedding": [1, 1, 0], "k": 3, "metadata": {"type": "tool"}},
+    ]:
+        from_ram = pinned.recall_memories_from_embedding(**config)
+        from_db = pinned.collection.recall_memories_from_embedding(**config)
+
+        assert [m[3] for m in from_ram] == [m[3] for m in from_db]
+        assert [m[0] for m in from_ram] == [m[0] for m in from_db]
+        for ram, db in zip(from_ram, from_db):
+            assert abs(ram[1] - db[1]) < 1e-5
+
+
+def test_pinned_collection_refresh(tmp_path):
+    pinned = create_pinned_collection(tmp_path)
+
+    # writes are delegated to the wrapped collection...
+    pinned.add_point("tool d", [0, 0, 1], {"source": "d", "type": "tool"})
+    assert pinned.get_collection_info().points_count == 4
+
+    # ...and are visible to recall only after a refresh
+    memories = pinned.recall_memories_from_embedding([0, 0, 1], k=1, threshold=0.9)
+    assert memories == []
+    pinned.refresh()
+    memories = pinned.recall_memories_from_embedding([0, 0, 1], k=1, threshold=0.9)
+    assert memories[0][0].page_content == "tool d"
@@ -0,0 +1,145 @@
+import os
+import time
+import hashlib
+import threading
+import functools
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+
+from cat.memory.snapshots import (
+    take_snapshot,
+    restore_snapshots,
+    load_manifest,
+    download_snapshot,
+    file_checksum,
+    snapshot_jobs,
+)
+from tests.utils import get_collections_names_and_point_count
+
+
+def create_declarative_point(client, content, when):
+    res = client.post(
+        "/memory/collections/declarative/points",
+        json={"content": content, "metadata": {"source": "test", "when": when}},
+    )
+    assert res.status_code == 200
+
+
+def test_full_and_incremental_snapshots(client, tmp_path):
+    folder = str(tmp_path)
+    create_declarative_point(client, "old", when=1)
+    create_declarative_point(client, "older", when=2)
+    declarative = client.app.state.ccat.memory.vectors.declarative
+
+    take_snapshot(declarative, embedder="DumbEmbedder", folder=folder)
+    create_declarative_point(client, "new", when=3)
+    take_snapshot(declarative, embedder="DumbEmbedder", incremental=True, folder=folder)
+
+    manifest = load_manifest(folder, "default_embedder_declarative")
+    assert [s["incremental"] for s in manifest] == [False, True]
+    assert manifest[1]["since"] == 2
+    assert manifest[1]["until"] == 3
+    for s in manifest:
+        path = os.path.join(folder, s["file"])
+        assert file_checksum(path) == s["sha256"]
+        assert os.path.exists(path + ".sha256")
+
+    # restore full + incremental chain
+    client.delete("/memory/collections/declarative")
+    declarative = client.app.state.ccat.memory.vectors.declarative
+    restored = restore_snapshots(declarative, embedder="DumbEmbedder", folder=folder)
+    assert restored == 3
+    assert get_collections_names_and_point_count(client)["declarative"] == 3
+
+
+def test_restore_checks_checksum(client, tmp_path):
+    folder = str(tmp_path)
+    create_declarative_point(client, "meow", when=1)
+    declarative = client.app.state.ccat.memory.vectors.declarative
+
+    path = take_snapshot(declarative, embedder="DumbEmbedder", folder=folder)
+    with open(path, "ab") as f:
+        f.write(b"corrupted")
+
+    with pytest.raises(Exception) as e:
+        restore_snapshots(declarative, embedder="DumbEmbedder", folder=folder)
+    assert "Checksum mismatch" in str(e.value)
+
+
+def test_snapshot_job(client):
+    create_declarative_point(client, "meow", when=1)
+
+    res = client.post("/memory/collections/declarative/snapshots")
+    assert res.status_code == 200
+    job_id = res.json()["job_id"]
+
+    for _ in range(50):
+        job = client.get(f"/memory/collections/declarative/snapshots/jobs/{job_id}").json()
+        if job["status"] in ["completed", "failed"]:
+            break
+        time.sleep(0.1)
+
+    assert job["status"] == "completed"
+    assert job["progress"] == 1
+    assert os.path.exists(job["result"])
+    os.remove(job["result"])
+    os.remove(job["result"] + ".sha256")
+    os.remove("dormouse/default_embedder_declarative.manifest.json")
+
+    res = client.get("/memory/collections/declarative/snapshots/jobs/wrong_id")
+    assert res.status_code == 400
+
+
+def test_one_snapshot_job_per_collection(client):
+    # a job still running on the declarative collection
+    storage_name = client.app.state.ccat.memory.vectors.declarative.storage_name
+    snapshot_jobs["take_snapshot-running"] = {
+        "id": "take_snapshot-running",
+        "collection": storage_name,
+        "status": "running",
+    }
+
+    try:
+        res = client.post("/memory/collections/declarative/snapshots")
+        assert res.status_code == 400
+        assert "take_snapshot-running" in res.json()["detail"]["error"]
+
+        res = client.post("/memory/collections/declarative/snapshots/restore")
+        assert res.status_code == 400
+    finally:
+        del snapshot_jobs["take_snapshot-running"]
+
+
+def test_download_snapshot(tmp_path):
+    served = tmp_path / "served"
+    served.mkdir()
+    (served / "collection.snapshot").write_bytes(os.urandom(3 * 1024 * 1024 + 7))
+
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=str(served))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/collection.snapshot"
+
+    try:
+        path = str(tmp_path / "collection.snapshot")
+        expected = file_checksum(str(served / "collection.snapshot"))
+
+        # a partial download of another snapshot is deleted, not resumed
+        (tmp_path / "collection.snapshot.0123456789ab.part").write_bytes(b"stale")
+        assert download_snapshot(url, path, checksum=expected) == expected
+        assert file_checksum(path) == expected
+        assert [f for f in os.listdir(tmp_path) if f.endswith(".part")] == []
+
+        # a partial download of this snapshot is discarded when the server ignores ranges
+        part_path = f"{path}.{hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]}.part"
+        with open(part_path, "wb") as f:
+            f.write(b"stale")
+        assert download_snapshot(url, path, checksum=expected) == expected
+        assert file_checksum(path) == expected
+        assert not os.path.exists(part_path)
+
+        with pytest.raises(Exception):
+            download_snapshot(url, path, checksum="wrong")
+    finally:
+        server.shutdown()
@@ -0,0 +1,9 @@
+import importlib.util
+
+
+# dependencies of the ingest anything plugin, installed from its requirements.txt
+collect_ignore = (
+    []
+    if all(importlib.util.find_spec(m) for m in ("pandas", "openpyxl", "pptx"))
+    else ["test_table_parser.py"]
+)
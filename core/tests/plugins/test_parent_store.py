@@ -0,0 +1,77 @@
+from langchain.docstore.document import Document
+
+from cat.plugins.CAT_aggregated_chunks.parent_store import (
+    PARENT_CONTENT_KEY,
+    PARENT_ID_KEY,
+    attach_parents,
+    expand_parents,
+    parent_id,
+)
+
+
+class StoredChildren:
+    """Stands for the declarative collection, recalls the stored children by metadata."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.recalls = []
+
+    def recall_memories_from_embedding(self, embedding, metadata=None, k=5, with_vectors=True):
+        self.recalls.append(metadata)
+        found = [
+            doc for doc in self.docs
+            if all(doc.metadata.get(key) == value for key, value in metadata.items())
+        ]
+        return [(doc, 0.5, None, str(i)) for i, doc in enumerate(found[:k])]
+
+
+def test_attach_parents():
+    chunks = [Document(page_content=c, metadata={"source": "doc.pdf"}) for c in "abcde"]
+
+    attach_parents(chunks, 2)
+
+    # the text of each parent is stored once, in its first child
+    assert [c.metadata.get(PARENT_CONTENT_KEY) for c in chunks] == ["ab", None, "cd", None, "e"]
+    assert chunks[0].metadata[PARENT_ID_KEY] == parent_id("ab")
+    assert chunks[0].metadata[PARENT_ID_KEY] == chunks[1].metadata[PARENT_ID_KEY]
+    assert chunks[1].metadata[PARENT_ID_KEY] != chunks[2].metadata[PARENT_ID_KEY]
+    # children keep their own text, they are the ones embedded
+    assert [c.page_content for c in chunks] == list("abcde")
+
+
+def test_expand_parents():
+    chunks = attach_parents(
+        [Document(page_content=c, metadata={"source": "doc.pdf"}) for c in "abcd"], 2
+    )
+    collection = StoredChildren(chunks)
+    other = Document(page_content="unrelated", metadata={"source": "notes.txt"})
+    # sorted by score: two children of the same parent, a plain memory, a child of another parent
+    memories = [
+        (chunks[1], 0.9, [0.1], "id1"),
+        (chunks[0], 0.8, [0.2], "id0"),
+        (other, 0.7, [0.3], "id4"),
+        (chunks[3], 0.6, [0.4], "id3"),
+    ]
+
+    expanded = expand_parents(memories, collection, [0.5], 2)
+
+    assert [(doc.page_content, id) for doc, _, _, id in expanded] == [
+        ("ab", "id1"),
+        ("unrelated", "id4"),
+        ("cd", "id3"),
+    ]
+    assert expanded[0][1] == 0.9
+    assert PARENT_CONTENT_KEY not in expanded[0][0].metadata
+    assert expanded[0][0].metadata["source"] == "doc.pdf"
+    # the first parent was among the hits, only the second one is looked up
+    assert collection.recalls == [{PARENT_ID_KEY: parent_id("cd")}]
+
+
+def test_expand_parents_without_first_child():
+    chunks = attach_parents([Document(page_content=c) for c in "ab"], 2)
+    # the first child was not stored (e.g. skipped as a near-duplicate)
+    collection = StoredChildren(chunks[1:])
+
+    expanded = expand_parents([(chunks[1], 0.9, None, "id1")], collection, [0.5], 2)
+
+    assert [doc.page_content for doc, _, _, _ in expanded] == ["b"]
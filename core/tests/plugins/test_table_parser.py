@@ -0,0 +1,59 @@
+import io
+import json
+
+import openpyxl
+from langchain_community.document_loaders.blob_loaders import Blob
+
+from cat.plugins.CAT_ingestanything_Elio_mod.parsers import TableParser
+
+
+XLSX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def test_csv_windows():
+    csv = "name,age\nalice,30\nbob,41\ncarol,25\ndave,52\neve,19\n"
+    blob = Blob.from_data(csv.encode("utf-8"), mime_type="text/csv")
+
+    docs = list(TableParser(rows_per_document=2).lazy_parse(blob))
+
+    assert [(d.metadata["row_start"], d.metadata["row_end"]) for d in docs] == [
+        (2, 3),
+        (4, 5),
+        (6, 6),
+    ]
+    assert all(d.metadata["header"] == ["name", "age"] for d in docs)
+    assert "sheet" not in docs[0].metadata
+    assert json.loads(docs[2].page_content) == [{"name": "eve", "age": 19}]
+
+
+def test_xlsx_windows():
+    workbook = openpyxl.Workbook()
+    people = workbook.active
+    people.title = "people"
+    people.append(["name", "age"])
+    people.append(["alice", 30])
+    people.append(["bob", 41])
+    people.append([None, None])
+    people.append(["carol", 25])
+    # formatted but empty cell: a trailing blank row read by openpyxl
+    people["A8"].number_format = "0.00"
+    workbook.create_sheet("empty")
+    cities = workbook.create_sheet("cities")
+    cities.append(["city", None])
+    cities.append(["Rome", "IT"])
+    data = io.BytesIO()
+    workbook.save(data)
+    blob = Blob.from_data(data.getvalue(), mime_type=XLSX_MIME_TYPE)
+
+    docs = list(TableParser(rows_per_document=2).lazy_parse(blob))
+
+    assert [
+        (d.metadata["sheet"], d.metadata["row_start"], d.metadata["row_end"]) for d in docs
+    ] == [
+        ("people", 2, 3),
+        ("people", 5, 5),
+        ("cities", 2, 2),
+    ]
+    assert json.loads(docs[1].page_content) == [{"name": "carol", "age": 25}]
+    assert docs[2].metadata["header"] == ["city", "Unnamed: 1"]
+    assert json.loads(docs[2].page_content) == [{"city": "Rome", "Unnamed: 1": "IT"}]
@@ -0,0 +1,68 @@
+import pytest
+from qdrant_client import QdrantClient
+
+from cat.memory.vector_memory_collection import VectorMemoryCollection
+from cat.memory.embedded_vector_memory_collection import EmbeddedVectorMemoryCollection
+from cat.plugins.CAT_doc_front_end_manager.tag_fields import migrate_boolean_tags, tag_filter
+
+
+@pytest.fixture(params=["qdrant", "embedded"])
+def collection(request, tmp_path):
+    if request.param == "qdrant":
+        return VectorMemoryCollection(
+            client=QdrantClient(":memory:"),
+            collection_name="declarative",
+            embedder_name="test_embedder",
+            embedder_size=3,
+        )
+    return EmbeddedVectorMemoryCollection(
+        collection_name="declarative",
+        embedder_name="test_embedder",
+        embedder_size=3,
+        path=str(tmp_path),
+    )
+
+
+def recall(collection, metadata):
+    memories = collection.recall_memories_from_embedding([1, 0, 0], metadata=metadata, k=10)
+    return sorted(m[0].page_content for m in memories)
+
+
+def test_migrate_boolean_tags(collection):
+    # old schema: one boolean key per tag and per user
+    collection.add_point("hr doc", [1, 0, 0], {"hr": True, "alice": True, "is_public": True})
+    collection.add_point("it doc", [0.9, 0.1, 0], {"it": True, "hr": True, "bob": True})
+    # already migrated
+    collection.add_point("carol doc", [0.8, 0.2, 0], {"tags": ["hr"], "users": ["carol"]})
+    # no flags at all
+    collection.add_point("plain doc", [0.7, 0.3, 0], {"source": "notes.txt"})
+
+    migrated = migrate_boolean_tags(collection, ["hr", "it"], ["alice", "bob", "admin"])
+    assert migrated == 2
+
+    points, _ = collection.get_all_points(with_vectors=False)
+    metadata = {p.payload["page_content"]: p.payload["metadata"] for p in points}
+    assert metadata["hr doc"]["tags"] == ["hr"]
+    # unknown boolean keys are plain metadata, not users
+    assert metadata["hr doc"]["users"] == ["alice"]
+    assert metadata["hr doc"]["is_public"] is True
+    assert metadata["it doc"]["tags"] == ["it", "hr"]
+    assert metadata["it doc"]["users"] == ["bob"]
+    assert metadata["carol doc"] == {"tags": ["hr"], "users": ["carol"]}
+    assert "tags" not in metadata["plain doc"]
+
+    # nothing left to migrate
+    assert migrate_boolean_tags(collection, ["hr", "it"], ["alice", "bob"]) == 0
+
+
+def test_tag_filter(collection):
+    collection.add_point("hr doc", [1, 0, 0], {"tags": ["hr"], "users": ["alice"]})
+    collection.add_point("hr it doc", [0.9, 0.1, 0], {"tags": ["hr", "it"], "users": ["alice", "bob"]})
+    collection.add_point("bob doc", [0.8, 0.2, 0], {"tags": ["it"], "users": ["bob"]})
+
+    # every active tag and the user must be in the chunk
+    assert recall(collection, tag_filter(["hr"], "alice")) == ["hr doc", "hr it doc"]
+    assert recall(collection, tag_filter(["hr", "it"], "alice")) == ["hr it doc"]
+    assert recall(collection, tag_filter(["it"], "bob")) == ["bob doc", "hr it doc"]
+    assert recall(collection, tag_filter([], "bob")) == ["bob doc", "hr it doc"]
+    assert recall(collection, tag_filter(["hr"], "carol")) == []
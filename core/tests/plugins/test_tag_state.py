@@ -0,0 +1,96 @@
+import os
+import json
+
+import pytest
+
+import cat.plugins.CAT_doc_front_end_manager.tag_state as tag_state_module
+from cat.plugins.CAT_doc_front_end_manager.tag_state import TagStateStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(tag_state_module, "USER_STATUS_PATH", tmp_path / "user_status.json")
+    monkeypatch.setattr(tag_state_module, "TAGS_PATH", tmp_path / "tags.json")
+    return TagStateStore()
+
+
+def write_json(path, data, mtime_ns):
+    path.write_text(json.dumps(data), encoding="utf-8")
+    # explicit mtimes, writes in the same tick would not be seen as changes
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_reload_on_mtime_change(store):
+    assert store.raw_user_status() is None
+    assert store.tags_data() is None
+
+    write_json(tag_state_module.TAGS_PATH, {"tags": ["hr", "it"]}, 1_000_000_000)
+    write_json(
+        tag_state_module.USER_STATUS_PATH,
+        {"alice": {"hr": {"status": True, "selected_prompt": "Be formal"}}},
+        1_000_000_000,
+    )
+    assert store.tags() == ["hr", "it"]
+    assert store.active_tags("alice") == ["hr"]
+    assert store.selected_prompt("alice") == "Be formal"
+    # missing tags and fields are filled in
+    assert store.tags_for_user("alice")["it"]["status"] is False
+    assert store.tags_for_user("alice")["hr"]["documents"] == []
+
+    # same mtime, the file is not read again
+    write_json(
+        tag_state_module.USER_STATUS_PATH,
+        {"alice": {"it": {"status": True}}},
+        1_000_000_000,
+    )
+    assert store.active_tags("alice") == ["hr"]
+
+    # new mtime, views are rebuilt
+    os.utime(tag_state_module.USER_STATUS_PATH, ns=(2_000_000_000, 2_000_000_000))
+    assert store.active_tags("alice") == ["it"]
+    assert store.selected_prompt("alice") is None
+
+
+def test_add_documents(store):
+    write_json(tag_state_module.TAGS_PATH, {"tags": ["hr"]}, 1_000_000_000)
+    write_json(
+        tag_state_module.USER_STATUS_PATH,
+        {"alice": {"hr": {"status": True, "documents": ["old.pdf"]}}},
+        1_000_000_000,
+    )
+
+    store.add_documents("alice", ["hr", "it"], ["/tmp/uploads/new.pdf", "old.pdf", " "])
+    store.add_documents("bob", ["hr"], ["new.pdf"])
+
+    # merged with what is on disk: basenames, no duplicates, other fields kept
+    on_disk = json.loads(tag_state_module.USER_STATUS_PATH.read_text(encoding="utf-8"))
+    assert on_disk["alice"]["hr"]["documents"] == ["old.pdf", "new.pdf"]
+    assert on_disk["alice"]["hr"]["status"] is True
+    assert on_disk["alice"]["it"]["documents"] == ["new.pdf", "old.pdf"]
+    assert on_disk["bob"]["hr"]["documents"] == ["new.pdf"]
+    # the copy in memory is updated too
+    assert store.tags_for_user("alice")["hr"]["documents"] == ["old.pdf", "new.pdf"]
+
+    # nothing to add, nothing written
+    store.add_documents("carol", ["hr"], [])
+    assert "carol" not in store.user_status()
+
+
+def test_replace_tags_rebuilds_views(store):
+    write_json(tag_state_module.TAGS_PATH, {"tags": ["hr"]}, 1_000_000_000)
+    write_json(
+        tag_state_module.USER_STATUS_PATH,
+        {"alice": {"hr": {"status": True}}},
+        1_000_000_000,
+    )
+    assert list(store.tags_for_user("alice")) == ["hr"]
+
+    store.replace_tags(["hr", "legal"])
+
+    assert json.loads(tag_state_module.TAGS_PATH.read_text(encoding="utf-8")) == {
+        "tags": ["hr", "legal"]
+    }
+    assert store.tags() == ["hr", "legal"]
+    assert list(store.tags_for_user("alice")) == ["hr", "legal"]
+    assert store.tags_for_user("alice")["legal"]["status"] is False
+    assert store.active_tags("alice") == ["hr"]
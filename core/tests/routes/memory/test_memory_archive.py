@@ -0,0 +1,157 @@
+import io
+import os
+import json
+import tarfile
+
+import numpy as np
+import pytest
+
+from cat.memory.memory_archive import ARCHIVES_PATH, export_collection, import_collection
+from tests.utils import get_collections_names_and_point_count
+
+
+def create_declarative_points(client, n):
+    for i in range(n):
+        res = client.post(
+            "/memory/collections/declarative/points",
+            json={"content": f"memory {i}", "metadata": {"source": "test", "index": i}},
+        )
+        assert res.status_code == 200
+
+
+def test_export_and_import_collection(client):
+    create_declarative_points(client, 3)
+
+    response = client.get("/memory/collections/declarative/export")
+    assert response.status_code == 200
+
+    with tarfile.open(fileobj=io.BytesIO(response.content)) as tar:
+        assert tar.getnames() == ["header.json", "vectors.npy", "payloads.ndjson"]
+        header = json.load(tar.extractfile("header.json"))
+        vectors = np.load(io.BytesIO(tar.extractfile("vectors.npy").read()))
+        payloads = tar.extractfile("payloads.ndjson").read().decode().splitlines()
+
+    assert header["collection"] == "declarative"
+    assert header["embedder"] == "DumbEmbedder"
+    assert header["count"] == 3
+    assert vectors.dtype == np.float32
+    assert vectors.shape == (3, header["dim"])
+    assert sorted(json.loads(p)["page_content"] for p in payloads) == [
+        "memory 0",
+        "memory 1",
+        "memory 2",
+    ]
+
+    # the exported file is removed once sent
+    assert [f for f in os.listdir(ARCHIVES_PATH) if f.startswith("download_")] == []
+
+    # wipe and upload the archive back
+    client.delete("/memory/collections/declarative")
+    assert get_collections_names_and_point_count(client)["declarative"] == 0
+
+    response = client.post(
+        "/rabbithole/memory/",
+        files={"file": ("declarative.tar", response.content, "application/x-tar")},
+    )
+    assert response.status_code == 200
+    assert get_collections_names_and_point_count(client)["declarative"] == 3
+
+    # procedural memory is not exportable
+    response = client.get("/memory/collections/procedural/export")
+    assert response.status_code == 400
+
+
+def test_export_and_import_in_batches_with_resume(client, tmp_path):
+    create_declarative_points(client, 7)
+    declarative = client.app.state.ccat.memory.vectors.declarative
+
+    archive_path = export_collection(
+        declarative, embedder="DumbEmbedder", folder=str(tmp_path), batch_size=2
+    )
+    client.delete("/memory/collections/declarative")
+    declarative = client.app.state.ccat.memory.vectors.declarative
+
+    # interrupt the import after the first batch
+    class Interrupted(Exception):
+        pass
+
+    def interrupt(imported, total):
+        raise Interrupted()
+
+    try:
+        import_collection(
+            declarative,
+            embedder="DumbEmbedder",
+            archive_path=archive_path,
+            folder=str(tmp_path),
+            batch_size=3,
+            on_progress=interrupt,
+        )
+    except Interrupted:
+        pass
+    assert get_collections_names_and_point_count(client)["declarative"] == 3
+
+    # resume from the saved progress
+    progress = []
+    imported = import_collection(
+        declarative,
+        embedder="DumbEmbedder",
+        archive_path=archive_path,
+        folder=str(tmp_path),
+        batch_size=3,
+        on_progress=lambda imported, total: progress.append(imported),
+    )
+    assert imported == 7
+    assert progress == [6, 7]
+    assert get_collections_names_and_point_count(client)["declarative"] == 7
+    assert os.listdir(tmp_path) == ["declarative.tar"]
+
+
+def test_interrupted_full_export_is_not_resumed_by_incremental_one(client, tmp_path):
+    create_declarative_points(client, 7)
+    declarative = client.app.state.ccat.memory.vectors.declarative
+
+    class Interrupted(Exception):
+        pass
+
+    def interrupt(exported, total):
+        raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        export_collection(
+            declarative, embedder="DumbEmbedder", folder=str(tmp_path), batch_size=2,
+            on_progress=interrupt,
+        )
+
+    # the incremental export starts from scratch, with its own filter
+    archive_path = export_collection(
+        declarative, embedder="DumbEmbedder", folder=str(tmp_path), batch_size=2, since=0
+    )
+    assert os.path.basename(archive_path) == "declarative_since_0.tar"
+    with tarfile.open(archive_path) as tar:
+        header = json.load(tar.extractfile("header.json"))
+    assert header["since"] == 0
+    assert header["count"] == 7
+
+    # the full export resumes its own progress
+    progress = []
+    archive_path = export_collection(
+        declarative, embedder="DumbEmbedder", folder=str(tmp_path), batch_size=2,
+        on_progress=lambda exported, total: progress.append(exported),
+    )
+    assert progress == [4, 6, 7]
+    assert sorted(os.listdir(tmp_path)) == ["declarative.tar", "declarative_since_0.tar"]
+
+
+def test_import_checks_embedder_model(client, tmp_path):
+    create_declarative_points(client, 1)
+    declarative = client.app.state.ccat.memory.vectors.declarative
+
+    archive_path = export_collection(
+        declarative, embedder="DumbEmbedder", folder=str(tmp_path), embedder_name="another-model"
+    )
+    with pytest.raises(Exception) as e:
+        import_collection(
+            declarative, embedder="DumbEmbedder", archive_path=archive_path, folder=str(tmp_path)
+        )
+    assert "Embedder mismatch" in str(e.value)
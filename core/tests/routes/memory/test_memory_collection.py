@@ -1,4 +1,4 @@
-from tests.utils import send_websocket_message, get_collections_names_and_point_count
+from tests.utils import send_websocket_message, get_collections_names_and_point_count, wait_for_ingestion
 
 
 def test_memory_collections_created(client):
@@ -89,6 +89,7 @@ def test_memory_collections_wipe(client):
     with open(file_path, "rb") as f:
         files = {"file": (file_name, f, "text/plain")}
         response = client.post("/rabbithole/", files=files)
+        wait_for_ingestion(client)
 
     collections_n_points = get_collections_names_and_point_count(client)
     assert collections_n_points["procedural"] == 3  # default tool
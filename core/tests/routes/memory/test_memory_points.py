@@ -1,5 +1,7 @@
 import pytest
-from tests.utils import send_websocket_message, get_declarative_memory_contents
+import base64
+import numpy as np
+from tests.utils import send_websocket_message, get_declarative_memory_contents, wait_for_ingestion
 from tests.conftest import FAKE_TIMESTAMP
 
 def test_point_deleted(client):
@@ -56,6 +58,7 @@ def test_points_deleted_by_metadata(client):
         files = {"file": (file_name, f, content_type)}
 
         response = client.post("/rabbithole/", files=files)
+        wait_for_ingestion(client)
     # check response
     assert response.status_code == 200
     # check memory contents
@@ -67,6 +70,7 @@ def test_points_deleted_by_metadata(client):
         files = {"file": ("sample2.pdf", f, content_type)}
 
         response = client.post("/rabbithole/", files=files)
+        wait_for_ingestion(client)
     # check response
     assert response.status_code == 200
     # check memory contents
@@ -369,4 +373,66 @@ def test_edit_memory_point(client, patch_time_now, collection):
     assert len(json["vectors"]["collections"][collection]) == 1
     memory = json["vectors"]["collections"][collection][0]
     assert memory["page_content"] == content
-    assert memory["metadata"] == expected_metadata
\ No newline at end of file
+    assert memory["metadata"] == expected_metadata
+
+def test_points_projection_and_vector_encoding(client):
+    req_json = {"content": "MIAO!", "metadata": {"custom_key": "custom_value"}}
+    res = client.post("/memory/collections/declarative/points", json=req_json)
+    vector = res.json()["vector"]
+
+    # base64 float32 vector, only the requested payload keys
+    res = client.get(
+        "/memory/collections/declarative/points",
+        params={"vector_encoding": "base64_float32", "payload_keys": ["metadata.custom_key"]},
+    )
+    assert res.status_code == 200
+    point = res.json()["points"][0]
+    assert point["payload"] == {"metadata": {"custom_key": "custom_value"}}
+    decoded = np.frombuffer(base64.b64decode(point["vector"]), dtype="<f4")
+    assert np.allclose(decoded, vector)
+
+    # no vectors
+    res = client.get(
+        "/memory/collections/declarative/points", params={"with_vectors": False}
+    )
+    point = res.json()["points"][0]
+    assert point["vector"] is None
+    assert point["payload"]["page_content"] == "MIAO!"
+
+    # recall without vectors
+    res = client.post(
+        "/memory/recall",
+        json={"text": "MIAO!", "with_vectors": False, "payload_keys": ["page_content"]},
+    )
+    assert res.status_code == 200
+    json = res.json()
+    assert "vector" not in json["query"]
+    memory = json["vectors"]["collections"]["declarative"][0]
+    assert set(memory.keys()) == {"page_content", "id", "score"}
+
+    # recall with float16 vectors
+    res = client.get(
+        "/memory/recall", params={"text": "MIAO!", "vector_encoding": "base64_float16"}
+    )
+    memory = res.json()["vectors"]["collections"]["declarative"][0]
+    decoded = np.frombuffer(base64.b64decode(memory["vector"]), dtype="<f2")
+    assert np.allclose(decoded, vector, atol=1e-3)
+
+    # unknown encoding
+    res = client.get(
+        "/memory/collections/declarative/points", params={"vector_encoding": "bits"}
+    )
+    assert res.status_code == 400
+
+
+def test_large_responses_are_compressed(client):
+    for i in range(20):
+        req_json = {"content": f"MIAO {i}!", "metadata": {}}
+        client.post("/memory/collections/declarative/points", json=req_json)
+
+    res = client.get(
+        "/memory/collections/declarative/points", headers={"Accept-Encoding": "gzip"}
+    )
+    assert res.status_code == 200
+    assert res.headers["content-encoding"] == "gzip"
+    assert len(res.json()["points"]) == 20
@@ -1,6 +1,6 @@
 
 import json
-from tests.utils import get_declarative_memory_contents
+from tests.utils import get_declarative_memory_contents, wait_for_ingestion
 
 
 def test_rabbithole_upload_txt(client):
@@ -11,6 +11,7 @@ def test_rabbithole_upload_txt(client):
         files = {"file": (file_name, f, content_type)}
 
         response = client.post("/rabbithole/", files=files)
+        wait_for_ingestion(client)
 
     # check response
     assert response.status_code == 200
@@ -35,6 +36,7 @@ def test_rabbithole_upload_pdf(client):
         files = {"file": (file_name, f, content_type)}
 
         response = client.post("/rabbithole/", files=files)
+        wait_for_ingestion(client)
 
     # check response
     assert response.status_code == 200
@@ -57,6 +59,7 @@ def test_rabbithole_upload_batch_one_file(client):
         files = [ ("files", ((file_name, f, content_type))) ]
 
         response = client.post("/rabbithole/batch", files=files)
+        wait_for_ingestion(client)
 
     # check response
     assert response.status_code == 200
@@ -81,6 +84,7 @@ def test_rabbithole_upload_batch_multiple_files(client):
         files.append(  ("files", ((file_name, open(file_path, "rb"), content_type))) )
 
     response = client.post("/rabbithole/batch", files=files)
+    wait_for_ingestion(client)
 
     # check response
     assert response.status_code == 200
@@ -111,6 +115,7 @@ def test_rabbihole_chunking(client):
         }
 
         response = client.post("/rabbithole/", files=files, data=payload)
+        wait_for_ingestion(client)
 
     # check response
     assert response.status_code == 200
@@ -138,6 +143,7 @@ def test_rabbithole_upload_doc_with_metadata(client):
         payload = {"metadata": json.dumps(metadata)}
 
         response = client.post("/rabbithole/", files=files, data=payload)
+        wait_for_ingestion(client)
 
     # check response
     assert response.status_code == 200
@@ -182,6 +188,7 @@ def test_rabbithole_upload_docs_batch_with_metadata(client):
     }
     
     response = client.post("/rabbithole/batch", files=files, data=payload)
+    wait_for_ingestion(client)
 
     # check response
     assert response.status_code == 200
@@ -195,4 +202,30 @@ def test_rabbithole_upload_docs_batch_with_metadata(client):
         print(dm["metadata"])
         # compare with the metadata of the file
         for k, v in metadata[dm["metadata"]["source"]].items():
-            assert dm["metadata"][k] == v
\ No newline at end of file
+            assert dm["metadata"][k] == v
+
+def test_rabbithole_upload_is_spooled_to_disk(client, stray, monkeypatch):
+    import os
+
+    ingested = []
+
+    def ingest_file(self, cat, file, **kwargs):
+        blob = self.file_to_blob(file)
+        ingested.append((blob.path, blob.source, blob.as_bytes()))
+
+    monkeypatch.setattr(type(stray.rabbit_hole), "ingest_file", ingest_file)
+
+    file_name = "sample.txt"
+    file_path = f"tests/mocks/{file_name}"
+    with open(file_path, "rb") as f:
+        files = {"file": (file_name, f, "text/plain")}
+        response = client.post("/rabbithole/", files=files)
+        wait_for_ingestion(client)
+    assert response.status_code == 200
+
+    # the parser read the upload from a temporary file, removed after ingestion
+    path, source, content = ingested[0]
+    assert source == file_name
+    assert path is not None and not os.path.exists(path)
+    with open(file_path, "rb") as f:
+        assert content == f.read()
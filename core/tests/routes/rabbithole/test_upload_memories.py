@@ -1,9 +1,11 @@
+import os
 import json
 import time
 import uuid
 import random
 import pytest
 
+from cat.memory.memory_archive import ARCHIVES_PATH
 from tests.utils import (
     get_collections_names_and_point_count,
 )
@@ -33,6 +35,9 @@ def test_upload_memory(client):
     assert collections_n_points["procedural"] == 3  # default tool
     assert collections_n_points["episodic"] == 0
 
+    # the upload spooled to disk is removed once ingested
+    assert not [f for f in os.listdir(ARCHIVES_PATH) if f.startswith("upload_")]
+
 
 # upload a file different than a JSON
 def test_upload_memory_check_mimetype(client):
@@ -1,9 +1,10 @@
-from tests.utils import get_declarative_memory_contents
+from tests.utils import get_declarative_memory_contents, wait_for_ingestion
 
 
 def test_rabbithole_upload_invalid_url(client):
     payload = {"url": "https://www.example.sbadabim"}
     response = client.post("/rabbithole/web/", json=payload)
+    wait_for_ingestion(client)
 
     # check response
     assert response.status_code == 400
@@ -18,6 +19,7 @@ def test_rabbithole_upload_invalid_url(client):
 def test_rabbithole_upload_url(client):
     payload = {"url": "https://www.example.com"}
     response = client.post("/rabbithole/web/", json=payload)
+    wait_for_ingestion(client)
 
     # check response
     assert response.status_code == 200
@@ -40,6 +42,7 @@ def test_rabbithole_upload_url_with_metadata(client):
     payload = {"url": "https://www.example.com", "metadata": metadata}
 
     response = client.post("/rabbithole/web/", json=payload)
+    wait_for_ingestion(client)
 
     # check response
     assert response.status_code == 200
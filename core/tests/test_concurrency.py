@@ -0,0 +1,36 @@
+import time
+import asyncio
+import threading
+
+from cat.concurrency import run_blocking, LoopLagMonitor
+
+
+def test_run_blocking_uses_executor():
+
+    async def main():
+        return await run_blocking(lambda: threading.current_thread().name)
+
+    assert asyncio.run(main()).startswith("cat-blocking")
+
+
+def test_loop_lag_monitor_logs_blocking_code(monkeypatch):
+
+    warnings = []
+    monkeypatch.setattr("cat.concurrency.log.warning", warnings.append)
+
+    def blocking_call():
+        time.sleep(0.5)
+
+    async def main():
+        monitor = LoopLagMonitor(threshold=0.1, interval=0.02)
+        monitor.start()
+        await asyncio.sleep(0.1)
+        blocking_call()
+        await asyncio.sleep(0.2)
+        monitor.stop()
+        return monitor
+
+    monitor = asyncio.run(main())
+
+    assert any("blocking_call" in w for w in warnings)
+    assert monitor.max_lag > 0.3
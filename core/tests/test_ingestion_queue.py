@@ -0,0 +1,135 @@
+import os
+
+import pytest
+
+from cat.auth.permissions import AuthUserInfo
+from cat.ingestion_queue import IngestionQueue, IngestionQuotaExceeded
+
+from tests.utils import wait_for_ingestion
+
+
+@pytest.fixture
+def queue(client, monkeypatch, tmp_path):
+    # no workers, jobs are claimed and run by the tests
+    monkeypatch.setenv("CCAT_INGESTION_WORKERS", "0")
+    monkeypatch.setenv("CCAT_INGESTION_USER_MAX_JOBS", "3")
+    from cat.looking_glass.cheshire_cat import CheshireCat
+
+    yield IngestionQueue(CheshireCat(), folder=str(tmp_path))
+
+
+def user(name):
+    return AuthUserInfo(id=name, name=name)
+
+
+def test_claim_by_priority_and_user_concurrency(queue):
+    low = queue.enqueue(user("Alice"), "low.txt", priority="low")
+    alice = queue.enqueue(user("Alice"), "alice.txt")
+    alice_high = queue.enqueue(user("Alice"), "alice_high.txt", priority="high")
+    bob = queue.enqueue(user("Bob"), "bob.txt")
+
+    assert queue._claim()["id"] == alice_high["id"]
+    # Alice already has a job running
+    assert queue._claim()["id"] == bob["id"]
+    assert queue._claim() is None
+
+    assert queue.get_job(alice_high["id"])["status"] == "running"
+    assert queue.get_job(alice["id"])["status"] == "queued"
+    assert queue.get_job(low["id"])["status"] == "queued"
+
+
+def test_user_quota(queue):
+    for i in range(3):
+        queue.enqueue(user("Alice"), f"{i}.txt")
+    with pytest.raises(IngestionQuotaExceeded):
+        queue.enqueue(user("Alice"), "3.txt")
+    # other users are not affected
+    queue.enqueue(user("Bob"), "bob.txt")
+
+
+def test_failed_job_is_retried(queue, monkeypatch):
+    calls = []
+
+    def ingest_file(self, cat, file, on_progress=None, **kwargs):
+        calls.append(file)
+        if len(calls) == 1:
+            raise Exception("embedder unavailable")
+        on_progress(10)
+
+    monkeypatch.setattr(type(queue.ccat.rabbit_hole), "ingest_file", ingest_file)
+
+    job = queue.enqueue(user("Alice"), "sample.txt")
+    queue._run(queue._claim())
+    job = queue.get_job(job["id"])
+    assert job["status"] == "queued"
+    assert job["error"] == "embedder unavailable"
+
+    queue._run(queue._claim())
+    job = queue.get_job(job["id"])
+    assert job["status"] == "completed"
+    assert job["attempts"] == 2
+    assert job["progress"] == 10
+
+
+def test_cancel(queue, monkeypatch):
+    def ingest_file(self, cat, file, on_progress=None, **kwargs):
+        queue.cancel(running["id"])
+        on_progress(1)
+        raise Exception("should have been cancelled")
+
+    monkeypatch.setattr(type(queue.ccat.rabbit_hole), "ingest_file", ingest_file)
+
+    running = queue.enqueue(user("Alice"), "running.txt")
+    queued = queue.enqueue(user("Alice"), "queued.txt")
+
+    claimed = queue._claim()
+    assert queue.cancel(queued["id"])["status"] == "cancelled"
+    queue._run(claimed)
+    assert queue.get_job(running["id"])["status"] == "cancelled"
+    assert queue._claim() is None
+
+
+def test_interrupted_jobs_are_resumed(queue):
+    job = queue.enqueue(user("Alice"), "sample.txt")
+    queue._claim()
+
+    # restart
+    queue = IngestionQueue(queue.ccat, folder=queue.folder)
+    assert queue.get_job(job["id"])["status"] == "queued"
+
+
+def test_upload_job_endpoints(client, stray, monkeypatch):
+    def ingest_file(self, cat, file, on_progress=None, **kwargs):
+        on_progress(3)
+
+    monkeypatch.setattr(type(stray.rabbit_hole), "ingest_file", ingest_file)
+
+    with open("tests/mocks/sample.txt", "rb") as f:
+        response = client.post(
+            "/rabbithole/",
+            files={"file": ("sample.txt", f, "text/plain")},
+            data={"priority": "high"},
+        )
+    assert response.status_code == 200
+    job_id = response.json()["job_id"]
+
+    jobs = wait_for_ingestion(client)
+    assert [j["id"] for j in jobs] == [job_id]
+
+    job = client.get(f"/rabbithole/jobs/{job_id}").json()
+    assert job["status"] == "completed"
+    assert job["priority"] == "high"
+    assert job["progress"] == 3
+    # the spooled upload is removed once ingested
+    assert os.listdir("cat/data/ingestion_queue/files") == []
+
+    assert client.get("/rabbithole/jobs/not_a_job").status_code == 404
+    assert client.delete("/rabbithole/jobs/not_a_job").status_code == 404
+
+    with open("tests/mocks/sample.txt", "rb") as f:
+        response = client.post(
+            "/rabbithole/",
+            files={"file": ("sample.txt", f, "text/plain")},
+            data={"priority": "urgent"},
+        )
+    assert response.status_code == 400
@@ -0,0 +1,64 @@
+from langchain.document_loaders.blob_loaders.schema import Blob
+from langchain_community.document_loaders.parsers.txt import TextParser
+
+from cat.parsers import PDFMinerPagesParser
+from cat.parse_pool import parse_in_pool
+
+
+def pdf_bytes(pages):
+    """Minimal PDF with one line of text per page."""
+    n = len(pages)
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [%s] /Count %d >>"
+        % (" ".join(f"{4 + 2 * i} 0 R" for i in range(n)), n),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(pages):
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+
+    pdf = "%PDF-1.4\n"
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{i} 0 obj\n{obj}\nendobj\n"
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    pdf += "".join(f"{o:010d} 00000 n \n" for o in offsets)
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return pdf.encode("latin-1")
+
+
+def test_parse_pdf_pages_in_pool(monkeypatch):
+
+    monkeypatch.setenv("CCAT_PARSE_PROCESSES", "2")
+    monkeypatch.setenv("CCAT_PARSE_PDF_PAGES_PER_TASK", "1")
+
+    blob = Blob.from_data(
+        pdf_bytes([f"page {i}" for i in range(5)]), mime_type="application/pdf"
+    )
+    expected = list(PDFMinerPagesParser().lazy_parse(blob))
+    docs = list(parse_in_pool(PDFMinerPagesParser(), blob))
+
+    # pages parsed by different processes come back in order
+    assert len(expected) == 5
+    assert [d.page_content for d in docs] == [d.page_content for d in expected]
+    assert [d.metadata["page"] for d in docs] == [str(i) for i in range(len(expected))]
+
+
+def test_parse_in_pool_falls_back_for_unpicklable_parser(monkeypatch):
+
+    monkeypatch.setenv("CCAT_PARSE_PROCESSES", "2")
+
+    parser = TextParser()
+    parser.not_picklable = lambda: None
+
+    blob = Blob.from_data("meow", mime_type="text/plain")
+    docs = list(parse_in_pool(parser, blob))
+
+    assert docs[0].page_content == "meow"
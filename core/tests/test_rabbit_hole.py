@@ -0,0 +1,204 @@
+import pytest
+from langchain.docstore.document import Document
+
+from tests.utils import get_collections_names_and_point_count
+
+
+def declarative_contents(stray):
+    points, _ = stray.memory.vectors.declarative.get_all_points()
+    return sorted(p.payload["page_content"] for p in points)
+
+
+def test_store_documents_incremental(client, stray, monkeypatch):
+    rabbit_hole = stray.rabbit_hole
+    embedded = []
+    original_embed = stray.embedder.embed_documents
+
+    def count_embeddings(texts):
+        embedded.extend(texts)
+        return original_embed(texts)
+
+    monkeypatch.setattr(stray.embedder, "embed_documents", count_embeddings)
+
+    chunks = ["first chunk", "second chunk", "third chunk"]
+    rabbit_hole.store_documents(
+        stray, [Document(page_content=c) for c in chunks], "manual.pdf", incremental=True
+    )
+    assert declarative_contents(stray) == sorted(chunks)
+    assert len(embedded) == 3
+
+    # new version of the document: one chunk changed
+    embedded.clear()
+    chunks = ["first chunk", "second chunk, edited", "third chunk"]
+    rabbit_hole.store_documents(
+        stray, [Document(page_content=c) for c in chunks], "manual.pdf", incremental=True
+    )
+    assert declarative_contents(stray) == sorted(chunks)
+    assert embedded == ["second chunk, edited"]
+
+    # same version again: nothing to embed
+    embedded.clear()
+    rabbit_hole.store_documents(
+        stray, [Document(page_content=c) for c in chunks], "manual.pdf", incremental=True
+    )
+    assert embedded == []
+    assert get_collections_names_and_point_count(client)["declarative"] == 3
+
+    # points deleted from memory are stored again
+    client.delete("/memory/collections/declarative")
+    rabbit_hole.store_documents(
+        stray, [Document(page_content=c) for c in chunks], "manual.pdf", incremental=True
+    )
+    assert get_collections_names_and_point_count(client)["declarative"] == 3
+
+
+def test_store_documents_retry_is_idempotent(client, stray, monkeypatch):
+    rabbit_hole = stray.rabbit_hole
+    monkeypatch.setattr(rabbit_hole, "store_batch_size", 2)
+    chunks = ["a", "b", "a", "c", "d"]
+
+    # the ingestion fails after two batches are stored, the manifest is not saved
+    def fail(n):
+        if n > 2:
+            raise Exception("stop")
+
+    with pytest.raises(Exception):
+        rabbit_hole.store_documents(
+            stray, [Document(page_content=c) for c in chunks], "retry.pdf",
+            incremental=True, on_progress=fail
+        )
+    assert get_collections_names_and_point_count(client)["declarative"] == 4
+
+    # retrying overwrites the points already stored
+    rabbit_hole.store_documents(
+        stray, [Document(page_content=c) for c in chunks], "retry.pdf", incremental=True
+    )
+    assert get_collections_names_and_point_count(client)["declarative"] == 5
+    assert declarative_contents(stray) == sorted(chunks)
+
+
+def test_store_documents_appends_by_default(client, stray):
+    docs = [Document(page_content="the same chunk")]
+    stray.rabbit_hole.store_documents(stray, docs, "notes.txt")
+    stray.rabbit_hole.store_documents(stray, docs, "notes.txt")
+    assert get_collections_names_and_point_count(client)["declarative"] == 2
+
+
+def test_store_documents_skips_near_duplicates(client, stray, monkeypatch):
+    monkeypatch.setenv("CCAT_NEAR_DUPLICATES", "upload")
+    monkeypatch.setattr(stray.rabbit_hole, "store_batch_size", 2)
+    footer = "Meow Corporation, all rights reserved, do not distribute this document"
+    chunks = ["first page", footer, "second page", footer.upper() + "!", "third page", footer]
+
+    result = stray.rabbit_hole.store_documents(
+        stray, [Document(page_content=c) for c in chunks], "slides.pdf", incremental=True
+    )
+
+    assert result == {"chunks": 6, "stored": 4, "duplicates": 2}
+    assert declarative_contents(stray) == sorted(["first page", "second page", "third page", footer])
+
+
+def test_blob_to_docs_stream_is_lazy(client, stray, monkeypatch):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from langchain_core.document_loaders import BaseBlobParser
+    from langchain.document_loaders.blob_loaders.schema import Blob
+
+    rabbit_hole = stray.rabbit_hole
+    produced = []
+
+    class PagesParser(BaseBlobParser):
+        def lazy_parse(self, blob):
+            for i in range(50):
+                produced.append(i)
+                yield Document(page_content=f"page {i} " * 20, metadata={"page": i})
+
+    monkeypatch.setattr(
+        type(rabbit_hole), "file_handlers", property(lambda self: {"text/plain": PagesParser()})
+    )
+    monkeypatch.setattr(
+        type(rabbit_hole),
+        "get_text_splitter",
+        lambda self, *args: RecursiveCharacterTextSplitter(chunk_size=100, chunk_overlap=0),
+    )
+    monkeypatch.setattr(rabbit_hole, "split_window_size", 500)
+    monkeypatch.setattr(rabbit_hole, "parse_buffer_size", 2)
+
+    blob = Blob.from_data(data="unused", mime_type="text/plain", path="pages.txt")
+    stream = rabbit_hole.blob_to_docs_stream(stray, blob)
+
+    first = next(stream)
+    assert first.metadata["page"] == 0
+    assert len(produced) < 50  # parsing is still going on
+
+    docs = [first] + list(stream)
+    assert len(produced) == 50
+    assert {d.metadata["page"] for d in docs} == set(range(50))
+
+
+def test_pdf_is_parsed_page_by_page(client, stray):
+    from langchain.document_loaders.blob_loaders.schema import Blob
+
+    blob = Blob.from_path("tests/mocks/sample.pdf", mime_type="application/pdf")
+    parser = stray.rabbit_hole.file_handlers["application/pdf"]
+    pages = list(parser.lazy_parse(blob))
+    assert pages[0].metadata["page"] == "0"
+    assert "Cheshire" in pages[0].page_content
+
+
+def test_text_splitter_is_cached(client, stray, monkeypatch):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    instantiated = []
+
+    def from_tiktoken_encoder(cls, **kwargs):
+        instantiated.append(kwargs)
+        return cls(chunk_size=kwargs["chunk_size"], chunk_overlap=kwargs["chunk_overlap"])
+
+    monkeypatch.setattr(
+        RecursiveCharacterTextSplitter, "from_tiktoken_encoder", classmethod(from_tiktoken_encoder)
+    )
+
+    rabbit_hole = stray.rabbit_hole
+    default = rabbit_hole.get_text_splitter()
+    assert rabbit_hole.get_text_splitter() is default
+    assert rabbit_hole.text_splitter is default
+
+    # chunk size and overlap from the request do not change the shared default splitter
+    custom = rabbit_hole.get_text_splitter(128, 8)
+    assert rabbit_hole.get_text_splitter(128, 8) is custom
+    assert (custom._chunk_size, custom._chunk_overlap) == (128, 8)
+    assert (default._chunk_size, default._chunk_overlap) == (256, 64)
+    assert len(instantiated) == 1
+
+    # plugins sync
+    stray.mad_hatter.find_plugins()
+    assert rabbit_hole.get_text_splitter() is not default
+    assert len(instantiated) == 2
+
+
+def test_token_offset_splitter():
+    import tiktoken
+    from cat.splitters import TokenOffsetTextSplitter
+
+    # one token per byte, no download needed
+    encoding = tiktoken.Encoding(
+        name="bytes",
+        pat_str=r"\S+|\s+",
+        mergeable_ranks={bytes([i]): i for i in range(256)},
+        special_tokens={},
+    )
+    splitter = TokenOffsetTextSplitter(encoding=encoding, chunk_size=40, chunk_overlap=10)
+
+    text = (
+        "Alice was beginning to get very tired of sitting by her sister on the bank.\n\n"
+        "And of having nothing to do: once or twice she had peeped into the book her sister was reading."
+    )
+    chunks = splitter.split_text(text)
+
+    assert all(len(c) <= 40 for c in chunks)
+    # chunks are cut on separators and overlap
+    assert chunks[0] == "Alice was beginning to get very tired"
+    assert chunks[1].startswith("tired")
+    assert all(c in text for c in chunks)
+    for word in text.split():
+        assert any(word in c for c in chunks)
@@ -0,0 +1,111 @@
+import os
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from cat.url_fetcher import UrlFetcher, UrlTooLarge
+
+
+PAGE = b"Alice was beginning to get very tired of sitting by her sister on the bank."
+
+
+@pytest.fixture
+def server():
+    served = {"etag": '"v1"', "body": PAGE, "bodies_sent": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.headers.get("If-None-Match") == served["etag"]:
+                self.send_response(304)
+                self.end_headers()
+                return
+            served["bodies_sent"] += 1
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("ETag", served["etag"])
+            self.send_header("Content-Length", str(len(served["body"])))
+            self.end_headers()
+            self.wfile.write(served["body"])
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    served["url"] = f"http://127.0.0.1:{httpd.server_address[1]}/alice.txt"
+    yield served
+    httpd.shutdown()
+
+
+def test_conditional_get(client, server):
+    fetcher = UrlFetcher()
+
+    fetched = fetcher.fetch(server["url"])
+    assert fetched.modified
+    assert fetched.version == '"v1"'
+    assert fetched.content_type == "text/plain"
+    with open(fetched.path, "rb") as f:
+        assert f.read() == PAGE
+
+    # not modified: served from the cache
+    fetched = fetcher.fetch(server["url"])
+    assert not fetched.modified
+    assert server["bodies_sent"] == 1
+
+    # modified
+    server["etag"] = '"v2"'
+    server["body"] = PAGE + b" Twice"
+    fetched = fetcher.fetch(server["url"])
+    assert fetched.modified
+    assert fetched.version == '"v2"'
+    assert server["bodies_sent"] == 2
+
+
+def test_size_cap(client, server, monkeypatch):
+    fetcher = UrlFetcher()
+    monkeypatch.setattr(fetcher, "max_bytes", 10)
+
+    with pytest.raises(UrlTooLarge):
+        fetcher.fetch(server["url"])
+    assert [f for f in os.listdir(fetcher.folder) if f.endswith(".tmp")] == []
+
+
+def test_unchanged_url_is_not_ingested_again(client, stray, server, monkeypatch):
+    rabbit_hole = stray.rabbit_hole
+    monkeypatch.setattr(
+        type(rabbit_hole),
+        "get_text_splitter",
+        lambda self, *args: RecursiveCharacterTextSplitter(chunk_size=20, chunk_overlap=0),
+    )
+
+    rabbit_hole.ingest_file(stray, server["url"])
+    points, _ = stray.memory.vectors.declarative.get_all_points()
+    assert len(points) > 0
+
+    parsed = []
+    original_stream = rabbit_hole.blob_to_docs_stream
+    monkeypatch.setattr(
+        rabbit_hole,
+        "blob_to_docs_stream",
+        lambda *args, **kwargs: parsed.append(1) or original_stream(*args, **kwargs),
+    )
+    rabbit_hole.ingest_file(stray, server["url"])
+    assert parsed == []
+
+    # a new version of the page is ingested
+    server["etag"] = '"v2"'
+    rabbit_hole.ingest_file(stray, server["url"])
+    assert parsed == [1]
+
+    # same version, read with other parameters
+    parsed.clear()
+    rabbit_hole.ingest_file(stray, server["url"])
+    assert parsed == []
+    rabbit_hole.ingest_file(stray, server["url"], chunk_size=30)
+    assert parsed == [1]
+    rabbit_hole.ingest_file(stray, server["url"], chunk_size=30, metadata={"lang": "en"})
+    assert parsed == [1, 1]
+    rabbit_hole.ingest_file(stray, server["url"], chunk_size=30, metadata={"lang": "en"})
+    assert parsed == [1, 1]
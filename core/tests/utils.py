@@ -1,3 +1,4 @@
+import time
 import shutil
 from urllib.parse import urlencode
 
@@ -88,4 +89,14 @@ def create_new_user(client):
     new_user = {"username": "Alice", "password": "wandering_in_wonderland"}
     response = client.post("/users", json=new_user)
     assert response.status_code == 200
-    return response.json()
\ No newline at end of file
+    return response.json()
+
+# wait for the ingestion jobs of the user to be over (uploads are ingested by background workers)
+def wait_for_ingestion(client, timeout=30):
+    start = time.time()
+    while time.time() - start < timeout:
+        jobs = client.get("/rabbithole/jobs").json()["jobs"]
+        if all(j["status"] in ["completed", "failed", "cancelled"] for j in jobs):
+            return jobs
+        time.sleep(0.05)
+    raise TimeoutError("Ingestion jobs still running")